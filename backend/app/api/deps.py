@@ -1,7 +1,17 @@
-from fastapi import Depends, HTTPException, status
-from app.core.security import get_current_user, verify_token
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.security import HTTPAuthorizationCredentials
+from app.core.config import settings
+from app.core.security import get_current_user, security, verify_token
 from app.services.firestore import FirestoreService
-from typing import Dict, Any, Literal
+from app.services import rollups
+from app.utils.pagination import decode_page_token
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Literal, Optional
+import secrets
+
+# Analytics windows selectable with ?period=, in days before now
+ANALYTICS_PERIODS = {"day": 1, "week": 7, "month": 30, "quarter": 90, "year": 365}
+DEFAULT_ANALYTICS_PERIOD = "month"
 
 
 async def get_current_user_with_role(
@@ -12,7 +22,7 @@ async def get_current_user_with_role(
     Get current user and check role if required
     """
     uid = current_user["uid"]
-    user_data = FirestoreService.get_user(uid)
+    user_data = await FirestoreService.get_user(uid)
     
     if not user_data:
         raise HTTPException(
@@ -39,6 +49,82 @@ async def get_admin_user(
 ) -> Dict[str, Any]:
     """
     Dependency that requires admin role
+    Authorizes from the verified token's "role" custom claim, trusted only if
+    the token was not revoked since (see get_current_user); the Firestore
+    user document is only read when the claim does not grant admin (token
+    issued before the claim was set, role just promoted, or revoked token)
     """
+    if current_user.get("role") == "admin":
+        return current_user
     return await get_current_user_with_role(required_role="admin", current_user=current_user)
 
+
+async def get_metrics_reader(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> Dict[str, Any]:
+    """
+    Dependency for the /metrics scrape endpoint
+    Accepts the static METRICS_TOKEN when configured (scrapers cannot refresh
+    Firebase ID tokens), otherwise requires an admin
+    """
+    if settings.METRICS_TOKEN and credentials and secrets.compare_digest(credentials.credentials, settings.METRICS_TOKEN):
+        return {"uid": None, "role": "metrics"}
+    current_user = await get_current_user(await verify_token(credentials))
+    return await get_admin_user(current_user)
+
+
+async def get_pagination(
+    limit: Optional[int] = Query(None, ge=1, description="Items per page (capped by MAX_PAGE_SIZE)"),
+    page_token: Optional[str] = Query(None, description="X-Next-Page-Token of the previous page"),
+) -> Dict[str, Any]:
+    """
+    Dependency parsing cursor pagination query params
+    """
+    if page_token:
+        try:
+            decode_page_token(page_token)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    return {"limit": limit, "page_token": page_token}
+
+
+def period_time_range(period: str) -> Dict[str, Any]:
+    """Window of the last period as of now, starting at midnight UTC"""
+    start = rollups.bucket_start(datetime.now(timezone.utc) - timedelta(days=ANALYTICS_PERIODS[period]), rollups.DAY)
+    return {"start": start, "end": None, "period": period}
+
+
+def is_rolling_window(time_range: Dict[str, Any]) -> bool:
+    """Whether time_range is the last period up to now (the windows dashboards keep precomputed)"""
+    return time_range["period"] is not None and time_range["end"] is None
+
+
+async def get_time_range(
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601, UTC if no offset)"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601, UTC if no offset), default: now"),
+    period: str = Query(DEFAULT_ANALYTICS_PERIOD, description="Window ending now, when start is not given: day, week, month, quarter or year"),
+) -> Dict[str, Any]:
+    """
+    Dependency parsing analytics time window query params
+    Without start, the window is the last period starting at midnight UTC, so
+    that requests made the same day read (and cache) the same data
+    """
+    if start is None:
+        if period not in ANALYTICS_PERIODS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Period must be one of {', '.join(ANALYTICS_PERIODS)}"
+            )
+        time_range = period_time_range(period)
+    else:
+        time_range = {"start": rollups.to_utc(start), "end": None, "period": None}
+    end = rollups.to_utc(end) if end else None
+    if end is not None and end <= time_range["start"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must be after start"
+        )
+    return {**time_range, "end": end}
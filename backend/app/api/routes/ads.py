@@ -47,7 +47,7 @@ async def create_ad(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Logo must be an image file"
                 )
-            logo_url = StorageService.upload_poi_file(
+            logo_url = await StorageService.upload_poi_file(
                 file_content=await logo.read(),
                 filename=logo.filename or "logo.jpg",
                 content_type=logo.content_type
@@ -64,8 +64,8 @@ async def create_ad(
             "active": active,
         }
         
-        ad_id = FirestoreService.create_ad(ad_data)
-        ad = FirestoreService.get_ad(ad_id)
+        ad_id = await FirestoreService.create_ad(ad_data)
+        ad = await FirestoreService.get_ad(ad_id)
         
         if not ad:
             raise HTTPException(
@@ -113,7 +113,7 @@ async def list_ads(
     Public endpoint - no authentication required.
     """
     try:
-        ads = FirestoreService.list_ads(position=position, active_only=active_only)
+        ads = await FirestoreService.list_ads(position=position, active_only=active_only)
         
         result = []
         for ad in ads:
@@ -155,7 +155,7 @@ async def get_ad(
     Get a specific ad by ID
     """
     try:
-        ad = FirestoreService.get_ad(ad_id)
+        ad = await FirestoreService.get_ad(ad_id)
         
         if not ad:
             raise HTTPException(
@@ -208,7 +208,7 @@ async def update_ad(
     Update an ad
     """
     try:
-        ad = FirestoreService.get_ad(ad_id)
+        ad = await FirestoreService.get_ad(ad_id)
         
         if not ad:
             raise HTTPException(
@@ -248,7 +248,7 @@ async def update_ad(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Logo must be an image file"
                 )
-            logo_url = StorageService.upload_poi_file(
+            logo_url = await StorageService.upload_poi_file(
                 file_content=await logo.read(),
                 filename=logo.filename or "logo.jpg",
                 content_type=logo.content_type
@@ -256,10 +256,10 @@ async def update_ad(
             updates["logo_url"] = logo_url
         
         if updates:
-            FirestoreService.update_ad(ad_id, updates)
+            await FirestoreService.update_ad(ad_id, updates)
         
         # Get updated ad
-        updated_ad = FirestoreService.get_ad(ad_id)
+        updated_ad = await FirestoreService.get_ad(ad_id)
         
         created_at = updated_ad.get("created_at")
         updated_at = updated_ad.get("updated_at")
@@ -299,7 +299,7 @@ async def delete_ad(
     Delete an ad
     """
     try:
-        success = FirestoreService.delete_ad(ad_id)
+        success = await FirestoreService.delete_ad(ad_id)
         
         if not success:
             raise HTTPException(
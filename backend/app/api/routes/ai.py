@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Response, Request
-from app.api.deps import get_admin_user, get_current_user
+from app.api.deps import get_admin_user, get_current_user, get_pagination
 from app.core.config import settings
 from app.services.storage import StorageService
 from app.services.ai_agent import AIAgentService
@@ -25,6 +25,7 @@ import uuid
 from datetime import datetime
 import time
 from app.core.logging import logger
+from app.utils.pagination import set_next_page_token
 
 router = APIRouter()
 
@@ -49,7 +50,7 @@ async def upload_file(
     content = await file.read()
     
     try:
-        result = StorageService.upload_file(
+        result = await StorageService.upload_file(
             file_content=content,
             filename=file.filename,
             content_type=file.content_type or "text/plain"
@@ -73,7 +74,7 @@ async def list_files(
     List all uploaded files (Admin only)
     """
     try:
-        files = StorageService.list_files()
+        files = await StorageService.list_files()
         return [FileInfo(**f) for f in files]
     except Exception as e:
         import traceback
@@ -94,7 +95,7 @@ async def get_file(
     Get file content (Admin only)
     """
     try:
-        file_data = StorageService.get_file(filename)
+        file_data = await StorageService.get_file(filename)
         if not file_data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -122,7 +123,7 @@ async def delete_file(
     Delete a file (Admin only)
     """
     try:
-        deleted = StorageService.delete_file(filename)
+        deleted = await StorageService.delete_file(filename)
         if not deleted:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -165,7 +166,7 @@ async def replace_file(
     content = await file.read()
     
     try:
-        result = StorageService.replace_file(
+        result = await StorageService.replace_file(
             file_content=content,
             filename=filename,
             content_type=file.content_type or "text/plain"
@@ -196,7 +197,7 @@ async def set_agent_config(
         "chunk_size": config.chunk_size,
         "chunk_overlap": config.chunk_overlap,
     }
-    FirestoreService.save_agent_config(config_data)
+    await FirestoreService.save_agent_config(config_data)
     
     return AgentConfigResponse(
         embedding_provider=config.embedding_provider,
@@ -217,7 +218,7 @@ async def get_agent_config(
     """
     Get current AI agent configuration (Admin only)
     """
-    config = FirestoreService.get_agent_config()
+    config = await FirestoreService.get_agent_config()
     if config:
         return AgentConfigResponse(
             embedding_provider=config.get("embedding_provider", "openai"),
@@ -256,7 +257,7 @@ async def query_agent(
     conversation_id = request.conversation_id
     
     # Get agent config
-    config = FirestoreService.get_agent_config()
+    config = await FirestoreService.get_agent_config()
     embedding_provider = config.get("embedding_provider", "openai") if config else "openai"
     embedding_model = config.get("embedding_model") if config else None
     llm_provider = config.get("llm_provider", "openai") if config else "openai"
@@ -267,7 +268,7 @@ async def query_agent(
     
     # Create conversation if needed
     if not conversation_id:
-        conversation_id = FirestoreService.create_conversation(user_id, title=request.question[:50])
+        conversation_id = await FirestoreService.create_conversation(user_id, title=request.question[:50])
     
     # Query AI agent FIRST (before saving user message) so memory can load existing history
     # The memory will load all previous messages, then we'll add the current question
@@ -291,10 +292,10 @@ async def query_agent(
         latency_ms = (time.time() - start_time) * 1000
         
         # Save user message AFTER query (so memory loads previous messages without current question)
-        FirestoreService.add_message_to_conversation(conversation_id, "user", request.question)
+        await FirestoreService.add_message_to_conversation(conversation_id, "user", request.question)
         
         # Save assistant message
-        FirestoreService.add_message_to_conversation(conversation_id, "assistant", result["answer"])
+        await FirestoreService.add_message_to_conversation(conversation_id, "assistant", result["answer"])
         
         # Log AI request event for analytics
         try:
@@ -311,7 +312,7 @@ async def query_agent(
             
             model_name = llm_model or (f"gpt-4o-mini" if llm_provider == "openai" else "gemini-2.0-flash-exp")
             
-            FirestoreService.log_ai_event(
+            await FirestoreService.log_ai_event(
                 event_type="ai_request",
                 user_id=user_id,
                 conversation_id=conversation_id,
@@ -352,7 +353,7 @@ async def create_conversation(
     """
     user_id = current_user["uid"]
     title = request.title or "New Conversation"
-    conversation_id = FirestoreService.create_conversation(user_id, title)
+    conversation_id = await FirestoreService.create_conversation(user_id, title)
     
     return ConversationCreateResponse(
         conversation_id=conversation_id,
@@ -363,13 +364,23 @@ async def create_conversation(
 
 @router.get("/conversations", response_model=List[ConversationSummary])
 async def list_conversations(
+    response: Response,
+    pagination: Dict[str, Any] = Depends(get_pagination),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """
-    List user's conversations
+    List user's conversations, most recently updated first, one page at a time
+    The next page token is returned in the X-Next-Page-Token header
     """
     user_id = current_user["uid"]
-    conversations = FirestoreService.list_conversations(user_id)
+    try:
+        conversations, next_page_token = await FirestoreService.list_conversations_page(user_id, **pagination)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_page_token(response, next_page_token)
     
     return [
         ConversationSummary(
@@ -392,7 +403,7 @@ async def get_conversation(
     Get a specific conversation
     """
     user_id = current_user["uid"]
-    conv_data = FirestoreService.get_conversation(conversation_id, user_id)
+    conv_data = await FirestoreService.get_conversation(conversation_id, user_id)
     
     if not conv_data:
         raise HTTPException(
@@ -428,7 +439,7 @@ async def delete_conversation(
     Delete a conversation
     """
     user_id = current_user["uid"]
-    deleted = FirestoreService.delete_conversation(conversation_id, user_id)
+    deleted = await FirestoreService.delete_conversation(conversation_id, user_id)
     
     if not deleted:
         raise HTTPException(
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.api.deps import get_admin_user
-from app.services.firestore import FirestoreService, get_db
+from app.services.firestore import FirestoreService
+from app.services import rollups
+from app.services.dashboards import dashboard_scheduler
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
 from collections import defaultdict
@@ -8,6 +10,10 @@ from collections import defaultdict
 router = APIRouter()
 
 
+def _rounded(value, digits: int = 2):
+    return round(value, digits) if value is not None else 0
+
+
 # AI Usage Dashboard - Conversations Tab
 @router.get("/ai-analytics/conversations")
 async def get_ai_conversations_analytics(
@@ -16,14 +22,16 @@ async def get_ai_conversations_analytics(
     """
     Get AI conversations analytics
     """
+    return await dashboard_scheduler.serve("ai_analytics.conversations", _conversations, scan=True)
+
+
+async def _conversations() -> Dict[str, Any]:
     try:
-        db = get_db()
         now = datetime.utcnow()
         seven_days_ago = now - timedelta(days=7)
         thirty_days_ago = now - timedelta(days=30)
         
-        conversations_ref = db.collection("conversations")
-        conversations = conversations_ref.stream()
+        conversations = await FirestoreService.list_all_conversation_metadata()
         
         total_conversations = 0
         conversations_by_user = defaultdict(int)
@@ -31,18 +39,16 @@ async def get_ai_conversations_analytics(
         active_conversations_7d = set()
         active_conversations_30d = set()
         
-        for conv in conversations:
+        for data in conversations:
             total_conversations += 1
-            data = conv.to_dict()
             user_id = data.get("user_id")
-            messages = data.get("messages", [])
             created_at = data.get("created_at")
             updated_at = data.get("updated_at")
             
             if user_id:
                 conversations_by_user[user_id] += 1
             
-            messages_by_conversation.append(len(messages))
+            messages_by_conversation.append(data["message_count"])
             
             # Check if conversation is active (updated in last 7/30 days)
             check_time = updated_at or created_at
@@ -56,9 +62,9 @@ async def get_ai_conversations_analytics(
                 
                 if conv_time:
                     if conv_time >= seven_days_ago:
-                        active_conversations_7d.add(conv.id)
+                        active_conversations_7d.add(data["conversation_id"])
                     if conv_time >= thirty_days_ago:
-                        active_conversations_30d.add(conv.id)
+                        active_conversations_30d.add(data["conversation_id"])
         
         # Calculate statistics
         total_users_with_conversations = len(conversations_by_user)
@@ -102,142 +108,80 @@ async def get_ai_performance_analytics(
 ):
     """
     Get AI performance analytics (tokens, cost, latency by model)
+    
+    Everything is read from the daily AI-event rollups; latency percentiles
+    come from their sketches (within 1% of the exact values).
     """
+    return await dashboard_scheduler.serve("ai_analytics.performance", _performance)
+
+
+async def _performance() -> Dict[str, Any]:
     try:
-        # Get AI events
-        ai_requests = FirestoreService.get_ai_events(event_type="ai_request")
-        embedding_requests = FirestoreService.get_ai_events(event_type="embedding_request")
+        daily_rollups = await FirestoreService.get_ai_event_rollups()
+        model_stats = rollups.ai_model_stats(daily_rollups, "ai_request")
+        embedding_stats = rollups.ai_model_stats(daily_rollups, "embedding_request")
         
-        # Group by model/provider
-        model_stats = defaultdict(lambda: {
-            "input_tokens": 0,
-            "output_tokens": 0,
-            "total_cost": 0.0,
-            "latencies": [],
-            "request_count": 0,
-        })
-        
-        embedding_stats = defaultdict(lambda: {
-            "input_tokens": 0,
-            "total_cost": 0.0,
-            "latencies": [],
-            "request_count": 0,
-        })
-        
-        # Process AI requests
-        for event in ai_requests:
-            model = event.get("model", "unknown")
-            provider = event.get("provider", "unknown")
-            model_key = f"{provider}:{model}"
-            
-            input_tokens = event.get("input_tokens", 0)
-            output_tokens = event.get("output_tokens", 0)
-            cost = event.get("cost_usd", 0.0)
-            latency = event.get("latency_ms", 0)
-            
-            model_stats[model_key]["input_tokens"] += input_tokens
-            model_stats[model_key]["output_tokens"] += output_tokens
-            model_stats[model_key]["total_cost"] += cost
-            model_stats[model_key]["latencies"].append(latency)
-            model_stats[model_key]["request_count"] += 1
-        
-        # Process embedding requests
-        for event in embedding_requests:
-            model = event.get("model", "unknown")
-            provider = event.get("provider", "unknown")
-            model_key = f"{provider}:{model}"
-            
-            input_tokens = event.get("input_tokens", 0)
-            cost = event.get("cost_usd", 0.0)
-            latency = event.get("latency_ms", 0)
-            
-            embedding_stats[model_key]["input_tokens"] += input_tokens
-            embedding_stats[model_key]["total_cost"] += cost
-            embedding_stats[model_key]["latencies"].append(latency)
-            embedding_stats[model_key]["request_count"] += 1
-        
-        # Calculate averages
         model_performance = []
         for model_key, stats in model_stats.items():
-            avg_latency = sum(stats["latencies"]) / len(stats["latencies"]) if stats["latencies"] else 0
             model_performance.append({
                 "model": model_key,
-                "input_tokens": stats["input_tokens"],
-                "output_tokens": stats["output_tokens"],
-                "total_cost_usd": round(stats["total_cost"], 4),
-                "avg_latency_ms": round(avg_latency, 2),
-                "request_count": stats["request_count"],
+                "input_tokens": stats.input_tokens,
+                "output_tokens": stats.output_tokens,
+                "total_cost_usd": round(stats.cost_usd, 4),
+                "avg_latency_ms": round(stats.latency_ms_avg, 2),
+                "p50_latency_ms": _rounded(stats.latencies.quantile(0.5)),
+                "p95_latency_ms": _rounded(stats.latencies.quantile(0.95)),
+                "request_count": stats.count,
             })
         
         embedding_performance = []
         for model_key, stats in embedding_stats.items():
-            avg_latency = sum(stats["latencies"]) / len(stats["latencies"]) if stats["latencies"] else 0
             embedding_performance.append({
                 "model": model_key,
-                "input_tokens": stats["input_tokens"],
-                "total_cost_usd": round(stats["total_cost"], 4),
-                "avg_latency_ms": round(avg_latency, 2),
-                "request_count": stats["request_count"],
+                "input_tokens": stats.input_tokens,
+                "total_cost_usd": round(stats.cost_usd, 4),
+                "avg_latency_ms": round(stats.latency_ms_avg, 2),
+                "p50_latency_ms": _rounded(stats.latencies.quantile(0.5)),
+                "p95_latency_ms": _rounded(stats.latencies.quantile(0.95)),
+                "request_count": stats.count,
             })
         
-        # Token usage over time
-        token_usage_by_date = defaultdict(lambda: {"input": 0, "output": 0})
-        for event in ai_requests:
-            created_at = event.get("created_at")
-            if created_at:
-                if isinstance(created_at, str):
-                    try:
-                        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    except:
-                        continue
-                elif not isinstance(created_at, datetime):
-                    continue
-                
-                date_key = created_at.strftime("%Y-%m-%d")
-                token_usage_by_date[date_key]["input"] += event.get("input_tokens", 0)
-                token_usage_by_date[date_key]["output"] += event.get("output_tokens", 0)
-        
-        token_usage_over_time = [
-            {"date": k, "input_tokens": v["input"], "output_tokens": v["output"]}
-            for k, v in sorted(token_usage_by_date.items())
-        ]
-        
-        # Cost over time
-        cost_by_date = defaultdict(float)
-        for event in ai_requests + embedding_requests:
-            created_at = event.get("created_at")
-            cost = event.get("cost_usd", 0.0)
-            if created_at:
-                if isinstance(created_at, str):
-                    try:
-                        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    except:
-                        continue
-                elif not isinstance(created_at, datetime):
-                    continue
-                
-                date_key = created_at.strftime("%Y-%m-%d")
-                cost_by_date[date_key] += cost
-        
-        cost_over_time = [
-            {"date": k, "cost_usd": round(v, 4)}
-            for k, v in sorted(cost_by_date.items())
-        ]
-        
-        # Latency distribution
-        all_latencies = []
-        for event in ai_requests:
-            latency = event.get("latency_ms", 0)
-            if latency > 0:
-                all_latencies.append(latency)
-        
+        # Token usage and cost over time, one point per day
+        token_usage_over_time = []
+        cost_over_time = []
+        for rollup in daily_rollups:
+            date_key = rollups.to_utc(rollup["bucket_start"]).strftime("%Y-%m-%d")
+            event_types = rollup.get("event_types") or {}
+            requests = event_types.get("ai_request") or {}
+            if requests:
+                token_usage_over_time.append({
+                    "date": date_key,
+                    "input_tokens": sum(stats.get("input_tokens", 0) for stats in requests.values()),
+                    "output_tokens": sum(stats.get("output_tokens", 0) for stats in requests.values()),
+                })
+            priced = [
+                stats
+                for event_type in ("ai_request", "embedding_request")
+                for stats in (event_types.get(event_type) or {}).values()
+            ]
+            if priced:
+                cost_over_time.append({
+                    "date": date_key,
+                    "cost_usd": round(sum(stats.get("cost_usd", 0.0) for stats in priced), 4),
+                })
+        
+        # Latency distribution of AI requests (positive latencies only)
+        overall = rollups.ModelStats()
+        for stats in model_stats.values():
+            overall.merge(stats)
+        latencies = overall.latencies
         latency_distribution = {
-            "min": min(all_latencies) if all_latencies else 0,
-            "max": max(all_latencies) if all_latencies else 0,
-            "avg": sum(all_latencies) / len(all_latencies) if all_latencies else 0,
-            "p50": sorted(all_latencies)[len(all_latencies) // 2] if all_latencies else 0,
-            "p95": sorted(all_latencies)[int(len(all_latencies) * 0.95)] if all_latencies else 0,
-            "p99": sorted(all_latencies)[int(len(all_latencies) * 0.99)] if all_latencies else 0,
+            "min": overall.latency_ms_min or 0,
+            "max": overall.latency_ms_max or 0,
+            "avg": overall.latency_ms_sum / latencies.count if latencies.count else 0,
+            "p50": latencies.quantile(0.5) or 0,
+            "p95": latencies.quantile(0.95) or 0,
+            "p99": latencies.quantile(0.99) or 0,
         }
         
         return {
@@ -263,9 +207,13 @@ async def get_ai_traces_analytics(
     """
     Get AI traces analytics (total traces, error rate, trace types)
     """
+    return await dashboard_scheduler.serve("ai_analytics.traces", _traces, scan=True)
+
+
+async def _traces() -> Dict[str, Any]:
     try:
         # Get all AI events as traces
-        all_ai_events = FirestoreService.get_ai_events()
+        all_ai_events = await FirestoreService.get_ai_events()
         
         total_traces = len(all_ai_events)
         
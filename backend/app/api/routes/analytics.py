@@ -1,8 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.api.deps import get_admin_user
-from app.services.firestore import FirestoreService, get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.api.deps import (
+    get_admin_user,
+    get_time_range,
+    is_rolling_window,
+    period_time_range,
+)
+from app.services.firestore import FirestoreService
+from app.services import enrichment, funnels, retention, rollups, sessions
+from app.services.analytics_snapshot import analytics_snapshot
+from app.services.dashboards import dashboard_key, dashboard_scheduler
 from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from collections import defaultdict
 import uuid
 import logging
@@ -12,6 +20,15 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _window(time_range: Dict[str, Any]) -> Dict[str, Any]:
+    """Time window of a response (end None: up to now)"""
+    return {
+        "period": time_range["period"],
+        "start_time": time_range["start"].isoformat(),
+        "end_time": time_range["end"].isoformat() if time_range["end"] else None,
+    }
+
+
 # Analytics Dashboard - Overview Tab
 @router.get("/analytics/overview")
 async def get_analytics_overview(
@@ -20,92 +37,47 @@ async def get_analytics_overview(
     """
     Get analytics overview metrics
     """
+    return await dashboard_scheduler.serve("analytics.overview", _overview, scan=True)
+
+
+async def _overview() -> Dict[str, Any]:
     try:
-        db = get_db()
         now = datetime.utcnow()
         thirty_days_ago = now - timedelta(days=30)
         
         # Total Users: Unique registered accounts
-        users_ref = db.collection("users")
-        users = users_ref.stream()
-        total_users = len(list(users))
+        total_users = await FirestoreService.count("users")
         
-        # Active Sessions: Count of unique session IDs in last 30 days
-        page_visits = FirestoreService.get_page_visits(start_time=thirty_days_ago)
-        unique_sessions = set()
-        for visit in page_visits:
-            session_id = visit.get("session_id")
-            if session_id:
-                unique_sessions.add(session_id)
-        active_sessions = len(unique_sessions)
+        # Active Sessions: sessions started in the last 30 days
+        recent_sessions = [
+            session for session in await analytics_snapshot.sessions(rollups.bucket_start(thirty_days_ago, rollups.DAY))
+            if session.get("start_ts", 0) >= thirty_days_ago.replace(tzinfo=timezone.utc).timestamp()
+        ]
+        total_sessions = active_sessions = len(recent_sessions)
         
         # Total Pageviews: Sum of all page loads
-        total_pageviews = len(page_visits)
-        
-        # Calculate sessions from page visits (group by user and time windows)
-        # A session is a group of page visits by the same user within 30 minutes
-        user_sessions = defaultdict(list)
-        for visit in page_visits:
-            user_id = visit.get("user_id")
-            start_time = visit.get("start_time")
-            if user_id and start_time:
-                if isinstance(start_time, str):
-                    try:
-                        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                    except:
-                        continue
-                elif not isinstance(start_time, datetime):
-                    continue
-                user_sessions[user_id].append(start_time)
-        
-        # Group visits into sessions (30 minute inactivity window)
-        sessions = []
-        for user_id, visit_times in user_sessions.items():
-            visit_times.sort()
-            current_session_start = None
-            for visit_time in visit_times:
-                if current_session_start is None:
-                    current_session_start = visit_time
-                elif (visit_time - current_session_start).total_seconds() > 1800:  # 30 minutes
-                    sessions.append({
-                        "user_id": user_id,
-                        "start": current_session_start,
-                        "end": visit_times[visit_times.index(visit_time) - 1] if visit_times.index(visit_time) > 0 else current_session_start,
-                    })
-                    current_session_start = visit_time
-            if current_session_start:
-                sessions.append({
-                    "user_id": user_id,
-                    "start": current_session_start,
-                    "end": visit_times[-1] if visit_times else current_session_start,
-                })
-        
-        total_sessions = len(sessions)
+        daily_rollups = await analytics_snapshot.daily_rollups_since(thirty_days_ago)
+        total_pageviews = rollups.RollupSummary(daily_rollups).pageviews
         
         # Avg Session Duration: Total time / total sessions
-        total_session_duration = sum(
-            (s["end"] - s["start"]).total_seconds() 
-            for s in sessions 
-            if isinstance(s["start"], datetime) and isinstance(s["end"], datetime)
-        )
+        total_session_duration = sum(sessions.duration_seconds(session) for session in recent_sessions)
         avg_session_duration = total_session_duration / total_sessions if total_sessions > 0 else 0
         
-        # Pages per Session: Total pageviews / total sessions
-        pages_per_session = total_pageviews / total_sessions if total_sessions > 0 else 0
+        # Pages per Session: pages of the sessions / total sessions
+        session_pages = sum(session.get("page_count", 0) for session in recent_sessions)
+        pages_per_session = session_pages / total_sessions if total_sessions > 0 else 0
         
         # Bounce Rate: Single-page sessions / total sessions
-        single_page_sessions = sum(1 for user_id, visit_times in user_sessions.items() if len(visit_times) == 1)
+        single_page_sessions = sum(1 for session in recent_sessions if session.get("page_count", 0) <= 1)
         bounce_rate = single_page_sessions / total_sessions if total_sessions > 0 else 0
         
         # Country distribution: Get nationality (ISO2 code) from profiles
-        profiles_ref = db.collection("profiles")
-        profiles = profiles_ref.stream()
+        profiles = await FirestoreService.list_profiles(fields=["user_id", "nationalite"])
         country_counts = defaultdict(int)
         
         profile_count = 0
-        for profile_doc in profiles:
+        for profile_data in profiles:
             profile_count += 1
-            profile_data = profile_doc.to_dict()
             nationalite = profile_data.get("nationalite")
             if nationalite:
                 # nationalite should already be ISO2 code (e.g., "FR", "US", "GB", "TN")
@@ -113,7 +85,7 @@ async def get_analytics_overview(
                 iso2_code = nationalite.upper().strip()
                 if len(iso2_code) == 2:  # Valid ISO2 code
                     country_counts[iso2_code] += 1
-                    logger.debug(f"Found nationality: {iso2_code} for profile {profile_doc.id}")
+                    logger.debug(f"Found nationality: {iso2_code} for profile {profile_data.get('user_id')}")
         
         logger.info(f"Processed {profile_count} profiles, found {len(country_counts)} countries: {dict(country_counts)}")
         
@@ -144,6 +116,9 @@ async def get_analytics_overview(
 
 
 # Analytics Dashboard - Traffic Tab
+TRAFFIC_PERIODS = ("day", "week", "month")
+
+
 @router.get("/analytics/traffic")
 async def get_traffic_analytics(
     period: str = "day",  # day, week, month
@@ -152,6 +127,15 @@ async def get_traffic_analytics(
     """
     Get traffic analytics (sessions, pageviews, users over time)
     """
+    if period not in TRAFFIC_PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Period must be 'day', 'week', or 'month'"
+        )
+    return await dashboard_scheduler.serve(dashboard_key("analytics.traffic", period=period), lambda: _traffic(period))
+
+
+async def _traffic(period: str) -> Dict[str, Any]:
     try:
         now = datetime.utcnow()
         if period == "day":
@@ -160,72 +144,22 @@ async def get_traffic_analytics(
         elif period == "week":
             start_time = now - timedelta(weeks=12)
             group_format = "%Y-W%W"
-        elif period == "month":
+        else:  # month
             start_time = now - timedelta(days=365)
             group_format = "%Y-%m"
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Period must be 'day', 'week', or 'month'"
-            )
         
-        page_visits = FirestoreService.get_page_visits(start_time=start_time)
+        # Daily rollups: at most a year of documents instead of every visit
+        daily_rollups = await analytics_snapshot.daily_rollups_since(start_time)
+        by_period = rollups.group_by(daily_rollups, group_format)
         
-        # Group by time period
-        sessions_by_period = defaultdict(set)
-        pageviews_by_period = defaultdict(int)
-        users_by_period = defaultdict(set)
-        
-        for visit in page_visits:
-            start_time_visit = visit.get("start_time")
-            user_id = visit.get("user_id")
-            
-            if not start_time_visit:
-                continue
-            
-            if isinstance(start_time_visit, str):
-                try:
-                    start_time_visit = datetime.fromisoformat(start_time_visit.replace('Z', '+00:00'))
-                except:
-                    continue
-            elif not isinstance(start_time_visit, datetime):
-                continue
-            
-            period_key = start_time_visit.strftime(group_format)
-            
-            # For sessions, we need to group by user and time windows
-            if user_id:
-                users_by_period[period_key].add(user_id)
-                pageviews_by_period[period_key] += 1
-                
-                # Create session ID based on user and time window
-                session_key = f"{user_id}_{period_key}"
-                sessions_by_period[period_key].add(session_key)
-        
-        # Convert to lists
-        sessions_data = [{"period": k, "count": len(v)} for k, v in sorted(sessions_by_period.items())]
-        pageviews_data = [{"period": k, "count": v} for k, v in sorted(pageviews_by_period.items())]
-        users_data = [{"period": k, "count": len(v)} for k, v in sorted(users_by_period.items())]
+        # A session is a user active in the period (unique counts are sketch estimates)
+        users_by_period = {k: len(v.users) for k, v in by_period.items()}
+        sessions_data = [{"period": k, "count": count} for k, count in users_by_period.items()]
+        pageviews_data = [{"period": k, "count": v.pageviews} for k, v in by_period.items()]
+        users_data = [{"period": k, "count": count} for k, count in users_by_period.items()]
         
         # Peak Usage Hours: Heatmap by hour/day
-        hour_day_visits = defaultdict(int)
-        for visit in page_visits:
-            start_time_visit = visit.get("start_time")
-            if not start_time_visit:
-                continue
-            
-            if isinstance(start_time_visit, str):
-                try:
-                    start_time_visit = datetime.fromisoformat(start_time_visit.replace('Z', '+00:00'))
-                except:
-                    continue
-            elif not isinstance(start_time_visit, datetime):
-                continue
-            
-            hour = start_time_visit.hour
-            day = start_time_visit.strftime("%A")  # Monday, Tuesday, etc.
-            hour_day_visits[f"{day}_{hour}"] += 1
-        
+        hour_day_visits = rollups.day_hour_counts(daily_rollups)
         peak_usage = [{"day_hour": k, "count": v} for k, v in sorted(hour_day_visits.items())]
         
         return {
@@ -248,173 +182,68 @@ async def get_traffic_analytics(
 # Analytics Dashboard - Engagement Tab
 @router.get("/analytics/engagement")
 async def get_engagement_analytics(
+    time_range: Dict[str, Any] = Depends(get_time_range),
     current_admin: Dict[str, Any] = Depends(get_admin_user)
 ):
     """
     Get engagement analytics (time per page, page flow, exit pages, entry pages)
+    over a time window (start/end, or period: last month by default)
     """
+    if not is_rolling_window(time_range):
+        return await _engagement(time_range)
+    period = time_range["period"]
+    return await dashboard_scheduler.serve(
+        dashboard_key("analytics.engagement", period=period),
+        lambda: _engagement(period_time_range(period)),
+    )
+
+
+async def _engagement(time_range: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        page_visits = FirestoreService.get_page_visits()
+        start_time, end_time = time_range["start"], time_range["end"]
         
-        # Time per Page: Average duration on each page
-        page_durations = defaultdict(list)
-        for visit in page_visits:
-            page_path = visit.get("page_path")
-            if not page_path:
+        # Time per Page: durations of the closed visits, percentiles from the rollup sketches (whole days)
+        summary = rollups.RollupSummary(await analytics_snapshot.daily_rollups_since(start_time, end_time))
+        time_per_page = []
+        for page, count in summary.page_duration_count.items():
+            if not count:
                 continue
-            
-            # Try to get duration_seconds first
-            duration = visit.get("duration_seconds")
-            
-            # If duration_seconds is not available, calculate from start_time and end_time
-            if duration is None or duration == 0:
-                start_time = visit.get("start_time")
-                end_time = visit.get("end_time")
-                
-                if start_time and end_time:
-                    # Ensure both are datetime objects
-                    if isinstance(start_time, str):
-                        try:
-                            start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                        except:
-                            continue
-                    elif hasattr(start_time, 'timestamp'):
-                        start_time = datetime.fromtimestamp(start_time.timestamp())
-                    elif not isinstance(start_time, datetime):
-                        continue
-                    
-                    if isinstance(end_time, str):
-                        try:
-                            end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-                        except:
-                            continue
-                    elif hasattr(end_time, 'timestamp'):
-                        end_time = datetime.fromtimestamp(end_time.timestamp())
-                    elif not isinstance(end_time, datetime):
-                        continue
-                    
-                    # Calculate duration
-                    duration = (end_time - start_time).total_seconds()
-                    # Only add if duration is positive and reasonable (less than 24 hours)
-                    if duration > 0 and duration < 86400:
-                        page_durations[page_path].append(duration)
-                elif start_time:
-                    # If we only have start_time, use current time as end_time (for active sessions)
-                    # But only if the start_time is recent (within last hour)
-                    if isinstance(start_time, str):
-                        try:
-                            start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                        except:
-                            continue
-                    elif hasattr(start_time, 'timestamp'):
-                        start_time = datetime.fromtimestamp(start_time.timestamp())
-                    elif not isinstance(start_time, datetime):
-                        continue
-                    
-                    time_since_start = (datetime.utcnow() - start_time).total_seconds()
-                    # Only count if started within last hour
-                    if 0 < time_since_start < 3600:
-                        page_durations[page_path].append(time_since_start)
-            elif duration > 0:
-                # duration_seconds exists and is valid
-                page_durations[page_path].append(duration)
-        
-        time_per_page = [
-            {
+            durations = summary.page_durations[page]
+            time_per_page.append({
                 "page": page,
-                "avg_duration_seconds": sum(durations) / len(durations) if durations else 0,
-                "total_visits": len(durations),
-            }
-            for page, durations in page_durations.items()
-        ]
+                "avg_duration_seconds": summary.page_duration_seconds[page] / count,
+                "p50_duration_seconds": round(durations.quantile(0.5) or 0, 2),
+                "p95_duration_seconds": round(durations.quantile(0.95) or 0, 2),
+                "total_visits": count,
+            })
         time_per_page.sort(key=lambda x: x["avg_duration_seconds"], reverse=True)
         
-        # Page Flow: Navigation paths (from previous_page to page_path)
-        page_flows = defaultdict(int)
-        for visit in page_visits:
-            page_path = visit.get("page_path")
-            previous_page = visit.get("previous_page")
-            if page_path and previous_page:
-                flow_key = f"{previous_page} -> {page_path}"
-                page_flows[flow_key] += 1
-        
-        page_flow_data = [{"flow": k, "count": v} for k, v in sorted(page_flows.items(), key=lambda x: x[1], reverse=True)[:20]]
-        
-        # Exit Pages: Where users leave most (pages with no next page visit within session)
-        # Entry Pages: Where users arrive first
-        # Group by session_id to find first and last page per session
-        session_visits = defaultdict(list)
-        for visit in page_visits:
-            session_id = visit.get("session_id")
-            page_path = visit.get("page_path")
-            start_time = visit.get("start_time")
-            previous_page = visit.get("previous_page")
-            
-            # Require session_id to group by session
-            if session_id and page_path and start_time:
-                if isinstance(start_time, str):
-                    try:
-                        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                    except:
-                        continue
-                elif not isinstance(start_time, datetime):
-                    continue
-                
-                session_visits[session_id].append({
-                    "page": page_path,
-                    "previous": previous_page,
-                    "time": start_time,
-                })
-        
-        exit_pages = defaultdict(int)
-        entry_pages = defaultdict(int)
-        
-        # For each session, find the first page (entry) and last page (exit)
-        for session_id, visits in session_visits.items():
-            if not visits:
-                continue
-                
-            # Sort visits by time within the session
-            visits.sort(key=lambda x: x["time"])
-            
-            # First page in session is entry page
-            entry_pages[visits[0]["page"]] += 1
-            
-            # Last page in session is exit page
-            exit_pages[visits[-1]["page"]] += 1
+        # Page Flow: Navigation paths (page to next page within a session), merged from the daily page-flow rollups
+        flows = rollups.PageFlowSummary(await analytics_snapshot.daily_page_flows_since(start_time, end_time))
+        transitions = flows.transitions
+        page_flows = sorted(transitions.items(), key=lambda x: (-x[1], x[0]))
+        page_flow_data = [{"flow": f"{source} -> {target}", "count": count} for (source, target), count in page_flows[:20]]
         
-        exit_pages_data = [{"page": k, "count": v} for k, v in sorted(exit_pages.items(), key=lambda x: x[1], reverse=True)[:10]]
-        entry_pages_data = [{"page": k, "count": v} for k, v in sorted(entry_pages.items(), key=lambda x: x[1], reverse=True)[:10]]
+        # Exit Pages: Where users leave most (latest page of each closed session)
+        # Entry Pages: Where users arrive first (first page of each closed session)
+        exit_pages_data = [{"page": k, "count": v} for k, v in sorted(flows.exit_pages.items(), key=lambda x: x[1], reverse=True)[:10]]
+        entry_pages_data = [{"page": k, "count": v} for k, v in sorted(flows.entry_pages.items(), key=lambda x: x[1], reverse=True)[:10]]
         
         # Sankey data: Two distinct levels
-        # Level 1 (sources): previous_page
-        # Level 2 (targets): page_path
+        # Level 1 (sources): page left
+        # Level 2 (targets): next page
         # Even if same name appears in both levels, they are separate nodes
-        sankey_links = defaultdict(int)
-        source_pages = set()
-        target_pages = set()
-        
-        for visit in page_visits:
-            page_path = visit.get("page_path")
-            previous_page = visit.get("previous_page")
-            
-            # Only process if both page_path and previous_page exist
-            if page_path and previous_page:
-                source = previous_page if previous_page else "unknown"
-                target = page_path if page_path else "unknown"
-                
-                # Skip if source and target are the same (no self-loops)
-                if source != target:
-                    sankey_links[(source, target)] += 1
-                    source_pages.add(source)
-                    target_pages.add(target)
+        # Self-loops (same source and target) are skipped
+        sankey_links = {pair: count for pair, count in transitions.items() if pair[0] != pair[1]}
+        source_pages = {source for source, _ in sankey_links}
+        target_pages = {target for _, target in sankey_links}
         
         # Create two separate node lists: sources and targets
-        # Sources (previous_page) - Level 1
+        # Sources (page left) - Level 1
         source_nodes_list = sorted(source_pages)
         source_to_index = {page: idx for idx, page in enumerate(source_nodes_list)}
         
-        # Targets (page_path) - Level 2
+        # Targets (next page) - Level 2
         target_nodes_list = sorted(target_pages)
         target_to_index = {page: idx + len(source_nodes_list) for idx, page in enumerate(target_nodes_list)}
         
@@ -424,7 +253,7 @@ async def get_engagement_analytics(
             [{"name": page, "level": 2} for page in target_nodes_list]
         )
         
-        # Create links (transitions from previous_page to page_path)
+        # Create links (transitions from page to next page)
         sankey_links_data = [
             {
                 "source": source_to_index[source],
@@ -434,68 +263,14 @@ async def get_engagement_analytics(
             for (source, target), count in sankey_links.items()
         ]
         
-        # Funnel data: Group by session_id, sort by start_time
-        # Count: login, formulaire (onboarding), home, then AI or Map
-        session_visits = defaultdict(list)
-        for visit in page_visits:
-            session_id = visit.get("session_id")
-            page_path = visit.get("page_path", "")
-            start_time = visit.get("start_time")
-            
-            if session_id and page_path and start_time:
-                # Convert start_time to datetime for sorting
-                if isinstance(start_time, str):
-                    try:
-                        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                    except:
-                        continue
-                elif hasattr(start_time, 'timestamp'):
-                    start_time = datetime.fromtimestamp(start_time.timestamp())
-                elif not isinstance(start_time, datetime):
-                    continue
-                
-                # Normalize page paths
-                normalized_page = None
-                if page_path == "/login":
-                    normalized_page = "login"
-                elif page_path == "/onboarding":
-                    normalized_page = "formulaire"
-                elif page_path == "/home" or page_path == "/":
-                    normalized_page = "home"
-                elif page_path.startswith("/ai"):
-                    normalized_page = "ai"
-                elif page_path.startswith("/map"):
-                    normalized_page = "map"
-                
-                if normalized_page:
-                    session_visits[session_id].append({
-                        "page": normalized_page,
-                        "time": start_time,
-                    })
-        
-        # Sort visits within each session by start_time
-        for session_id in session_visits:
-            session_visits[session_id].sort(key=lambda x: x["time"])
-        
-        # Page visits count: Simple count of page_path visits (for horizontal bar chart)
-        page_path_counts = defaultdict(int)
-        
-        for visit in page_visits:
-            page_path = visit.get("page_path")
-            if page_path:
-                page_path_counts[page_path] += 1
-        
-        # Create page visits data: simple count of each page_path
-        page_visits_data = []
-        sorted_pages = sorted(page_path_counts.items(), key=lambda x: x[1], reverse=True)
-        
-        for page_path, count in sorted_pages:
-            page_visits_data.append({
-                "page": page_path,
-                "count": count
-            })
+        # Page visits count: visits per page_path from the daily rollups (for horizontal bar chart)
+        page_visits_data = [
+            {"page": page_path, "count": count}
+            for page_path, count in sorted(summary.page_views.items(), key=lambda x: x[1], reverse=True)
+        ]
         
         return {
+            **_window(time_range),
             "time_per_page": time_per_page,
             "page_flow": page_flow_data,
             "exit_pages": exit_pages_data,
@@ -517,198 +292,33 @@ async def get_engagement_analytics(
 # Analytics Dashboard - Acquisition Tab
 @router.get("/analytics/acquisition")
 async def get_acquisition_analytics(
+    time_range: Dict[str, Any] = Depends(get_time_range),
     current_admin: Dict[str, Any] = Depends(get_admin_user)
 ):
     """
     Get acquisition analytics (channels, devices, browsers, OS)
+    over a time window (start/end, or period: last month by default)
     """
+    if not is_rolling_window(time_range):
+        return await _acquisition(time_range)
+    period = time_range["period"]
+    return await dashboard_scheduler.serve(
+        dashboard_key("analytics.acquisition", period=period),
+        lambda: _acquisition(period_time_range(period)),
+        scan=True,
+    )
+
+
+async def _acquisition(time_range: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        page_visits = FirestoreService.get_page_visits()
-        
-        # Debug: Check if we have visits and what fields they contain
-        import logging
-        if page_visits:
-            sample_keys = list(page_visits[0].keys()) if page_visits else []
-            logging.info(f"Total page visits: {len(page_visits)}, Sample visit keys: {sample_keys}")
-            if page_visits:
-                logging.info(f"Sample visit data: device_type={page_visits[0].get('device_type')}, referrer={page_visits[0].get('referrer')}, previous_page={page_visits[0].get('previous_page')}")
+        table = await analytics_snapshot.visit_table(time_range["start"], time_range["end"])
         
-        # Channels: Parse from referrer or UTM params
-        # Use sets to count unique channels/devices/browsers/OS per session_id
-        channels = defaultdict(set)  # Track unique channels per session_id
-        devices = defaultdict(set)  # Track unique devices per session_id
-        browsers = defaultdict(set)  # Track unique browsers per session_id
-        operating_systems = defaultdict(set)  # Track unique OS per session_id
-        
-        # Track unique channels/devices/browsers/OS per session_id
-        session_channels = defaultdict(set)
-        session_devices = defaultdict(set)
-        session_browsers = defaultdict(set)
-        session_os = defaultdict(set)
-        
-        for visit in page_visits:
-            # Skip non-login pages for channel counting (only count login page)
-            page_path = visit.get("page_path", "")
-            if page_path != "/login" and page_path != "/":
-                # Still process for devices/browsers/OS, but skip channel counting
-                session_id = visit.get("session_id")
-                device_type = visit.get("device_type")
-                user_agent = visit.get("user_agent") or ""
-                
-                # Ensure device_type is a string
-                if device_type is None or device_type == "null" or device_type == "None" or device_type == "":
-                    device_type = "unknown"
-                elif not isinstance(device_type, str):
-                    device_type = str(device_type)
-                
-                # Track unique device per session
-                if session_id and device_type:
-                    session_devices[session_id].add(device_type)
-                
-                # Track unique browser per session
-                ua_lower = user_agent.lower()
-                browser = "Other"
-                if "chrome" in ua_lower and "edg" not in ua_lower:
-                    browser = "Chrome"
-                elif "firefox" in ua_lower:
-                    browser = "Firefox"
-                elif "safari" in ua_lower and "chrome" not in ua_lower:
-                    browser = "Safari"
-                elif "edg" in ua_lower:
-                    browser = "Edge"
-                
-                if session_id:
-                    session_browsers[session_id].add(browser)
-                
-                # Track unique OS per session
-                os_name = "Other"
-                if "windows" in ua_lower:
-                    os_name = "Windows"
-                elif "mac" in ua_lower or "darwin" in ua_lower:
-                    os_name = "macOS"
-                elif "linux" in ua_lower:
-                    os_name = "Linux"
-                elif "android" in ua_lower:
-                    os_name = "Android"
-                elif "ios" in ua_lower or "iphone" in ua_lower or "ipad" in ua_lower:
-                    os_name = "iOS"
-                
-                if session_id:
-                    session_os[session_id].add(os_name)
-                
-                continue
-            
-            # Only process login page (or root "/") for channel counting
-            # Try multiple ways to get referrer
-            referrer = visit.get("referrer") or visit.get("previous_page") or visit.get("referer") or None
-            
-            # Treat localhost:3000 as direct
-            if isinstance(referrer, str) and ("localhost:3000" in referrer or "127.0.0.1:3000" in referrer):
-                referrer = None
-            
-            device_type = visit.get("device_type")
-            
-            # Ensure device_type is a string
-            if device_type is None or device_type == "null" or device_type == "None" or device_type == "":
-                device_type = "unknown"
-            elif not isinstance(device_type, str):
-                device_type = str(device_type)
-            
-            user_agent = visit.get("user_agent") or ""
-            session_id = visit.get("session_id")
-            
-            # Channel detection - prioritize UTM parameters and custom channel
-            acquisition_channel = visit.get("acquisition_channel")
-            utm_source = visit.get("utm_source")
-            utm_medium = visit.get("utm_medium")
-            
-            # Determine channel name
-            channel_name = None
-            if acquisition_channel:
-                channel_name = str(acquisition_channel) if not isinstance(acquisition_channel, str) else acquisition_channel
-            elif utm_source and utm_medium:
-                # Build channel from UTM parameters
-                utm_source_str = str(utm_source) if not isinstance(utm_source, str) else utm_source
-                utm_medium_str = str(utm_medium) if not isinstance(utm_medium, str) else utm_medium
-                channel_name = f"{utm_source_str}_{utm_medium_str}"
-            elif utm_source:
-                # Use utm_source as channel
-                channel_name = str(utm_source) if not isinstance(utm_source, str) else utm_source
-            elif not referrer or referrer == "unknown" or referrer == "null" or (isinstance(referrer, str) and referrer.startswith("/")):
-                channel_name = "direct"
-            elif isinstance(referrer, str) and "google" in referrer.lower():
-                channel_name = "organic_search"
-            elif isinstance(referrer, str) and any(social in referrer.lower() for social in ["facebook", "twitter", "instagram", "linkedin"]):
-                channel_name = "social"
-            elif referrer and referrer != "unknown" and referrer != "null":
-                channel_name = "referral"
-            else:
-                channel_name = "direct"
-            
-            # Track unique channel per session
-            if session_id and channel_name:
-                session_channels[session_id].add(channel_name)
-            
-            # Track unique device per session
-            if session_id and device_type:
-                session_devices[session_id].add(device_type)
-            
-            # Track unique browser per session
-            ua_lower = user_agent.lower()
-            browser = "Other"
-            if "chrome" in ua_lower and "edg" not in ua_lower:
-                browser = "Chrome"
-            elif "firefox" in ua_lower:
-                browser = "Firefox"
-            elif "safari" in ua_lower and "chrome" not in ua_lower:
-                browser = "Safari"
-            elif "edg" in ua_lower:
-                browser = "Edge"
-            
-            if session_id:
-                session_browsers[session_id].add(browser)
-            
-            # Track unique OS per session
-            os_name = "Other"
-            if "windows" in ua_lower:
-                os_name = "Windows"
-            elif "mac" in ua_lower or "darwin" in ua_lower:
-                os_name = "macOS"
-            elif "linux" in ua_lower:
-                os_name = "Linux"
-            elif "android" in ua_lower:
-                os_name = "Android"
-            elif "ios" in ua_lower or "iphone" in ua_lower or "ipad" in ua_lower:
-                os_name = "iOS"
-            
-            if session_id:
-                session_os[session_id].add(os_name)
-        
-        # Count unique channels per session
-        for session_id, channel_set in session_channels.items():
-            for channel in channel_set:
-                channels[channel].add(session_id)
-        
-        # Count unique devices per session
-        for session_id, device_set in session_devices.items():
-            for device in device_set:
-                devices[device].add(session_id)
-        
-        # Count unique browsers per session
-        for session_id, browser_set in session_browsers.items():
-            for browser in browser_set:
-                browsers[browser].add(session_id)
-        
-        # Count unique OS per session
-        for session_id, os_set in session_os.items():
-            for os_name in os_set:
-                operating_systems[os_name].add(session_id)
-        
-        # Convert sets to counts
-        channels_count = {k: len(v) for k, v in channels.items()}
-        devices_count = {k: len(v) for k, v in devices.items()}
-        browsers_count = {k: len(v) for k, v in browsers.items()}
-        operating_systems_count = {k: len(v) for k, v in operating_systems.items()}
+        # Sessions per channel/device/browser/OS (classified at ingest): a session seen with several values counts once for each.
+        # Channels only come from landing pages, where the referrer says where the session came from.
+        channels_count = table.distinct_counts("session_id", "channel", table.isin("page_path", enrichment.LANDING_PAGES))
+        devices_count = table.distinct_counts("session_id", "device_type")
+        browsers_count = table.distinct_counts("session_id", "browser")
+        operating_systems_count = table.distinct_counts("session_id", "os")
         
         # Ensure we have at least some data even if empty
         if not channels_count:
@@ -721,6 +331,7 @@ async def get_acquisition_analytics(
             operating_systems_count["Other"] = 0
         
         return {
+            **_window(time_range),
             "channels": [{"channel": k, "count": v} for k, v in sorted(channels_count.items(), key=lambda x: x[1], reverse=True) if v > 0],
             "devices": [{"device": k, "count": v} for k, v in sorted(devices_count.items(), key=lambda x: x[1], reverse=True) if v > 0],
             "browsers": [{"browser": k, "count": v} for k, v in sorted(browsers_count.items(), key=lambda x: x[1], reverse=True) if v > 0],
@@ -733,3 +344,76 @@ async def get_acquisition_analytics(
             detail=f"Error getting acquisition analytics: {str(e)}\n{traceback.format_exc()}"
         )
 
+
+# Analytics Dashboard - Funnels
+@router.get("/analytics/funnel")
+async def get_funnel_analytics(
+    steps: List[str] = Query(..., description="Pages of the funnel, in order (repeat the parameter)"),
+    time_range: Dict[str, Any] = Depends(get_time_range),
+    current_admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Get a conversion funnel: sessions started in the time window (start/end,
+    or period: last month by default) reaching each step, in order, and the
+    pages the others went to instead
+    """
+    steps = [step.strip() for step in steps if step.strip()]
+    if not funnels.MIN_STEPS <= len(steps) <= funnels.MAX_STEPS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A funnel has {funnels.MIN_STEPS} to {funnels.MAX_STEPS} steps"
+        )
+    try:
+        sequences = await analytics_snapshot.page_sequences(time_range["start"], time_range["end"])
+        return {
+            **_window(time_range),
+            **funnels.evaluate_funnel(sequences, steps),
+        }
+    except Exception as e:
+        import traceback
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting funnel analytics: {str(e)}\n{traceback.format_exc()}"
+        )
+
+
+# Analytics Dashboard - Retention
+RETENTION_WEEKS = 12
+MAX_RETENTION_WEEKS = 52
+
+
+@router.get("/analytics/retention")
+async def get_retention_analytics(
+    weeks: int = RETENTION_WEEKS,
+    current_admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Get weekly cohort retention: users grouped by the week of their first
+    visit, share of each cohort active in each following week (cohorts of
+    the last `weeks` weeks)
+    """
+    if not 1 <= weeks <= MAX_RETENTION_WEEKS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"weeks must be between 1 and {MAX_RETENTION_WEEKS}"
+        )
+    return await dashboard_scheduler.serve(dashboard_key("analytics.retention", weeks=weeks), lambda: _retention(weeks))
+
+
+async def _retention(weeks: int) -> Dict[str, Any]:
+    try:
+        now = datetime.now(timezone.utc)
+        first_week = retention.week_start(now) - timedelta(weeks=weeks - 1)
+        cohorts = await FirestoreService.get_retention_cohorts(first_week)
+        return {
+            "weeks": weeks,
+            "start_time": first_week.isoformat(),
+            "cohorts": retention.retention_matrix(cohorts, now),
+        }
+    except Exception as e:
+        import traceback
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting retention analytics: {str(e)}\n{traceback.format_exc()}"
+        )
+
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from app.core.security import get_current_user
-from app.api.deps import get_admin_user
+from app.api.deps import get_admin_user, get_pagination
 from app.services.firestore import FirestoreService
+from app.services import enrichment, sessions
 from app.schemas.user import UserResponse, ProfileCreate, ProfileResponse, UserRoleUpdate
+from app.utils.pagination import set_next_page_token
 from typing import Dict, Any, List
 from pydantic import BaseModel
 
@@ -37,11 +39,11 @@ async def get_current_user_info(
     uid = current_user["uid"]
     
     # Get user from Firestore
-    user_data = FirestoreService.get_user(uid)
+    user_data = await FirestoreService.get_user(uid)
     
     if not user_data:
         # Create user if doesn't exist
-        user_data = FirestoreService.create_user(
+        user_data = await FirestoreService.create_user(
             uid=uid,
             email=current_user.get("email"),
             role="user"
@@ -56,18 +58,21 @@ async def get_current_user_info(
             # Generate session_id
             session_id = f"{uid}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
             
+            metadata = {
+                "user_agent": user_agent,
+                "ip_address": client_ip,
+                "session_id": session_id,
+                "event_type": "session_start",  # Mark as session start
+            }
+            metadata.update(enrichment.enrich_visit(metadata))
+            
             # Log session_start as a page visit to the root page
             # This way we only use page_visits, not analytics_events
-            FirestoreService.log_page_visit(
+            await FirestoreService.log_page_visit(
                 user_id=uid,
                 page_path="/",
                 start_time=datetime.utcnow(),
-                metadata={
-                    "user_agent": user_agent,
-                    "ip_address": client_ip,
-                    "session_id": session_id,
-                    "event_type": "session_start",  # Mark as session start
-                }
+                metadata=metadata
             )
         except Exception as e:
             # Don't fail the request if logging fails
@@ -95,18 +100,18 @@ async def create_profile(
     uid = current_user["uid"]
     
     # Ensure user exists
-    user_data = FirestoreService.get_user(uid)
+    user_data = await FirestoreService.get_user(uid)
     if not user_data:
-        FirestoreService.create_user(uid=uid, email=current_user.get("email"))
+        await FirestoreService.create_user(uid=uid, email=current_user.get("email"))
     
     # Create or update profile
-    profile_data = FirestoreService.create_or_update_profile(
+    profile_data = await FirestoreService.create_or_update_profile(
         user_id=uid,
         profile_data=profile.dict(exclude_none=True)
     )
     
     # Get the created profile
-    created_profile = FirestoreService.get_profile(uid)
+    created_profile = await FirestoreService.get_profile(uid)
     
     return ProfileResponse(
         user_id=uid,
@@ -126,7 +131,7 @@ async def get_profile(current_user: Dict[str, Any] = Depends(get_current_user)):
     Get user profile
     """
     uid = current_user["uid"]
-    profile = FirestoreService.get_profile(uid)
+    profile = await FirestoreService.get_profile(uid)
     
     if not profile:
         raise HTTPException(
@@ -163,18 +168,24 @@ async def update_user_role(
         )
     
     # Get user
-    user_data = FirestoreService.get_user(user_id)
+    user_data = await FirestoreService.get_user(user_id)
     if not user_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Update role
-    FirestoreService.update_user(user_id, {"role": role_update.role})
+    # Update role (and the custom claim admin routes authorize from)
+    try:
+        await FirestoreService.update_user_role(user_id, role_update.role)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error updating role: {str(e)}"
+        )
     
     # Return updated user
-    updated_user = FirestoreService.get_user(user_id)
+    updated_user = await FirestoreService.get_user(user_id)
     return UserResponse(
         uid=user_id,
         email=updated_user.get("email"),
@@ -185,29 +196,33 @@ async def update_user_role(
 
 @router.get("/users", response_model=List[UserResponse])
 async def list_users(
+    response: Response,
+    pagination: Dict[str, Any] = Depends(get_pagination),
     current_admin: Dict[str, Any] = Depends(get_admin_user)
 ):
     """
-    List all users (admin only)
+    List users, one page at a time (admin only)
+    The next page token is returned in the X-Next-Page-Token header
     """
     try:
-        from app.services.firestore import get_db
-        db = get_db()
-        
-        users_ref = db.collection("users")
-        docs = users_ref.stream()
+        users_page, next_page_token = await FirestoreService.list_users_page(**pagination)
+        set_next_page_token(response, next_page_token)
         
         users = []
-        for doc in docs:
-            user_data = doc.to_dict()
+        for user_data in users_page:
             users.append(UserResponse(
-                uid=doc.id,
+                uid=user_data["uid"],
                 email=user_data.get("email"),
                 role=user_data.get("role", "user"),
                 created_at=user_data.get("created_at"),
             ))
         
         return users
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -247,8 +262,10 @@ async def log_page_visit(
             "referrer": referrer,
             **request.metadata
         }
+        # Device type, browser, OS and channel, classified once here
+        metadata.update(enrichment.enrich_visit(metadata))
         
-        visit_id = FirestoreService.log_page_visit(
+        visit_id = await FirestoreService.log_page_visit(
             user_id=user_id,
             page_path=request.page_path,
             start_time=start_time,
@@ -298,30 +315,15 @@ async def log_analytics_event(
             "ip_address": client_ip,
             **request.metadata
         }
+        # Device type (from the user agent if the frontend sent none), browser, OS and channel
+        metadata.update(enrichment.enrich_visit(metadata))
         
         # Use page_visits instead of analytics_events
         # For session_end, we log it as a special page visit
         if request.event_type == "session_end":
-            # Get device type from user agent
-            import re
-            user_agent_lower = user_agent.lower()
-            device_type = "unknown"
-            
-            # Check for tablet
-            if any(x in user_agent_lower for x in ["tablet", "ipad", "playbook", "silk"]):
-                device_type = "tablet"
-            # Check for mobile
-            elif any(x in user_agent_lower for x in ["mobile", "iphone", "ipod", "android", "blackberry", "opera", "mini", "windows ce", "palm", "smartphone", "iemobile"]):
-                device_type = "mobile"
-            else:
-                device_type = "desktop"
-            
-            # Add device_type to metadata
-            metadata["device_type"] = device_type
-            
-            FirestoreService.log_page_visit(
+            await FirestoreService.log_page_visit(
                 user_id=user_id,
-                page_path="/_session_end",  # Special path to mark session end
+                page_path=sessions.SESSION_END_PATH,  # Special path to mark session end
                 start_time=datetime.utcnow(),
                 metadata=metadata
             )
@@ -329,7 +331,7 @@ async def log_analytics_event(
             # Already handled in /me endpoint
             pass
         elif request.event_type == "login":
-            FirestoreService.log_page_visit(
+            await FirestoreService.log_page_visit(
                 user_id=user_id,
                 page_path="/_login",  # Special path to mark login
                 start_time=datetime.utcnow(),
@@ -370,7 +372,7 @@ async def end_page_visit(
         import logging
         logging.info(f"Updating page visit {request.visit_id} with end_time {end_time.isoformat()}")
         
-        FirestoreService.update_page_visit_end_time(
+        await FirestoreService.update_page_visit_end_time(
             visit_id=request.visit_id,
             end_time=end_time
         )
@@ -1,9 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from app.api.deps import get_admin_user
-from app.services.firestore import FirestoreService, get_db
+from app.api.deps import (
+    get_admin_user,
+    get_time_range,
+    is_rolling_window,
+    period_time_range,
+)
+from app.services.firestore import FirestoreService, rollup_buffer
+from app.services import enrichment, rollups, sessions
+from app.services.analytics_snapshot import analytics_snapshot
+from app.services.dashboards import dashboard_key, dashboard_scheduler
+from app.core.executors import get_executor_stats
+from app.core.security import get_token_cache_stats
+from app.core.usage import route_usage
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
-from google.cloud import firestore as fs
 
 router = APIRouter()
 
@@ -16,12 +26,15 @@ async def close_inactive_visits(
     """
     Close page visits that have been inactive for a specified period (Admin only)
     Uses the last event (page visit) time per user to determine inactivity
+    Also closes the timed-out sessions (counting their entry and exit pages)
     """
     try:
-        closed_count = FirestoreService.close_inactive_page_visits(inactivity_minutes=inactivity_minutes)
+        closed_count = await FirestoreService.close_inactive_page_visits(inactivity_minutes=inactivity_minutes)
+        closed_sessions = await FirestoreService.close_expired_sessions()
         return {
-            "message": f"Closed {closed_count} inactive page visits",
+            "message": f"Closed {closed_count} inactive page visits and {closed_sessions} sessions",
             "closed_count": closed_count,
+            "closed_sessions": closed_sessions,
             "inactivity_minutes": inactivity_minutes,
         }
     except Exception as e:
@@ -39,27 +52,13 @@ async def get_user_stats(
     """
     Get user statistics (Admin only)
     """
+    return await dashboard_scheduler.serve("monitoring.users", _user_stats)
+
+
+async def _user_stats() -> Dict[str, Any]:
     try:
-        db = get_db()
-        users_ref = db.collection("users")
-        users = users_ref.stream()
-        
-        total_users = 0
-        for _ in users:
-            total_users += 1
-        
-        # Get conversations stats
-        conversations_ref = db.collection("conversations")
-        conversations = conversations_ref.stream()
-        
-        total_conversations = 0
-        conversations_by_user = {}
-        for conv in conversations:
-            total_conversations += 1
-            data = conv.to_dict()
-            user_id = data.get("user_id")
-            if user_id:
-                conversations_by_user[user_id] = conversations_by_user.get(user_id, 0) + 1
+        total_users = await FirestoreService.count("users")
+        total_conversations = await FirestoreService.count("conversations")
         
         avg_conversations_per_user = total_conversations / total_users if total_users > 0 else 0
         
@@ -75,6 +74,33 @@ async def get_user_stats(
         )
 
 
+async def _connection_stats_from_visits(start_time: datetime, end_time: datetime):
+    """Rollup-like summary and hourly/daily visit counts computed from the raw visits"""
+    page_visits = await FirestoreService.get_page_visits(
+        start_time=start_time,
+        end_time=end_time,
+        fields=["user_id", "page_path"],
+    )
+    summary = rollups.RollupSummary()
+    connections_by_hour: Dict[str, int] = {}
+    connections_by_day: Dict[str, int] = {}
+    for visit in page_visits:
+        user_id = visit.get("user_id")
+        start_time_visit = visit.get("start_time")
+        if not user_id or not isinstance(start_time_visit, datetime):
+            continue
+        summary.add({"pageviews": 1, "page_views": {visit.get("page_path") or "unknown": 1}})
+        summary.users.add(user_id)
+        hour_key = start_time_visit.strftime("%Y-%m-%d %H:00")
+        connections_by_hour[hour_key] = connections_by_hour.get(hour_key, 0) + 1
+        day_key = start_time_visit.strftime("%Y-%m-%d")
+        connections_by_day[day_key] = connections_by_day.get(day_key, 0) + 1
+    return summary, connections_by_hour, connections_by_day
+
+
+CONNECTION_PERIODS = ("hour", "day", "week")
+
+
 @router.get("/stats/connections")
 async def get_connection_stats(
     period: str = "day",  # hour, day, week
@@ -84,6 +110,15 @@ async def get_connection_stats(
     Get connection statistics by period (Admin only)
     Uses page visits to track user activity (more detailed than connection events)
     """
+    if period not in CONNECTION_PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Period must be 'hour', 'day', or 'week'"
+        )
+    return await dashboard_scheduler.serve(dashboard_key("monitoring.connections", period=period), lambda: _connection_stats(period))
+
+
+async def _connection_stats(period: str) -> Dict[str, Any]:
     try:
         # Calculate time range
         now = datetime.utcnow()
@@ -91,56 +126,20 @@ async def get_connection_stats(
             start_time = now - timedelta(hours=1)
         elif period == "day":
             start_time = now - timedelta(days=1)
-        elif period == "week":
+        else:  # week
             start_time = now - timedelta(weeks=1)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Period must be 'hour', 'day', or 'week'"
-            )
-        
-        # Get page visits from Firestore (more detailed than connection events)
-        page_visits = FirestoreService.get_page_visits(
-            start_time=start_time,
-            end_time=now
-        )
-        
-        connections_by_hour = {}
-        connections_by_day = {}
-        unique_users = set()
-        page_views_by_page = {}
         
-        for visit in page_visits:
-            user_id = visit.get("user_id")
-            start_time_visit = visit.get("start_time")
-            page_path = visit.get("page_path", "unknown")
-            
-            if not user_id or not start_time_visit:
-                continue
-            
-            # Ensure start_time_visit is a datetime
-            if isinstance(start_time_visit, str):
-                try:
-                    start_time_visit = datetime.fromisoformat(start_time_visit.replace('Z', '+00:00'))
-                except:
-                    continue
-            elif not isinstance(start_time_visit, datetime):
-                continue
-            
-            # Filter by time range (double check)
-            if start_time_visit >= start_time:
-                unique_users.add(user_id)
-                
-                # Group by hour
-                hour_key = start_time_visit.strftime("%Y-%m-%d %H:00")
-                connections_by_hour[hour_key] = connections_by_hour.get(hour_key, 0) + 1
-                
-                # Group by day
-                day_key = start_time_visit.strftime("%Y-%m-%d")
-                connections_by_day[day_key] = connections_by_day.get(day_key, 0) + 1
-                
-                # Track page views by page
-                page_views_by_page[page_path] = page_views_by_page.get(page_path, 0) + 1
+        if period == "hour":
+            # A one-hour window is small, and finer than the hourly rollups
+            summary, connections_by_hour, connections_by_day = await _connection_stats_from_visits(start_time, now)
+        else:
+            # Hourly rollups overlapping the window (the first hour is counted whole)
+            hourly_rollups = await FirestoreService.get_page_visit_rollups(rollups.HOUR, start_time, now)
+            summary = rollups.RollupSummary(hourly_rollups)
+            connections_by_hour = {k: v.pageviews for k, v in rollups.group_by(hourly_rollups, "%Y-%m-%d %H:00").items()}
+            connections_by_day = {k: v.pageviews for k, v in rollups.group_by(hourly_rollups, "%Y-%m-%d").items()}
+        unique_users = summary.users
+        page_views_by_page = summary.page_views
         
         # Convert to lists for charts
         hourly_data = [{"hour": k, "count": v} for k, v in sorted(connections_by_hour.items())]
@@ -152,7 +151,7 @@ async def get_connection_stats(
             "start_time": start_time.isoformat(),
             "end_time": now.isoformat(),
             "total_connections": len(unique_users),
-            "total_page_visits": len(page_visits),
+            "total_page_visits": summary.pageviews,
             "hourly_breakdown": hourly_data,
             "daily_breakdown": daily_data,
             "page_views_by_page": page_views_data[:10],  # Top 10 pages
@@ -170,108 +169,61 @@ async def get_connection_stats(
 
 @router.get("/stats/sessions")
 async def get_session_stats(
+    time_range: Dict[str, Any] = Depends(get_time_range),
     current_admin: Dict[str, Any] = Depends(get_admin_user)
 ):
     """
     Get session statistics (average session length, etc.) (Admin only)
-    Uses page visits to calculate session lengths based on user activity
+    Uses the session documents maintained as page visits are logged, over a
+    time window (start/end, or period: last month by default)
     """
+    if not is_rolling_window(time_range):
+        return await _session_stats(time_range)
+    period = time_range["period"]
+    return await dashboard_scheduler.serve(
+        dashboard_key("monitoring.sessions", period=period),
+        lambda: _session_stats(period_time_range(period)),
+        scan=True,
+    )
+
+
+async def _session_stats(time_range: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        # Get all page visits to calculate session statistics
-        page_visits = FirestoreService.get_page_visits()
+        now = datetime.utcnow()
+        start_time, end_time = time_range["start"], time_range["end"]
+        all_sessions = await analytics_snapshot.sessions(start_time, end_time)
         
-        # Group visits by user and calculate session metrics
-        user_sessions = {}
         session_lengths = []
-        page_durations = []
-        
-        for visit in page_visits:
-            user_id = visit.get("user_id")
-            start_time = visit.get("start_time")
-            end_time = visit.get("end_time")
-            duration = visit.get("duration_seconds")
-            page_path = visit.get("page_path", "unknown")
-            
-            if not user_id or not start_time:
-                continue
-            
-            # Ensure start_time is a datetime
-            if isinstance(start_time, str):
-                try:
-                    start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                except:
-                    continue
-            elif not isinstance(start_time, datetime):
-                continue
-            
-            # Track user sessions
-            if user_id not in user_sessions:
-                user_sessions[user_id] = {
-                    "first_visit": start_time,
-                    "last_visit": start_time,
-                    "page_count": 0,
-                    "total_duration": 0,
-                }
-            
-            user_sessions[user_id]["page_count"] += 1
-            if start_time < user_sessions[user_id]["first_visit"]:
-                user_sessions[user_id]["first_visit"] = start_time
-            if start_time > user_sessions[user_id]["last_visit"]:
-                user_sessions[user_id]["last_visit"] = start_time
-            
-            # Calculate duration
-            if duration:
-                user_sessions[user_id]["total_duration"] += duration
-                page_durations.append(duration)
-            elif end_time:
-                # Calculate duration from end_time
-                if isinstance(end_time, str):
-                    try:
-                        end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-                    except:
-                        end_time = None
-                elif not isinstance(end_time, datetime):
-                    end_time = None
-                
-                if end_time:
-                    duration = (end_time - start_time).total_seconds()
-                    user_sessions[user_id]["total_duration"] += duration
-                    page_durations.append(duration)
-        
-        # Calculate session lengths (time between first and last visit per user)
         active_sessions = 0
-        completed_sessions = 0
-        
-        for user_id, session_data in user_sessions.items():
-            session_length = (session_data["last_visit"] - session_data["first_visit"]).total_seconds()
-            
-            # If last visit was recent (within last 30 minutes), consider it active
-            now = datetime.utcnow()
-            time_since_last_visit = (now - session_data["last_visit"]).total_seconds()
-            
-            if time_since_last_visit < 1800:  # 30 minutes
+        for session in all_sessions:
+            if sessions.is_active(session, now):
                 active_sessions += 1
-                # Estimate session length as time since first visit
-                session_length = (now - session_data["first_visit"]).total_seconds()
-            else:
-                completed_sessions += 1
-            
             # Minimum 10 seconds per session
-            session_length = max(session_length, 10)
-            session_lengths.append(session_length)
+            session_lengths.append(max(sessions.duration_seconds(session), 10))
+        completed_sessions = len(all_sessions) - active_sessions
+        
+        # Page durations and their percentiles, from the rollups (whole days)
+        summary = rollups.RollupSummary(await analytics_snapshot.daily_rollups_since(start_time, end_time))
+        durations = summary.durations
         
         # Calculate averages
         avg_session_length = sum(session_lengths) / len(session_lengths) if session_lengths else 0
-        avg_page_duration = sum(page_durations) / len(page_durations) if page_durations else 0
+        avg_page_duration = summary.duration_seconds / summary.duration_count if summary.duration_count else 0
         
         return {
-            "total_sessions": len(user_sessions),
+            "period": time_range["period"],
+            "start_time": start_time.isoformat(),
+            "end_time": end_time.isoformat() if end_time else None,
+            "total_sessions": len(all_sessions),
             "active_sessions": active_sessions,
             "completed_sessions": completed_sessions,
             "average_session_length_seconds": round(avg_session_length, 2),
             "average_session_length_minutes": round(avg_session_length / 60, 2),
             "average_page_duration_seconds": round(avg_page_duration, 2),
-            "total_page_visits": len(page_visits),
+            "page_duration_percentiles": {
+                f"p{round(q * 100)}": round(durations.quantile(q) or 0, 2) for q in (0.5, 0.95, 0.99)
+            },
+            "total_page_visits": summary.pageviews,
         }
     except Exception as e:
         raise HTTPException(
@@ -287,24 +239,24 @@ async def get_conversation_stats(
     """
     Get conversation statistics (Admin only)
     """
+    return await dashboard_scheduler.serve("monitoring.conversations", _conversation_stats, scan=True)
+
+
+async def _conversation_stats() -> Dict[str, Any]:
     try:
-        db = get_db()
-        conversations_ref = db.collection("conversations")
-        conversations = conversations_ref.stream()
+        conversations = await FirestoreService.list_all_conversation_metadata()
         
         total_conversations = 0
         conversations_by_user = {}
         conversations_by_day = {}
         total_messages = 0
         
-        for conv in conversations:
+        for data in conversations:
             total_conversations += 1
-            data = conv.to_dict()
             user_id = data.get("user_id")
-            messages = data.get("messages", [])
             created_at = data.get("created_at")
             
-            total_messages += len(messages)
+            total_messages += data["message_count"]
             
             if user_id:
                 conversations_by_user[user_id] = conversations_by_user.get(user_id, 0) + 1
@@ -322,9 +274,7 @@ async def get_conversation_stats(
                 conversations_by_day[day_key] = conversations_by_day.get(day_key, 0) + 1
         
         # Get total users
-        users_ref = db.collection("users")
-        users = users_ref.stream()
-        total_users = sum(1 for _ in users)
+        total_users = await FirestoreService.count("users")
         
         avg_conversations_per_user = total_conversations / total_users if total_users > 0 else 0
         avg_messages_per_conversation = total_messages / total_conversations if total_conversations > 0 else 0
@@ -345,3 +295,39 @@ async def get_conversation_stats(
         )
 
 
+@router.get("/stats/executors")
+async def get_executors_stats(
+    current_admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Get blocking-backend pool statistics: queue depth, in-flight calls (Admin only)
+    """
+    return {"executors": get_executor_stats()}
+
+
+@router.get("/stats/caches")
+async def get_caches_stats(
+    current_admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Get process-local cache statistics: size, hits, misses (Admin only)
+    """
+    return {
+        "user_cache": FirestoreService.get_user_cache_stats(),
+        "token_cache": get_token_cache_stats(),
+        "analytics_snapshot": analytics_snapshot.stats(),
+        "user_agent_cache": enrichment.user_agent_cache_stats(),
+        "dashboards": dashboard_scheduler.stats(),
+        "rollup_buffer": rollup_buffer.stats(),
+    }
+
+
+@router.get("/stats/usage")
+async def get_usage_stats(
+    current_admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Get Firestore reads/writes/queries and GCS operations per route since startup (Admin only)
+    """
+    return {"routes": route_usage.snapshot()}
+
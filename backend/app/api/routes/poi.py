@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from app.api.deps import get_admin_user, get_current_user
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Response
+from app.api.deps import get_admin_user, get_current_user, get_pagination
 from app.services.firestore import FirestoreService
 from app.services.storage import StorageService
 from app.schemas.poi import POICreate, POIUpdate, POIResponse
+from app.utils.pagination import set_next_page_token
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 import uuid
@@ -35,7 +36,7 @@ async def create_poi(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Photo must be an image file"
                 )
-            photo_url = StorageService.upload_poi_file(
+            photo_url = await StorageService.upload_poi_file(
                 file_content=await photo.read(),
                 filename=photo.filename or "photo.jpg",
                 content_type=photo.content_type
@@ -48,7 +49,7 @@ async def create_poi(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Audio must be an audio file"
                 )
-            audio_url = StorageService.upload_poi_file(
+            audio_url = await StorageService.upload_poi_file(
                 file_content=await audio.read(),
                 filename=audio.filename or "audio.mp3",
                 content_type=audio.content_type
@@ -65,8 +66,8 @@ async def create_poi(
             "audio_url": audio_url,
         }
         
-        poi_id = FirestoreService.create_poi(poi_data)
-        poi = FirestoreService.get_poi(poi_id)
+        poi_id = await FirestoreService.create_poi(poi_data)
+        poi = await FirestoreService.get_poi(poi_id)
         
         if not poi:
             raise HTTPException(
@@ -107,13 +108,17 @@ async def create_poi(
 
 @router.get("/poi", response_model=List[POIResponse])
 async def list_pois(
+    response: Response,
+    pagination: Dict[str, Any] = Depends(get_pagination),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """
-    List all POIs with signed URLs for images and audio
+    List POIs with signed URLs for images and audio, one page at a time
+    The next page token is returned in the X-Next-Page-Token header
     """
     try:
-        pois = FirestoreService.list_pois()
+        pois, next_page_token = await FirestoreService.list_pois_page(**pagination)
+        set_next_page_token(response, next_page_token)
         
         result = []
         for poi in pois:
@@ -145,12 +150,12 @@ async def list_pois(
             audio_url = poi.get("audio_url")
             
             if photo_url and photo_url.startswith('https://storage.googleapis.com/'):
-                signed_photo_url = StorageService.convert_public_url_to_signed(photo_url)
+                signed_photo_url = await StorageService.convert_public_url_to_signed(photo_url)
                 if signed_photo_url:
                     photo_url = signed_photo_url
             
             if audio_url and audio_url.startswith('https://storage.googleapis.com/'):
-                signed_audio_url = StorageService.convert_public_url_to_signed(audio_url)
+                signed_audio_url = await StorageService.convert_public_url_to_signed(audio_url)
                 if signed_audio_url:
                     audio_url = signed_audio_url
             
@@ -168,6 +173,11 @@ async def list_pois(
             ))
         
         return result
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         import traceback
         raise HTTPException(
@@ -185,7 +195,7 @@ async def get_poi(
     Get a specific POI by ID
     """
     try:
-        poi = FirestoreService.get_poi(poi_id)
+        poi = await FirestoreService.get_poi(poi_id)
         
         if not poi:
             raise HTTPException(
@@ -221,12 +231,12 @@ async def get_poi(
         audio_url = poi.get("audio_url")
         
         if photo_url and photo_url.startswith('https://storage.googleapis.com/'):
-            signed_photo_url = StorageService.convert_public_url_to_signed(photo_url)
+            signed_photo_url = await StorageService.convert_public_url_to_signed(photo_url)
             if signed_photo_url:
                 photo_url = signed_photo_url
         
         if audio_url and audio_url.startswith('https://storage.googleapis.com/'):
-            signed_audio_url = StorageService.convert_public_url_to_signed(audio_url)
+            signed_audio_url = await StorageService.convert_public_url_to_signed(audio_url)
             if signed_audio_url:
                 audio_url = signed_audio_url
         
@@ -268,7 +278,7 @@ async def update_poi(
     Update a POI (admin only)
     """
     try:
-        poi = FirestoreService.get_poi(poi_id)
+        poi = await FirestoreService.get_poi(poi_id)
         if not poi:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -298,11 +308,11 @@ async def update_poi(
             # Delete old photo if exists
             if poi.get("photo_url"):
                 try:
-                    StorageService.delete_file(poi["photo_url"])
+                    await StorageService.delete_file(poi["photo_url"])
                 except:
                     pass  # Ignore deletion errors
             
-            photo_url = StorageService.upload_poi_file(
+            photo_url = await StorageService.upload_poi_file(
                 file_content=await photo.read(),
                 filename=photo.filename or "photo.jpg",
                 content_type=photo.content_type
@@ -319,11 +329,11 @@ async def update_poi(
             # Delete old audio if exists
             if poi.get("audio_url"):
                 try:
-                    StorageService.delete_file(poi["audio_url"])
+                    await StorageService.delete_file(poi["audio_url"])
                 except:
                     pass  # Ignore deletion errors
             
-            audio_url = StorageService.upload_poi_file(
+            audio_url = await StorageService.upload_poi_file(
                 file_content=await audio.read(),
                 filename=audio.filename or "audio.mp3",
                 content_type=audio.content_type
@@ -331,10 +341,10 @@ async def update_poi(
             updates["audio_url"] = audio_url
         
         if updates:
-            FirestoreService.update_poi(poi_id, updates)
+            await FirestoreService.update_poi(poi_id, updates)
         
         # Get updated POI
-        updated_poi = FirestoreService.get_poi(poi_id)
+        updated_poi = await FirestoreService.get_poi(poi_id)
         
         created_at = updated_poi.get("created_at")
         updated_at = updated_poi.get("updated_at")
@@ -390,7 +400,7 @@ async def delete_poi(
     Delete a POI (admin only)
     """
     try:
-        poi = FirestoreService.get_poi(poi_id)
+        poi = await FirestoreService.get_poi(poi_id)
         if not poi:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -400,17 +410,17 @@ async def delete_poi(
         # Delete associated files
         if poi.get("photo_url"):
             try:
-                StorageService.delete_file(poi["photo_url"])
+                await StorageService.delete_file(poi["photo_url"])
             except:
                 pass  # Ignore deletion errors
         
         if poi.get("audio_url"):
             try:
-                StorageService.delete_file(poi["audio_url"])
+                await StorageService.delete_file(poi["audio_url"])
             except:
                 pass  # Ignore deletion errors
         
-        FirestoreService.delete_poi(poi_id)
+        await FirestoreService.delete_poi(poi_id)
         return None
     except HTTPException:
         raise
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.api.deps import get_admin_user, get_current_user
+from fastapi import APIRouter, Depends, HTTPException, status, Response
+from app.api.deps import get_admin_user, get_current_user, get_pagination
 from app.services.firestore import FirestoreService
+from app.core.executors import run_blocking, FIREBASE_AUTH
+from app.core.config import settings
+from app.utils.cache import TTLCache
+from app.utils.pagination import set_next_page_token
 from app.schemas.quiz import (
     QuizQuestionCreate,
     QuizQuestionUpdate,
@@ -41,8 +45,8 @@ async def create_quiz_question(
             "is_active": question.is_active,
         }
         
-        question_id = FirestoreService.create_quiz_question(question_data)
-        created_question = FirestoreService.get_quiz_question(question_id)
+        question_id = await FirestoreService.create_quiz_question(question_data)
+        created_question = await FirestoreService.get_quiz_question(question_id)
         
         if not created_question:
             raise HTTPException(
@@ -86,7 +90,7 @@ async def list_quiz_questions(
 ):
     """List all quiz questions (Admin only)"""
     try:
-        questions = FirestoreService.list_quiz_questions(active_only=active_only)
+        questions = await FirestoreService.list_quiz_questions(active_only=active_only)
         
         result = []
         for q in questions:
@@ -124,7 +128,7 @@ async def get_active_quiz_questions(
 ):
     """Get active quiz questions for users (without correct answers)"""
     try:
-        questions = FirestoreService.list_quiz_questions(active_only=True)
+        questions = await FirestoreService.list_quiz_questions(active_only=True)
         
         result = []
         for q in questions:
@@ -181,7 +185,7 @@ async def get_quiz_question(
 ):
     """Get a specific quiz question (Admin only)"""
     try:
-        question = FirestoreService.get_quiz_question(question_id)
+        question = await FirestoreService.get_quiz_question(question_id)
         
         if not question:
             raise HTTPException(
@@ -225,7 +229,7 @@ async def update_quiz_question(
 ):
     """Update a quiz question (Admin only)"""
     try:
-        existing_question = FirestoreService.get_quiz_question(question_id)
+        existing_question = await FirestoreService.get_quiz_question(question_id)
         
         if not existing_question:
             raise HTTPException(
@@ -265,9 +269,9 @@ async def update_quiz_question(
             updates["is_active"] = question.is_active
         
         if updates:
-            FirestoreService.update_quiz_question(question_id, updates)
+            await FirestoreService.update_quiz_question(question_id, updates)
         
-        updated_question = FirestoreService.get_quiz_question(question_id)
+        updated_question = await FirestoreService.get_quiz_question(question_id)
         
         created_at = updated_question.get("created_at")
         updated_at = updated_question.get("updated_at")
@@ -304,7 +308,7 @@ async def delete_quiz_question(
 ):
     """Delete a quiz question (Admin only)"""
     try:
-        success = FirestoreService.delete_quiz_question(question_id)
+        success = await FirestoreService.delete_quiz_question(question_id)
         
         if not success:
             raise HTTPException(
@@ -330,7 +334,7 @@ async def check_quiz_eligibility(
     """Check if user can take the quiz today and return today's submission if exists"""
     try:
         user_id = current_user["uid"]
-        today_submission = FirestoreService.get_user_quiz_submission_today(user_id)
+        today_submission = await FirestoreService.get_user_quiz_submission_today(user_id)
         
         result = {
             "can_take_quiz": today_submission is None,
@@ -377,7 +381,7 @@ async def submit_quiz(
         user_id = current_user["uid"]
         
         # Check if user already took quiz today
-        today_submission = FirestoreService.get_user_quiz_submission_today(user_id)
+        today_submission = await FirestoreService.get_user_quiz_submission_today(user_id)
         if today_submission:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -385,7 +389,7 @@ async def submit_quiz(
             )
         
         # Get all active questions to validate answers
-        questions = FirestoreService.list_quiz_questions(active_only=True)
+        questions = await FirestoreService.list_quiz_questions(active_only=True)
         questions_dict = {q["question_id"]: q for q in questions}
         
         # Validate and score answers
@@ -427,8 +431,9 @@ async def submit_quiz(
             "answers": answer_details,
         }
         
-        submission_id = FirestoreService.create_quiz_submission(submission_data)
-        created_submission = FirestoreService.get_quiz_submission(submission_id)
+        submission_id = await FirestoreService.create_quiz_submission(submission_data)
+        _statistics_cache.clear()
+        created_submission = await FirestoreService.get_quiz_submission(submission_id)
         
         if not created_submission:
             raise HTTPException(
@@ -461,12 +466,15 @@ async def submit_quiz(
 
 @router.get("/quiz/submissions", response_model=List[QuizSubmissionResponse])
 async def list_quiz_submissions(
+    response: Response,
     user_id: Optional[str] = None,
+    pagination: Dict[str, Any] = Depends(get_pagination),
     current_admin: Dict[str, Any] = Depends(get_admin_user)
 ):
-    """List quiz submissions (Admin only)"""
+    """List quiz submissions, most recent first, one page at a time (Admin only)"""
     try:
-        submissions = FirestoreService.list_quiz_submissions(user_id=user_id)
+        submissions, next_page_token = await FirestoreService.list_quiz_submissions_page(user_id=user_id, **pagination)
+        set_next_page_token(response, next_page_token)
         
         result = []
         for s in submissions:
@@ -485,6 +493,11 @@ async def list_quiz_submissions(
             ))
         
         return result
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error listing quiz submissions: {e}")
         raise HTTPException(
@@ -499,7 +512,8 @@ async def get_quiz_leaderboard(
 ):
     """Get quiz leaderboard with masked names and dates"""
     try:
-        submissions = FirestoreService.list_quiz_submissions()
+        # The answers arrays are not needed here
+        submissions = await FirestoreService.list_quiz_submissions(fields=["user_id", "score", "submitted_at"])
         
         # Sort by score descending and take top 10
         submissions_sorted = sorted(submissions, key=lambda x: x["score"], reverse=True)[:10]
@@ -507,7 +521,7 @@ async def get_quiz_leaderboard(
         result = []
         for index, s in enumerate(submissions_sorted):
             user_id = s["user_id"]
-            user_data = FirestoreService.get_user(user_id)
+            user_data = await FirestoreService.get_user(user_id)
             
             # Get and mask user name
             display_name = "Utilisateur anonyme"
@@ -517,7 +531,7 @@ async def get_quiz_leaderboard(
             try:
                 from firebase_admin import auth as firebase_auth
                 try:
-                    firebase_user = firebase_auth.get_user(user_id)
+                    firebase_user = await run_blocking(FIREBASE_AUTH, firebase_auth.get_user, user_id)
                     name = firebase_user.display_name
                     if name:
                         name_parts = name.split(' ')
@@ -576,170 +590,209 @@ async def get_quiz_leaderboard(
         )
 
 
-@router.get("/quiz/statistics")
-async def get_quiz_statistics(
-    current_admin: Dict[str, Any] = Depends(get_admin_user)
-):
-    """Get quiz statistics for monitoring (Admin only)"""
-    try:
-        submissions = FirestoreService.list_quiz_submissions()
-        
-        if not submissions:
-            return {
-                "total_quizzes_taken": 0,
-                "average_score": 0,
-                "average_per_user": 0,
-                "total_users": 0,
-                "score_distribution": [],
-                "quizzes_by_date": [],
-                "submissions_with_users": [],
-            }
-        
-        # Total quizzes taken
-        total_quizzes_taken = len(submissions)
-        
-        # Average score
-        total_score = sum(s["score"] for s in submissions)
-        average_score = round(total_score / total_quizzes_taken, 2)
-        
-        # Unique users
-        unique_users = set(s["user_id"] for s in submissions)
-        total_users = len(unique_users)
-        
-        # Average per user
-        user_quiz_counts = {}
-        for s in submissions:
-            user_id = s["user_id"]
-            user_quiz_counts[user_id] = user_quiz_counts.get(user_id, 0) + 1
-        
-        average_per_user = round(total_quizzes_taken / total_users, 2) if total_users > 0 else 0
-        
-        # Score distribution (0-20, 21-40, 41-60, 61-80, 81-100)
-        score_ranges = {
-            "0-20": 0,
-            "21-40": 0,
-            "41-60": 0,
-            "61-80": 0,
-            "81-100": 0,
+# Quiz statistics aggregates scan every submission: computed at most once per
+# TTL and process (and after a local submission), apart from the paginated list
+_statistics_cache = TTLCache(max_size=1, ttl_seconds=settings.QUIZ_STATISTICS_TTL_SECONDS)
+
+
+async def _quiz_aggregates() -> Dict[str, Any]:
+    """Aggregates of the quiz statistics over every submission (cached)"""
+    cached = _statistics_cache.get("aggregates")
+    if cached is not None:
+        return cached
+    
+    # The answers arrays are not needed here
+    submissions = await FirestoreService.list_quiz_submissions(fields=["user_id", "score", "submitted_at"])
+    
+    if not submissions:
+        aggregates = {
+            "total_quizzes_taken": 0,
+            "average_score": 0,
+            "average_per_user": 0,
+            "total_users": 0,
+            "score_distribution": [],
+            "quizzes_by_date": [],
         }
-        
-        for s in submissions:
-            score = s["score"]
-            if score <= 20:
-                score_ranges["0-20"] += 1
-            elif score <= 40:
-                score_ranges["21-40"] += 1
-            elif score <= 60:
-                score_ranges["41-60"] += 1
-            elif score <= 80:
-                score_ranges["61-80"] += 1
-            else:
-                score_ranges["81-100"] += 1
-        
-        score_distribution = [
-            {"range": k, "count": v} for k, v in score_ranges.items()
-        ]
-        
-        # Quizzes by date
-        quizzes_by_date_dict = defaultdict(int)
-        
-        for s in submissions:
-            submitted_at = s.get("submitted_at")
-            if hasattr(submitted_at, 'timestamp'):
-                submitted_at = datetime.fromtimestamp(submitted_at.timestamp())
-            elif isinstance(submitted_at, str):
-                try:
-                    submitted_at = datetime.fromisoformat(submitted_at.replace('Z', '+00:00'))
-                except:
-                    continue
-            elif not isinstance(submitted_at, datetime):
+        _statistics_cache.set("aggregates", aggregates)
+        return aggregates
+    
+    # Total quizzes taken
+    total_quizzes_taken = len(submissions)
+    
+    # Average score
+    total_score = sum(s["score"] for s in submissions)
+    average_score = round(total_score / total_quizzes_taken, 2)
+    
+    # Unique users
+    unique_users = set(s["user_id"] for s in submissions)
+    total_users = len(unique_users)
+    
+    # Average per user
+    user_quiz_counts = {}
+    for s in submissions:
+        user_id = s["user_id"]
+        user_quiz_counts[user_id] = user_quiz_counts.get(user_id, 0) + 1
+    
+    average_per_user = round(total_quizzes_taken / total_users, 2) if total_users > 0 else 0
+    
+    # Score distribution (0-20, 21-40, 41-60, 61-80, 81-100)
+    score_ranges = {
+        "0-20": 0,
+        "21-40": 0,
+        "41-60": 0,
+        "61-80": 0,
+        "81-100": 0,
+    }
+    
+    for s in submissions:
+        score = s["score"]
+        if score <= 20:
+            score_ranges["0-20"] += 1
+        elif score <= 40:
+            score_ranges["21-40"] += 1
+        elif score <= 60:
+            score_ranges["41-60"] += 1
+        elif score <= 80:
+            score_ranges["61-80"] += 1
+        else:
+            score_ranges["81-100"] += 1
+    
+    score_distribution = [
+        {"range": k, "count": v} for k, v in score_ranges.items()
+    ]
+    
+    # Quizzes by date
+    quizzes_by_date_dict = defaultdict(int)
+    
+    for s in submissions:
+        submitted_at = s.get("submitted_at")
+        if hasattr(submitted_at, 'timestamp'):
+            submitted_at = datetime.fromtimestamp(submitted_at.timestamp())
+        elif isinstance(submitted_at, str):
+            try:
+                submitted_at = datetime.fromisoformat(submitted_at.replace('Z', '+00:00'))
+            except:
                 continue
-            
-            date_key = submitted_at.strftime('%Y-%m-%d')
-            quizzes_by_date_dict[date_key] += 1
-        
-        quizzes_by_date = [
-            {"date": k, "count": v}
-            for k, v in sorted(quizzes_by_date_dict.items())
-        ]
-        
-        # Get submissions with user names (masked for GDPR)
-        submissions_with_users = []
-        for s in submissions:
-            user_id = s["user_id"]
-            user_data = FirestoreService.get_user(user_id)
-            
-            # Mask user name for GDPR compliance
-            display_name = "Utilisateur anonyme"
+        elif not isinstance(submitted_at, datetime):
+            continue
+        
+        date_key = submitted_at.strftime('%Y-%m-%d')
+        quizzes_by_date_dict[date_key] += 1
+    
+    quizzes_by_date = [
+        {"date": k, "count": v}
+        for k, v in sorted(quizzes_by_date_dict.items())
+    ]
+    
+    aggregates = {
+        "total_quizzes_taken": total_quizzes_taken,
+        "average_score": average_score,
+        "average_per_user": average_per_user,
+        "total_users": total_users,
+        "score_distribution": score_distribution,
+        "quizzes_by_date": quizzes_by_date,
+    }
+    _statistics_cache.set("aggregates", aggregates)
+    return aggregates
+
+
+async def _submissions_with_users(response: Response, pagination: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One page of submissions with user names (masked for GDPR), most recent first"""
+    # Get submissions with user names (masked for GDPR), one page at a time
+    # since each row costs a user lookup
+    page_submissions, next_page_token = await FirestoreService.list_quiz_submissions_page(**pagination)
+    set_next_page_token(response, next_page_token)
+    
+    submissions_with_users = []
+    for s in page_submissions:
+        user_id = s["user_id"]
+        user_data = await FirestoreService.get_user(user_id)
+        
+        # Mask user name for GDPR compliance
+        display_name = "Utilisateur anonyme"
+        try:
+            # Try to get user from Firebase Auth
+            from firebase_admin import auth as firebase_auth
             try:
-                # Try to get user from Firebase Auth
-                from firebase_admin import auth as firebase_auth
-                try:
-                    firebase_user = firebase_auth.get_user(user_id)
-                    name = firebase_user.display_name
-                    if name:
-                        # Format: FirstName initial + masked surname
-                        name_parts = name.split(' ')
-                        if len(name_parts) >= 2:
-                            first_name = name_parts[0]
-                            surname = ' '.join(name_parts[1:])
-                            # Mask surname: first letter + stars
-                            masked_surname = surname[0] + '*' * max(len(surname) - 1, 1) if len(surname) > 1 else '*'
-                            display_name = f"{first_name[0].upper()}. {masked_surname}"
-                        else:
-                            # Single name - mask it
-                            display_name = name[0] + '*' * max(len(name) - 1, 1) if len(name) > 1 else '*'
-                except Exception:
-                    # Fallback to email if Firebase Auth fails
-                    if user_data:
-                        email = user_data.get("email", "")
-                        if email:
-                            email_parts = email.split("@")
-                            if len(email_parts) > 0:
-                                display_name = f"{email_parts[0][:2]}***"
+                firebase_user = await run_blocking(FIREBASE_AUTH, firebase_auth.get_user, user_id)
+                name = firebase_user.display_name
+                if name:
+                    # Format: FirstName initial + masked surname
+                    name_parts = name.split(' ')
+                    if len(name_parts) >= 2:
+                        first_name = name_parts[0]
+                        surname = ' '.join(name_parts[1:])
+                        # Mask surname: first letter + stars
+                        masked_surname = surname[0] + '*' * max(len(surname) - 1, 1) if len(surname) > 1 else '*'
+                        display_name = f"{first_name[0].upper()}. {masked_surname}"
+                    else:
+                        # Single name - mask it
+                        display_name = name[0] + '*' * max(len(name) - 1, 1) if len(name) > 1 else '*'
             except Exception:
-                # Fallback to email
+                # Fallback to email if Firebase Auth fails
                 if user_data:
                     email = user_data.get("email", "")
                     if email:
                         email_parts = email.split("@")
                         if len(email_parts) > 0:
                             display_name = f"{email_parts[0][:2]}***"
-            
-            submitted_at = s.get("submitted_at")
-            submitted_at_str = None
-            if submitted_at:
-                if hasattr(submitted_at, 'timestamp'):
-                    submitted_at_str = datetime.fromtimestamp(submitted_at.timestamp()).isoformat()
-                elif isinstance(submitted_at, str):
-                    try:
-                        dt = datetime.fromisoformat(submitted_at.replace('Z', '+00:00'))
-                        submitted_at_str = dt.isoformat()
-                    except:
-                        submitted_at_str = None
-            
-            submissions_with_users.append({
-                "submission_id": s["submission_id"],
-                "user_id": user_id,
-                "display_name": display_name,
-                "score": s["score"],
-                "total_questions": s["total_questions"],
-                "correct_answers": s["correct_answers"],
-                "submitted_at": submitted_at_str,
-            })
+        except Exception:
+            # Fallback to email
+            if user_data:
+                email = user_data.get("email", "")
+                if email:
+                    email_parts = email.split("@")
+                    if len(email_parts) > 0:
+                        display_name = f"{email_parts[0][:2]}***"
+        
+        submitted_at = s.get("submitted_at")
+        submitted_at_str = None
+        if submitted_at:
+            if hasattr(submitted_at, 'timestamp'):
+                submitted_at_str = datetime.fromtimestamp(submitted_at.timestamp()).isoformat()
+            elif isinstance(submitted_at, str):
+                try:
+                    dt = datetime.fromisoformat(submitted_at.replace('Z', '+00:00'))
+                    submitted_at_str = dt.isoformat()
+                except:
+                    submitted_at_str = None
         
-        # Sort by submitted_at descending (most recent first)
-        submissions_with_users.sort(key=lambda x: x["submitted_at"] or "", reverse=True)
-        
-        return {
-            "total_quizzes_taken": total_quizzes_taken,
-            "average_score": average_score,
-            "average_per_user": average_per_user,
-            "total_users": total_users,
-            "score_distribution": score_distribution,
-            "quizzes_by_date": quizzes_by_date,
-            "submissions_with_users": submissions_with_users,
-        }
+        submissions_with_users.append({
+            "submission_id": s["submission_id"],
+            "user_id": user_id,
+            "display_name": display_name,
+            "score": s["score"],
+            "total_questions": s["total_questions"],
+            "correct_answers": s["correct_answers"],
+            "submitted_at": submitted_at_str,
+        })
+    
+    # Sort by submitted_at descending (most recent first)
+    submissions_with_users.sort(key=lambda x: x["submitted_at"] or "", reverse=True)
+    return submissions_with_users
+
+
+@router.get("/quiz/statistics")
+async def get_quiz_statistics(
+    response: Response,
+    pagination: Dict[str, Any] = Depends(get_pagination),
+    current_admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    Get quiz statistics for monitoring (Admin only)
+    submissions_with_users holds the first page of submissions, the next
+    ones are read from /quiz/statistics/submissions with the token returned
+    in the X-Next-Page-Token header
+    """
+    try:
+        aggregates = await _quiz_aggregates()
+        submissions_with_users = await _submissions_with_users(response, pagination)
+        return {**aggregates, "submissions_with_users": submissions_with_users}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error getting quiz statistics: {e}")
         raise HTTPException(
@@ -747,3 +800,27 @@ async def get_quiz_statistics(
             detail=f"Error getting quiz statistics: {str(e)}"
         )
 
+
+@router.get("/quiz/statistics/submissions")
+async def list_quiz_statistics_submissions(
+    response: Response,
+    pagination: Dict[str, Any] = Depends(get_pagination),
+    current_admin: Dict[str, Any] = Depends(get_admin_user)
+):
+    """
+    List submissions with user names for monitoring (Admin only), paginated
+    like submissions_with_users of /quiz/statistics
+    """
+    try:
+        return await _submissions_with_users(response, pagination)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error listing quiz statistics submissions: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error listing quiz statistics submissions: {str(e)}"
+        )
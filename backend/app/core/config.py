@@ -31,6 +31,55 @@ class Settings(BaseSettings):
     # Google Gemini
     GOOGLE_API_KEY: str = ""
     
+    # Firestore backend: "firestore" (GCP project) or "memory" (in-process store
+    # for benchmarks and local runs, data is lost on restart)
+    FIRESTORE_BACKEND: str = "firestore"
+    
+    # Blocking SDK offload pools (max concurrent calls per backend)
+    GCS_MAX_WORKERS: int = 8
+    FIREBASE_AUTH_MAX_WORKERS: int = 4
+    TOKEN_VERIFICATION_MAX_WORKERS: int = 4
+    
+    # Process-local user/role cache (0 disables)
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_SIZE: int = 1024
+    
+    # Verified ID-token cache, entries live until the token's exp (0 disables)
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    
+    # Analytics data shared by the dashboard tabs, reloaded after this TTL (0 disables)
+    ANALYTICS_SNAPSHOT_TTL_SECONDS: int = 30
+    
+    # Quiz statistics aggregates (a scan of every submission), recomputed after this TTL (0 disables)
+    QUIZ_STATISTICS_TTL_SECONDS: int = 300
+    
+    # Admin dashboard payloads served stale-while-revalidate and recomputed in the
+    # background on this cadence while admins request them (0: computed on every request)
+    DASHBOARD_REFRESH_SECONDS: int = 60
+    # Dashboards computed by scanning raw collections are refreshed this often
+    DASHBOARD_SCAN_REFRESH_SECONDS: int = 900
+    # Lease keeping other instances from recomputing a dashboard meanwhile
+    DASHBOARD_LEASE_SECONDS: int = 120
+    
+    # Shared page-visit rollup increments (hourly/daily, page flows, cohorts) are
+    # merged in memory and written this long after the first pending one (0:
+    # written by each request, after its visit)
+    ROLLUP_FLUSH_SECONDS: float = 5
+    # Rollup documents pending in that buffer before a flush is forced
+    ROLLUP_BUFFER_MAX_DOCUMENTS: int = 5000
+    
+    # Batched Firestore writes of maintenance jobs (WriteBatch commits in flight)
+    FIRESTORE_BATCH_MAX_CONCURRENCY: int = 8
+    
+    # Cursor pagination of list endpoints
+    DEFAULT_PAGE_SIZE: int = 100
+    MAX_PAGE_SIZE: int = 500
+    
+    # Prometheus /metrics: static bearer token for scrapers (admin ID tokens are
+    # always accepted) and event-loop lag probe interval (0 disables the probe)
+    METRICS_TOKEN: str = ""
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 1.0
+    
     @field_validator("cors_origins_raw", mode="before")
     @classmethod
     def parse_cors_origins(cls, v: Union[str, List[str]]) -> str:
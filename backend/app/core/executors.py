@@ -0,0 +1,147 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from app.core.config import settings
+
+# Backends whose SDKs only expose blocking calls
+GCS = "gcs"
+FIREBASE_AUTH = "firebase_auth"
+TOKEN_VERIFICATION = "token_verification"
+
+
+def _max_workers(backend: str) -> int:
+    """Configured concurrency limit for a backend"""
+    limits = {
+        GCS: settings.GCS_MAX_WORKERS,
+        FIREBASE_AUTH: settings.FIREBASE_AUTH_MAX_WORKERS,
+        TOKEN_VERIFICATION: settings.TOKEN_VERIFICATION_MAX_WORKERS,
+    }
+    return max(1, limits.get(backend, 4))
+
+
+class BoundedExecutor:
+    """
+    Thread pool dedicated to one blocking backend
+
+    At most max_workers calls run at once; extra calls wait in the pool queue.
+    Queue depth and in-flight counts are tracked so a saturated backend shows up
+    in the monitoring stats instead of silently adding latency; completed and
+    failed count the calls that returned and raised.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.peak_queue_depth = 0
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking callable in the pool and await its result"""
+        with self._lock:
+            self.queued += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self.queued)
+        started = False
+
+        def call():
+            nonlocal started
+            with self._lock:
+                started = True
+                self.queued -= 1
+                self.running += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+            with self._lock:
+                self.completed += 1
+            return result
+
+        def done(_):
+            # Calls cancelled before a worker picked them up (caller cancelled,
+            # shutdown with cancel_futures) leave the queue here
+            with self._lock:
+                if not started:
+                    self.queued -= 1
+
+        # Run in a copy of the caller's context so request-scoped state (usage
+        # accounting) is visible from the worker thread
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, call)
+        future.add_done_callback(done)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the pool counters"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self.queued,
+                "in_flight": self.running,
+                "peak_queue_depth": self.peak_queue_depth,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_executors: Dict[str, BoundedExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(backend: str) -> BoundedExecutor:
+    """Get the pool for a backend (lazy initialization)"""
+    executor = _executors.get(backend)
+    if executor is not None:
+        return executor
+
+    with _executors_lock:
+        if backend not in _executors:
+            _executors[backend] = BoundedExecutor(backend, _max_workers(backend))
+        return _executors[backend]
+
+
+async def run_blocking(backend: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Offload a blocking SDK call to the backend's pool"""
+    return await get_executor(backend).run(fn, *args, **kwargs)
+
+
+def offload(backend: str):
+    """
+    Decorator turning a blocking function into a coroutine run in the backend's pool
+
+    The undecorated function stays reachable through __wrapped__.
+    """
+    def decorator(fn: Callable[..., Any]):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await run_blocking(backend, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_executor_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters of every pool created so far"""
+    return {name: executor.stats() for name, executor in list(_executors.items())}
+
+
+def shutdown_executors():
+    """Stop all pools (application shutdown)"""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
@@ -0,0 +1,302 @@
+import asyncio
+import bisect
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Default latency buckets in seconds, from cache hits to slow LLM answers
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """Labelled metric family rendered in the Prometheus text format"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterable[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram, one series per label combination"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: bucket counts (last one is +Inf), sum, count
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """Decorator observing the duration of each call of a blocking function"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _samples(self):
+        with self._lock:
+            series = sorted((key, [list(counts), total, count]) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", _format_labels(self.labelnames + ("le",), key + (_format_value(float(bound)),)), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), count
+
+
+class MetricsRegistry:
+    """
+    Metric families of the process, plus collectors refreshed at scrape time
+
+    Collectors copy counters kept elsewhere (cache and pool stats) into gauges
+    right before rendering, so those modules do not depend on this one.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        for collector in self._collectors:
+            collector()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is sent",
+    ["method", "route", "status"],
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests being served", ["method"],
+))
+firestore_operation_duration = registry.register(Histogram(
+    "firestore_operation_duration_seconds", "Firestore call latency", ["operation"],
+))
+gcs_operation_duration = registry.register(Histogram(
+    "gcs_operation_duration_seconds", "GCS call latency, pool queueing excluded", ["operation"],
+))
+llm_call_duration = registry.register(Histogram(
+    "llm_call_duration_seconds", "LLM chain call latency (retrieval included)", ["provider", "mode"],
+))
+cache_hits = registry.register(Gauge(
+    "cache_hits", "Lookups answered by a process-local cache since startup", ["cache"],
+))
+cache_misses = registry.register(Gauge(
+    "cache_misses", "Lookups missing a process-local cache since startup", ["cache"],
+))
+cache_hit_ratio = registry.register(Gauge(
+    "cache_hit_ratio", "Hits over lookups of a process-local cache", ["cache"],
+))
+cache_size = registry.register(Gauge(
+    "cache_entries", "Entries held by a process-local cache", ["cache"],
+))
+executor_queue_depth = registry.register(Gauge(
+    "executor_queue_depth", "Blocking calls waiting for a pool worker", ["backend"],
+))
+executor_in_flight = registry.register(Gauge(
+    "executor_in_flight", "Blocking calls running in a pool", ["backend"],
+))
+event_loop_lag = registry.register(Gauge(
+    "event_loop_lag_seconds", "Delay of the last event-loop probe past its schedule",
+))
+event_loop_lag_histogram = registry.register(Histogram(
+    "event_loop_lag_probe_seconds", "Delay of event-loop probes past their schedule",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+))
+
+
+def register_cache(name: str, stats: Callable[[], Dict]):
+    """Expose a cache's stats() (TTLCache format) as cache_* gauges"""
+    def collect():
+        snapshot = stats()
+        cache_hits.set(snapshot["hits"], cache=name)
+        cache_misses.set(snapshot["misses"], cache=name)
+        cache_hit_ratio.set(snapshot["hit_ratio"], cache=name)
+        cache_size.set(snapshot["size"], cache=name)
+    registry.add_collector(collect)
+
+
+def register_executors(stats: Callable[[], Dict[str, Dict]]):
+    """Expose blocking pool stats as executor_* gauges"""
+    def collect():
+        for backend, snapshot in stats().items():
+            executor_queue_depth.set(snapshot["queue_depth"], backend=backend)
+            executor_in_flight.set(snapshot["in_flight"], backend=backend)
+    registry.add_collector(collect)
+
+
+async def monitor_event_loop_lag(interval_seconds: float):
+    """
+    Probe the event loop every interval_seconds until cancelled
+
+    The lag is how late the probe wakes up: time the loop spent running other
+    callbacks (typically blocking code) when it should have been idle.
+    """
+    while True:
+        expected = time.perf_counter() + interval_seconds
+        await asyncio.sleep(interval_seconds)
+        lag = max(0.0, time.perf_counter() - expected)
+        event_loop_lag.set(lag)
+        event_loop_lag_histogram.observe(lag)
+
+
+def _route_name(scope) -> str:
+    """Route template of a served request (unmatched paths share one label)"""
+    path = getattr(scope.get("route"), "path", None)
+    return path if path is not None else "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request by method, route template and status
+
+    The duration runs until the response starts, so a streamed answer is
+    measured to its first byte. Requests failing before a response is sent are
+    labelled status 500.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status: Optional[int] = None
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                http_request_duration.observe(
+                    time.perf_counter() - started, method=method, route=_route_name(scope), status=str(status),
+                )
+            await send(message)
+
+        http_requests_in_flight.inc(method=method)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            http_requests_in_flight.dec(method=method)
+            if status is None:
+                http_request_duration.observe(
+                    time.perf_counter() - started, method=method, route=_route_name(scope), status="500",
+                )
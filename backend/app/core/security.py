@@ -3,8 +3,13 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import firebase_admin
 from firebase_admin import credentials, auth
 from app.core.config import settings
+from app.core.executors import run_blocking, TOKEN_VERIFICATION, FIREBASE_AUTH
+from app.utils.cache import TTLCache
+from typing import Any, Dict, Optional
+import hashlib
 import json
 import os
+import time
 
 # Initialize Firebase Admin SDK
 def init_firebase():
@@ -43,6 +48,117 @@ try:
 except Exception as e:
     print(f"Warning: Firebase initialization failed: {e}")
 
+# Decoded claims of already verified ID tokens, keyed by token hash
+# Firebase ID tokens live one hour, entries never outlive the token's exp
+_token_cache = TTLCache(max_size=settings.TOKEN_CACHE_MAX_SIZE, ttl_seconds=3600)
+
+
+def _token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+async def verify_id_token_cached(token: str, force_refresh: bool = False) -> Dict[str, Any]:
+    """
+    Verify a Firebase ID token, reusing the decoded claims of a previous verification
+    
+    Args:
+        token: Raw ID token
+        force_refresh: Skip the cache and re-run the signature check
+    
+    Returns:
+        Decoded token claims
+    """
+    key = _token_cache_key(token)
+    if not force_refresh:
+        cached = _token_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+    
+    # Signature verification is CPU-bound (and may fetch public keys), keep it off the event loop
+    decoded_token = await run_blocking(TOKEN_VERIFICATION, auth.verify_id_token, token)
+    
+    expires_in = decoded_token.get("exp", 0) - time.time()
+    if expires_in > 0:
+        _token_cache.set(key, decoded_token, ttl_seconds=expires_in)
+    return dict(decoded_token)
+
+
+def invalidate_token_cache(uid: Optional[str] = None) -> int:
+    """
+    Force re-verification of cached tokens
+    
+    Args:
+        uid: Only drop this user's tokens (None drops every token)
+    
+    Returns:
+        Number of tokens dropped
+    """
+    if uid is None:
+        dropped = _token_cache.stats()["size"]
+        _token_cache.clear()
+        return dropped
+    return _token_cache.invalidate_where(lambda key, claims: claims.get("uid") == uid)
+
+
+def get_token_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the token cache"""
+    return _token_cache.stats()
+
+
+# Revocation time (epoch seconds) of each admin's tokens, re-read from Firebase
+# Auth at most every REVOCATION_CHECK_TTL_SECONDS: a demotion on any instance
+# is seen everywhere within that delay
+REVOCATION_CHECK_TTL_SECONDS = 30
+_revocation_cache = TTLCache(max_size=1000, ttl_seconds=REVOCATION_CHECK_TTL_SECONDS)
+
+
+async def _tokens_valid_after(uid: str) -> float:
+    valid_after = _revocation_cache.get(uid)
+    if valid_after is None:
+        user = await run_blocking(FIREBASE_AUTH, auth.get_user, uid)
+        valid_after = (user.tokens_valid_after_timestamp or 0) / 1000
+        _revocation_cache.set(uid, valid_after)
+    return valid_after
+
+
+async def is_token_revoked(token_data: Dict[str, Any]) -> bool:
+    """
+    Whether a verified token was issued before its user's tokens were revoked
+    (what verify_id_token(check_revoked=True) checks, with a short cache)
+    
+    Unverifiable tokens (Firebase Auth unreachable) count as revoked.
+    """
+    try:
+        return (token_data.get("iat") or 0) < await _tokens_valid_after(token_data.get("uid"))
+    except Exception as e:
+        print(f"Token revocation check error: {str(e)}")
+        return True
+
+
+async def set_role_claim(uid: str, role: str):
+    """
+    Store the user's role in its Firebase custom claims
+    
+    Tokens issued after this call carry the "role" claim, so admin routes can
+    authorize without reading Firestore. Other custom claims are preserved.
+    """
+    user = await run_blocking(FIREBASE_AUTH, auth.get_user, uid)
+    claims = dict(user.custom_claims or {})
+    if claims.get("role") == role:
+        return
+    previous_role = claims.get("role")
+    claims["role"] = role
+    await run_blocking(FIREBASE_AUTH, auth.set_custom_user_claims, uid, claims)
+    
+    if previous_role == "admin" and role != "admin":
+        # A demoted admin must sign in again: existing ID tokens still carry the
+        # old claim until they expire, revoking them stops renewals and makes
+        # every instance stop trusting their admin claim (is_token_revoked)
+        await run_blocking(FIREBASE_AUTH, auth.revoke_refresh_tokens, uid)
+        _revocation_cache.invalidate(uid)
+    invalidate_token_cache(uid)
+
+
 # HTTP Bearer token scheme
 # auto_error=False allows us to handle errors manually and return 401 instead of 403
 security = HTTPBearer(auto_error=False)
@@ -67,7 +183,7 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
                 detail="No authentication token provided",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = await verify_id_token_cached(token)
         return decoded_token
     except HTTPException:
         raise
@@ -83,11 +199,20 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
 async def get_current_user(token_data: dict = Depends(verify_token)) -> dict:
     """
     Get current authenticated user from token
+    
+    The admin role claim is only kept if the token was not revoked since it
+    was issued (demotions revoke tokens); otherwise role is None and admin
+    routes check the Firestore role instead.
     """
+    role = token_data.get("role")
+    if role == "admin" and await is_token_revoked(token_data):
+        role = None
     return {
         "uid": token_data.get("uid"),
         "email": token_data.get("email"),
         "name": token_data.get("name"),
         "picture": token_data.get("picture"),
+        # Custom claim, absent from tokens issued before the role was synced
+        "role": role,
     }
 
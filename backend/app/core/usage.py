@@ -0,0 +1,144 @@
+import threading
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+from app.core.config import settings
+
+# Response headers carrying the request's datastore usage (development only)
+USAGE_HEADERS = {
+    "reads": "X-Firestore-Reads",
+    "writes": "X-Firestore-Writes",
+    "queries": "X-Firestore-Queries",
+    "gcs_operations": "X-GCS-Operations",
+}
+
+
+@dataclass
+class RequestUsage:
+    """Datastore operations issued while serving one request"""
+    reads: int = 0
+    writes: int = 0
+    queries: int = 0
+    gcs_operations: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+# Usage of the request being served, None outside requests (scripts, startup)
+_current_usage: ContextVar[Optional[RequestUsage]] = ContextVar("request_usage", default=None)
+
+
+def current_usage() -> Optional[RequestUsage]:
+    return _current_usage.get()
+
+
+def record_reads(count: int = 1):
+    """Count documents read (billed reads) for the current request"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.reads += count
+
+
+def record_writes(count: int = 1):
+    """Count documents written or deleted for the current request"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.writes += count
+
+
+def record_query():
+    """Count a query (or aggregation) issued for the current request"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.queries += 1
+
+
+def record_gcs_operation(count: int = 1):
+    """Count GCS API calls (upload, download, list, exists, delete) for the current request"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.gcs_operations += count
+
+
+class RouteUsageStats:
+    """
+    Datastore usage aggregated per route template since startup
+
+    Keyed by "METHOD /path/{param}" so every call of an endpoint lands in the
+    same bucket whatever its path parameters.
+    """
+
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, usage: RequestUsage):
+        with self._lock:
+            totals = self._routes.get(route)
+            if totals is None:
+                totals = self._routes[route] = {"requests": 0, "reads": 0, "writes": 0, "queries": 0, "gcs_operations": 0}
+            totals["requests"] += 1
+            for name, value in usage.as_dict().items():
+                totals[name] += value
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Totals and per-request averages, routes with the most reads first"""
+        with self._lock:
+            routes = {route: dict(totals) for route, totals in self._routes.items()}
+        for totals in routes.values():
+            totals["reads_per_request"] = round(totals["reads"] / totals["requests"], 2)
+            totals["writes_per_request"] = round(totals["writes"] / totals["requests"], 2)
+        return dict(sorted(routes.items(), key=lambda item: item[1]["reads"], reverse=True))
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_usage = RouteUsageStats()
+
+
+def _route_name(scope: Dict[str, Any]) -> str:
+    """Route template of a served request (unmatched paths share one bucket)"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return f"{scope['method']} <unmatched>"
+    return f"{scope['method']} {path}"
+
+
+class UsageMiddleware:
+    """
+    ASGI middleware opening a RequestUsage for each HTTP request
+
+    In development the totals are added as response headers (counted when the
+    response starts, so a streamed body's later operations are not included);
+    in every environment they are added to the per-route counters.
+    """
+
+    def __init__(self, app, expose_headers: Optional[bool] = None):
+        self.app = app
+        self.expose_headers = settings.ENVIRONMENT == "development" if expose_headers is None else expose_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        usage = RequestUsage()
+        token = _current_usage.set(usage)
+
+        async def send_with_usage(message):
+            if message["type"] == "http.response.start" and self.expose_headers:
+                headers = list(message.get("headers", []))
+                for name, header in USAGE_HEADERS.items():
+                    headers.append((header.lower().encode("latin-1"), str(getattr(usage, name)).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_usage)
+        finally:
+            _current_usage.reset(token)
+            route_usage.record(_route_name(scope), usage)
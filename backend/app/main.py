@@ -1,7 +1,13 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import Depends, FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.security import init_firebase
+from app.core.executors import get_executor_stats, shutdown_executors
+from app.core import metrics
+from app.core.usage import UsageMiddleware, USAGE_HEADERS
+from app.utils.pagination import NEXT_PAGE_TOKEN_HEADER
 
 # Initialize Firebase Admin SDK before importing routes
 try:
@@ -11,6 +17,12 @@ except Exception as e:
     print("Make sure Firebase credentials are configured in .env file")
 
 from app.api.routes import auth, ai, monitoring, analytics, ai_analytics, poi, routing, ads, quiz
+from app.api.deps import get_metrics_reader
+from app.core.security import get_token_cache_stats
+from app.services.firestore import FirestoreService, rollup_buffer
+from app.services.analytics_snapshot import analytics_snapshot
+from app.services import enrichment
+from app.services.dashboards import dashboard_scheduler
 
 app = FastAPI(
     title="City Platform API",
@@ -28,10 +40,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "HEAD"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    # "*" is not honored by browsers on credentialed requests, list custom headers explicitly
+    expose_headers=["*", NEXT_PAGE_TOKEN_HEADER, *USAGE_HEADERS.values()],
     max_age=3600,
 )
 
+# Datastore read/write accounting and latency metrics per request (added last
+# so they wrap CORS too, metrics outermost to time the whole stack)
+app.add_middleware(UsageMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.register_cache("user", FirestoreService.get_user_cache_stats)
+metrics.register_cache("token", get_token_cache_stats)
+metrics.register_cache("analytics_snapshot", analytics_snapshot.stats)
+metrics.register_cache("user_agent", enrichment.user_agent_cache_stats)
+metrics.register_cache("dashboards", dashboard_scheduler.stats)
+metrics.register_executors(get_executor_stats)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(ai.router, prefix="/api/v1/ai", tags=["ai"])
@@ -44,6 +69,32 @@ app.include_router(ads.router, prefix="/api/v1", tags=["ads"])
 app.include_router(quiz.router, prefix="/api/v1", tags=["quiz"])
 
 
+_event_loop_monitor = None
+_dashboard_refresher = None
+
+
+@app.on_event("startup")
+async def startup():
+    global _event_loop_monitor, _dashboard_refresher
+    if settings.EVENT_LOOP_LAG_INTERVAL_SECONDS > 0:
+        _event_loop_monitor = asyncio.create_task(
+            metrics.monitor_event_loop_lag(settings.EVENT_LOOP_LAG_INTERVAL_SECONDS)
+        )
+    if dashboard_scheduler.enabled:
+        _dashboard_refresher = asyncio.create_task(dashboard_scheduler.run())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _event_loop_monitor is not None:
+        _event_loop_monitor.cancel()
+    if _dashboard_refresher is not None:
+        _dashboard_refresher.cancel()
+    # Rollup increments still buffered would be lost with the process
+    await rollup_buffer.flush()
+    shutdown_executors()
+
+
 @app.get("/")
 async def root():
     return {"message": "City Platform API", "version": "0.1.0"}
@@ -53,3 +104,8 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(reader: dict = Depends(get_metrics_reader)):
+    """Prometheus text exposition of latency histograms, gauges and cache ratios"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
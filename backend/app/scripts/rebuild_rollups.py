@@ -0,0 +1,51 @@
+"""
+Rebuild the derived analytics documents from the raw ones: page-visit rollups
+(hourly/daily), sessions and page-flow rollups, and weekly retention cohorts
+from page_visits, AI-event rollups (daily) from ai_events, and the
+enrichment fields (device type, browser, OS, channel) of page_visits
+
+Needed once after deploying them (documents logged before have none), or to
+repair them after a failed write.
+
+Usage (from backend/):
+    python -m app.scripts.rebuild_rollups [--since YYYY-MM-DD] [--only visits|ai-events|sessions|retention|enrichment]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from app.core.logging import logger
+from app.core.security import init_firebase
+from app.services.firestore import FirestoreService
+
+TARGETS = ["visits", "ai-events", "sessions", "retention", "enrichment"]
+
+
+async def rebuild(since, targets) -> int:
+    written = 0
+    if "visits" in targets:
+        written += await FirestoreService.rebuild_page_visit_rollups(start_time=since)
+    if "ai-events" in targets:
+        written += await FirestoreService.rebuild_ai_event_rollups()
+    if "sessions" in targets:
+        written += await FirestoreService.rebuild_sessions()
+    if "retention" in targets:
+        written += await FirestoreService.rebuild_retention()
+    if "enrichment" in targets:
+        written += await FirestoreService.enrich_page_visits()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute rollups, sessions and visit enrichment from the raw documents")
+    parser.add_argument("--since", help="Only rebuild page-visit rollup days from this UTC date (YYYY-MM-DD), default: all")
+    parser.add_argument("--only", choices=TARGETS, help="Rebuild one kind of document, default: all")
+    args = parser.parse_args()
+    
+    since = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc) if args.since else None
+    init_firebase()
+    written = asyncio.run(rebuild(since, [args.only] if args.only else TARGETS))
+    logger.info(f"Wrote {written} documents")
+
+
+if __name__ == "__main__":
+    main()
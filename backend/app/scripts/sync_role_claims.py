@@ -0,0 +1,48 @@
+"""
+Backfill the "role" Firebase custom claim from the Firestore users collection
+
+Users whose claim already matches are left alone; only admins demoted by the
+sync have their refresh tokens revoked (and must sign in again).
+
+Usage (from backend/):
+    python -m app.scripts.sync_role_claims [--dry-run]
+"""
+import argparse
+import asyncio
+from app.core.logging import logger
+from app.core.security import init_firebase, set_role_claim
+from app.services.firestore import FirestoreService
+
+
+async def sync_role_claims(dry_run: bool = False) -> int:
+    """Set the role claim of every user to its Firestore role, returns the number of users processed"""
+    users = await FirestoreService.list_users()
+    synced = 0
+    for user_data in users:
+        uid = user_data["uid"]
+        role = user_data.get("role", "user")
+        if dry_run:
+            logger.info(f"[dry-run] {uid}: role={role}")
+            synced += 1
+            continue
+        try:
+            await set_role_claim(uid, role)
+            synced += 1
+        except Exception as e:
+            # Users present in Firestore but deleted from Firebase Auth
+            logger.warning(f"Could not sync role claim for {uid}: {e}")
+    return synced
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync Firestore roles into Firebase custom claims")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the roles that would be set")
+    args = parser.parse_args()
+    
+    init_firebase()
+    synced = asyncio.run(sync_role_claims(dry_run=args.dry_run))
+    logger.info(f"Synced role claims for {synced} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,11 @@ from langchain.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage
 from typing import Optional, Dict, Any, List, AsyncIterator
+import asyncio
 import os
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.metrics import llm_call_duration
 from app.services.storage import StorageService
 from app.services.firestore import FirestoreService
 import uuid
@@ -85,13 +87,16 @@ class AIAgentService:
             raise ValueError(f"Unsupported LLM provider: {provider}")
     
     @staticmethod
-    def _load_documents() -> List[str]:
+    async def _load_documents() -> List[str]:
         """Load all documents from GCS"""
         try:
-            files = StorageService.list_files()
+            files = await StorageService.list_files()
+            # Downloads run concurrently, bounded by the GCS pool size
+            files_data = await asyncio.gather(
+                *(StorageService.get_file(file_info["filename"]) for file_info in files)
+            )
             documents = []
-            for file_info in files:
-                file_data = StorageService.get_file(file_info["filename"])
+            for file_data in files_data:
                 if file_data and file_data.get("content"):
                     documents.append(file_data["content"])
             return documents
@@ -100,7 +105,7 @@ class AIAgentService:
             return []
     
     @staticmethod
-    def _create_vector_store(
+    async def _create_vector_store(
         embedding_provider: str = "openai", 
         embedding_model: Optional[str] = None,
         conversation_id: Optional[str] = None,
@@ -115,7 +120,7 @@ class AIAgentService:
             return AIAgentService._vector_stores[cache_key]
         
         # Load documents
-        documents = AIAgentService._load_documents()
+        documents = await AIAgentService._load_documents()
         if not documents:
             raise ValueError("No documents available. Please upload documents first.")
         
@@ -154,7 +159,7 @@ class AIAgentService:
             
             # Note: We don't have user_id here, so we'll log without it
             # Embedding events are system-level, not user-specific
-            FirestoreService.log_ai_event(
+            await FirestoreService.log_ai_event(
                 event_type="embedding_request",
                 user_id="system",  # System-level event
                 conversation_id=conversation_id,
@@ -184,7 +189,7 @@ class AIAgentService:
         return vector_store
     
     @staticmethod
-    def _get_memory(conversation_id: str, user_id: Optional[str] = None) -> ConversationBufferMemory:
+    async def _get_memory(conversation_id: str, user_id: Optional[str] = None) -> ConversationBufferMemory:
         """Get or create memory for a conversation, loading history from Firestore if available"""
         # Always reload memory from Firestore to ensure it's up to date with latest messages
         memory = ConversationBufferMemory(
@@ -196,7 +201,7 @@ class AIAgentService:
         # Load conversation history from Firestore if available
         if user_id and conversation_id:
             try:
-                conv_data = FirestoreService.get_conversation(conversation_id, user_id)
+                conv_data = await FirestoreService.get_conversation(conversation_id, user_id)
                 if conv_data and conv_data.get("messages"):
                     messages = conv_data.get("messages", [])
                     # Load ALL previous messages (the current question hasn't been saved yet)
@@ -230,7 +235,7 @@ class AIAgentService:
         return memory
     
     @staticmethod
-    def _get_chain(
+    async def _get_chain(
         conversation_id: str,
         embedding_provider: str = "openai",
         embedding_model: Optional[str] = None,
@@ -246,7 +251,7 @@ class AIAgentService:
         # Always create a fresh chain with fresh memory
         
         # Get vector store
-        vector_store = AIAgentService._create_vector_store(
+        vector_store = await AIAgentService._create_vector_store(
             embedding_provider, 
             embedding_model,
             conversation_id,
@@ -255,7 +260,7 @@ class AIAgentService:
         )
         
         # Get memory (always reload to get latest conversation history)
-        memory = AIAgentService._get_memory(conversation_id, user_id)
+        memory = await AIAgentService._get_memory(conversation_id, user_id)
         
         # Get LLM
         llm = AIAgentService._get_llm(llm_provider, llm_model)
@@ -323,7 +328,7 @@ Answer:"""
             conversation_id = str(uuid.uuid4())
         
         try:
-            chain = AIAgentService._get_chain(
+            chain = await AIAgentService._get_chain(
                 conversation_id,
                 embedding_provider,
                 embedding_model,
@@ -336,7 +341,7 @@ Answer:"""
             )
             
             # Debug: Check memory state before query
-            memory = AIAgentService._get_memory(conversation_id, user_id)
+            memory = await AIAgentService._get_memory(conversation_id, user_id)
             chat_history = memory.chat_memory.messages
             logger.info(f"Memory state before query - {len(chat_history)} messages in memory for conversation {conversation_id}")
             if chat_history:
@@ -352,7 +357,8 @@ Answer:"""
             
             # Run chain
             logger.info(f"Invoking chain with question: {question[:100]}...")
-            result = await chain.ainvoke({"question": question})
+            with llm_call_duration.time(provider=llm_provider, mode="query"):
+                result = await chain.ainvoke({"question": question})
             logger.info(f"Chain completed - answer length: {len(result.get('answer', ''))}")
             logger.info(f"Answer preview: {result.get('answer', '')[:200]}")
             
@@ -391,7 +397,7 @@ Answer:"""
             conversation_id = str(uuid.uuid4())
         
         try:
-            chain = AIAgentService._get_chain(
+            chain = await AIAgentService._get_chain(
                 conversation_id,
                 embedding_provider,
                 embedding_model,
@@ -403,10 +409,11 @@ Answer:"""
                 user_id
             )
             
-            # Run chain with streaming
-            async for chunk in chain.astream({"question": question}):
-                if "answer" in chunk:
-                    yield chunk["answer"]
+            # Run chain with streaming (timed until the last chunk)
+            with llm_call_duration.time(provider=llm_provider, mode="stream"):
+                async for chunk in chain.astream({"question": question}):
+                    if "answer" in chunk:
+                        yield chunk["answer"]
         except Exception as e:
             logger.error(f"Error streaming from AI agent: {e}")
             raise
@@ -0,0 +1,108 @@
+"""
+Short-lived snapshot of the analytics source data, shared by the dashboard tabs
+
+Opening the admin analytics page requests every tab at once, and each tab
+needs some of the same data (the page visits and sessions of the selected
+window, the daily rollups). The snapshot loads each dataset once per TTL,
+process and window: the first request starts the load, concurrent ones await
+the same load instead of scanning again, and later ones reuse the result
+until it expires.
+
+Datasets are shared between requests: callers must not mutate them.
+"""
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from app.core.config import settings
+from app.services import enrichment, rollups
+from app.services.firestore import FirestoreService
+from app.services.visit_table import VisitTable
+from app.utils.cache import TTLCache
+
+# Page-visit fields read by the acquisition tab (through the visit table)
+PAGE_VISIT_FIELDS = ["page_path", "session_id", "analytics_session_id"] + enrichment.ENRICHED_FIELDS
+
+
+class AnalyticsSnapshot:
+    """TTL cache of datasets with single-flight loading"""
+
+    def __init__(self, ttl_seconds: float):
+        self._cache = TTLCache(max_size=32, ttl_seconds=ttl_seconds)
+        self._loading: Dict[Hashable, asyncio.Task] = {}
+
+    async def _get(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(key, load))
+            self._loading[key] = task
+        # A cancelled request must not cancel the load others are waiting for
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await load()
+            self._cache.set(key, value)
+            return value
+        finally:
+            self._loading.pop(key, None)
+
+    async def page_visits(self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Page visits started in [start_time, end_time] (PAGE_VISIT_FIELDS only), newest first"""
+        return await self._get(
+            ("page_visits", start_time, end_time),
+            lambda: FirestoreService.get_page_visits(start_time=start_time, end_time=end_time, fields=PAGE_VISIT_FIELDS),
+        )
+
+    async def visit_table(self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> VisitTable:
+        """Page visits started in [start_time, end_time] as a columnar table (built once per snapshot of the visits)"""
+        async def build():
+            return VisitTable(await self.page_visits(start_time, end_time))
+        return await self._get(("visit_table", start_time, end_time), build)
+
+    async def sessions(self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Sessions started in [start_time, end_time], oldest first"""
+        return await self._get(
+            ("sessions", start_time, end_time),
+            lambda: FirestoreService.get_sessions(start_time=start_time, end_time=end_time),
+        )
+
+    async def page_sequences(self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Sessions started in [start_time, end_time] per encoded page sequence
+        (see sessions.encode_pages), sessions without one left out
+        """
+        async def load():
+            documents = await FirestoreService.get_sessions(start_time=start_time, end_time=end_time, fields=["page_sequence"])
+            return dict(Counter(document["page_sequence"] for document in documents if document.get("page_sequence")))
+        return await self._get(("page_sequences", start_time, end_time), load)
+
+    async def daily_rollups_since(self, start_time: datetime, end_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Daily page-visit rollups from the day containing start_time to the one containing end_time"""
+        first = rollups.bucket_start(start_time, rollups.DAY)
+        last = rollups.bucket_start(end_time, rollups.DAY) if end_time else None
+        return await self._get(
+            ("daily_rollups", first, last),
+            lambda: FirestoreService.get_page_visit_rollups(rollups.DAY, first, last),
+        )
+
+    async def daily_page_flows_since(self, start_time: datetime, end_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Daily page-flow rollups from the day containing start_time to the one containing end_time"""
+        first = rollups.bucket_start(start_time, rollups.DAY)
+        last = rollups.bucket_start(end_time, rollups.DAY) if end_time else None
+        return await self._get(
+            ("page_flows", first, last),
+            lambda: FirestoreService.get_page_flow_rollups(first, last),
+        )
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+analytics_snapshot = AnalyticsSnapshot(ttl_seconds=settings.ANALYTICS_SNAPSHOT_TTL_SECONDS)
@@ -0,0 +1,202 @@
+"""
+Precomputed admin dashboard payloads, served stale-while-revalidate
+
+Each dashboard endpoint (analytics, AI analytics, monitoring stats) is a key
+and a function computing its payload. serve() answers from the latest payload
+held in memory and, once it is older than the refresh interval, refreshes it
+in the background: admins only wait for a computation the first time a key is
+requested and no instance has a payload for it yet. Payloads computed by
+scanning raw collections (visits, sessions, AI conversations and traces) are
+refreshed on a much longer interval than those read from rollups.
+
+Payloads are shared between instances through the dashboard_payloads
+collection. A refresh first reads the stored payload and adopts it if another
+instance computed it recently; otherwise it recomputes it under a
+per-dashboard lease (leases collection), so only one instance does the work
+when several are running. The scheduler loop (run()) keeps refreshing the
+keys requested in the last IDLE_SECONDS, so tabs stay warm while admins use
+them; nothing is recomputed once nobody has opened a dashboard for that long.
+
+Keys only cover the standard windows (a period ending now): dashboards over
+explicit start/end windows are computed on demand, not stored.
+"""
+import asyncio
+import contextvars
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.core.config import settings
+from app.core.logging import logger
+from app.services import rollups
+from app.services.firestore import FirestoreService
+
+Compute = Callable[[], Awaitable[Dict[str, Any]]]
+
+# Keys not requested for this long are no longer refreshed, and forgotten
+IDLE_SECONDS = 15 * 60
+
+
+def dashboard_key(name: str, **params: Any) -> str:
+    """Key (and stored document id) of a dashboard for some parameters, None parameters left out"""
+    parts = [name]
+    for param, value in sorted(params.items()):
+        if value is not None:
+            parts.append(f"{param}={value.isoformat() if isinstance(value, datetime) else value}")
+    return ";".join(parts)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class _Dashboard:
+    def __init__(self, compute: Compute, refresh_seconds: float):
+        self.compute = compute
+        self.refresh_seconds = refresh_seconds
+        self.payload: Optional[Dict[str, Any]] = None
+        self.computed_at = 0.0
+        self.requested_at = 0.0
+
+
+class DashboardScheduler:
+    """Dashboard payloads kept fresh in the background, shared between instances"""
+
+    def __init__(self, refresh_seconds: float, scan_refresh_seconds: float, lease_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.scan_refresh_seconds = max(scan_refresh_seconds, refresh_seconds)
+        self.lease_seconds = lease_seconds
+        self.instance_id = uuid.uuid4().hex
+        self._dashboards: Dict[str, _Dashboard] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.computations = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.refresh_seconds > 0
+
+    async def serve(self, key: str, compute: Compute, scan: bool = False) -> Dict[str, Any]:
+        """
+        Latest payload of key, computed while waiting only if there is none yet
+
+        scan: compute reads raw collections, refresh it every scan_refresh_seconds
+        """
+        if not self.enabled:
+            return await compute()
+        dashboard = self._dashboards.get(key)
+        if dashboard is None:
+            refresh_seconds = self.scan_refresh_seconds if scan else self.refresh_seconds
+            dashboard = self._dashboards[key] = _Dashboard(compute, refresh_seconds)
+        dashboard.requested_at = time.time()
+        if dashboard.payload is None:
+            self.misses += 1
+            try:
+                await self._refresh(key)
+            except Exception:
+                if dashboard.payload is None:
+                    self._dashboards.pop(key, None)
+                raise
+            return dashboard.payload
+        self.hits += 1
+        if self._is_stale(dashboard) and key not in self._refreshing:
+            # Detached from the request's context: its reads are not the request's
+            asyncio.get_running_loop().create_task(self._refresh_quietly(key), context=contextvars.Context())
+        return dashboard.payload
+
+    async def run(self):
+        """Refresh the stale dashboards requested in the last IDLE_SECONDS every half refresh interval, until cancelled"""
+        while True:
+            now = time.time()
+            for key, dashboard in list(self._dashboards.items()):
+                if now - dashboard.requested_at > IDLE_SECONDS:
+                    self._dashboards.pop(key, None)
+                elif self._is_stale(dashboard):
+                    await self._refresh_quietly(key)
+            await asyncio.sleep(max(self.refresh_seconds / 2, 1))
+
+    def _is_stale(self, dashboard: _Dashboard) -> bool:
+        return time.time() - dashboard.computed_at >= dashboard.refresh_seconds
+
+    async def _refresh(self, key: str):
+        """Refresh key once at a time: concurrent callers await the same refresh"""
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load_or_compute(key))
+            self._refreshing[key] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        # A cancelled request must not cancel the refresh others are waiting for
+        await asyncio.shield(task)
+
+    async def _refresh_quietly(self, key: str):
+        try:
+            await self._refresh(key)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Error refreshing dashboard {key}: {e}")
+
+    async def _load_or_compute(self, key: str):
+        dashboard = self._dashboards.get(key)
+        if dashboard is None:
+            return
+        stored = await FirestoreService.get_dashboard_payload(key)
+        if stored is not None:
+            computed_at = rollups.to_utc(stored["computed_at"]).timestamp()
+            if computed_at > dashboard.computed_at:
+                dashboard.payload, dashboard.computed_at = json.loads(stored["payload_json"]), computed_at
+            if not self._is_stale(dashboard):
+                return
+
+        lease = f"dashboard:{key}"
+        if not await FirestoreService.acquire_lease(lease, self.instance_id, self.lease_seconds):
+            if dashboard.payload is not None:
+                # Another instance is recomputing it: keep the stale payload meanwhile
+                return
+            # Nothing stored yet and a client is waiting: compute without storing
+            payload_json = await self._compute(dashboard)
+            dashboard.payload, dashboard.computed_at = json.loads(payload_json), time.time()
+            return
+        try:
+            payload_json = await self._compute(dashboard)
+            computed_at = datetime.now(timezone.utc)
+            await FirestoreService.set_dashboard_payload(key, payload_json, computed_at)
+            # Served as the stored copy is (datetimes as ISO strings)
+            dashboard.payload, dashboard.computed_at = json.loads(payload_json), computed_at.timestamp()
+        finally:
+            await FirestoreService.release_lease(lease, self.instance_id)
+
+    async def _compute(self, dashboard: _Dashboard) -> str:
+        """Payload of a dashboard, JSON-encoded"""
+        self.computations += 1
+        return json.dumps(await dashboard.compute(), default=_json_default)
+
+    def stats(self) -> Dict[str, Any]:
+        """Dashboards held, hits (served from memory) and misses (computed or loaded while waiting)"""
+        lookups = self.hits + self.misses
+        now = time.time()
+        return {
+            "size": len(self._dashboards),
+            "refresh_seconds": self.refresh_seconds,
+            "scan_refresh_seconds": self.scan_refresh_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "computations": self.computations,
+            "failures": self.failures,
+            "ages_seconds": {
+                key: round(now - dashboard.computed_at, 1)
+                for key, dashboard in self._dashboards.items() if dashboard.payload is not None
+            },
+        }
+
+
+dashboard_scheduler = DashboardScheduler(
+    refresh_seconds=settings.DASHBOARD_REFRESH_SECONDS,
+    scan_refresh_seconds=settings.DASHBOARD_SCAN_REFRESH_SECONDS,
+    lease_seconds=settings.DASHBOARD_LEASE_SECONDS,
+)
@@ -0,0 +1,133 @@
+"""
+Ingest-time enrichment of page visits
+
+Page visits are classified when they are logged: device type, browser and OS
+from the user agent (parsed once per distinct user agent, LRU-memoized) and
+acquisition channel from the custom channel, UTM parameters or referrer. The
+normalized values are stored on the visit (ENRICHED_FIELDS), so analytics
+count them instead of re-parsing every visit on every request.
+"""
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+# Fields enrich_visit adds to a page visit
+ENRICHED_FIELDS = ["device_type", "browser", "os", "channel"]
+
+# Landing pages: the only visits whose referrer and UTM parameters say where the session came from
+LANDING_PAGES = ("/", "/login")
+
+USER_AGENT_CACHE_SIZE = 1024
+
+_TABLET_MARKERS = ["tablet", "ipad", "playbook", "silk"]
+_MOBILE_MARKERS = ["mobile", "iphone", "ipod", "android", "blackberry", "opera", "mini", "windows ce", "palm", "smartphone", "iemobile"]
+
+
+def _missing(value: Any) -> bool:
+    return value is None or value in ("", "null", "None", "unknown")
+
+
+def browser_name(user_agent: Optional[str]) -> str:
+    ua_lower = (user_agent or "").lower()
+    if "chrome" in ua_lower and "edg" not in ua_lower:
+        return "Chrome"
+    if "firefox" in ua_lower:
+        return "Firefox"
+    if "safari" in ua_lower and "chrome" not in ua_lower:
+        return "Safari"
+    if "edg" in ua_lower:
+        return "Edge"
+    return "Other"
+
+
+def os_name(user_agent: Optional[str]) -> str:
+    ua_lower = (user_agent or "").lower()
+    if "windows" in ua_lower:
+        return "Windows"
+    if "mac" in ua_lower or "darwin" in ua_lower:
+        return "macOS"
+    if "linux" in ua_lower:
+        return "Linux"
+    if "android" in ua_lower:
+        return "Android"
+    if "ios" in ua_lower or "iphone" in ua_lower or "ipad" in ua_lower:
+        return "iOS"
+    return "Other"
+
+
+def device_from_user_agent(user_agent: Optional[str]) -> str:
+    if _missing(user_agent):
+        return "unknown"
+    ua_lower = user_agent.lower()
+    if any(marker in ua_lower for marker in _TABLET_MARKERS):
+        return "tablet"
+    if any(marker in ua_lower for marker in _MOBILE_MARKERS):
+        return "mobile"
+    return "desktop"
+
+
+@lru_cache(maxsize=USER_AGENT_CACHE_SIZE)
+def parse_user_agent(user_agent: str) -> Tuple[str, str, str]:
+    """(browser, OS, device type) of a user agent"""
+    return browser_name(user_agent), os_name(user_agent), device_from_user_agent(user_agent)
+
+
+def user_agent_cache_stats() -> Dict[str, Any]:
+    """parse_user_agent's LRU stats, in TTLCache.stats() format"""
+    info = parse_user_agent.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "ttl_seconds": None,
+        "hits": info.hits,
+        "misses": info.misses,
+        "evictions": None,
+        "hit_ratio": round(info.hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def acquisition_channel(visit: Dict[str, Any]) -> str:
+    """Channel a visit came from: custom channel, then UTM parameters, then referrer"""
+    acquisition = visit.get("acquisition_channel")
+    utm_source = visit.get("utm_source")
+    utm_medium = visit.get("utm_medium")
+    if acquisition:
+        return str(acquisition)
+    if utm_source and utm_medium:
+        return f"{utm_source}_{utm_medium}"
+    if utm_source:
+        return str(utm_source)
+
+    referrer = visit.get("referrer") or visit.get("previous_page") or visit.get("referer") or None
+    # The frontend's own origin is direct traffic
+    if isinstance(referrer, str) and ("localhost:3000" in referrer or "127.0.0.1:3000" in referrer):
+        referrer = None
+    if not referrer or referrer in ("unknown", "null") or (isinstance(referrer, str) and referrer.startswith("/")):
+        return "direct"
+    if not isinstance(referrer, str):
+        return "referral"
+    referrer = referrer.lower()
+    if "google" in referrer:
+        return "organic_search"
+    if any(social in referrer for social in ["facebook", "twitter", "instagram", "linkedin"]):
+        return "social"
+    return "referral"
+
+
+def enrich_visit(visit: Dict[str, Any]) -> Dict[str, str]:
+    """
+    ENRICHED_FIELDS of a page visit (its raw fields: user_agent, device_type,
+    referrer, UTM parameters...)
+
+    The device type sent by the frontend wins; the user agent's is used when
+    it sent none.
+    """
+    user_agent = visit.get("user_agent")
+    browser, os, device = parse_user_agent(user_agent if isinstance(user_agent, str) else "")
+    device_type = visit.get("device_type")
+    return {
+        "device_type": device if _missing(device_type) else str(device_type),
+        "browser": browser,
+        "os": os,
+        "channel": acquisition_channel(visit),
+    }
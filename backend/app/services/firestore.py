@@ -1,22 +1,30 @@
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from datetime import datetime, timedelta, timezone
 from app.core.logging import logger
 from app.core.config import settings
+from app.core.metrics import firestore_operation_duration
+from app.core.usage import record_query, record_reads, record_writes
+from app.services.memory_store import MemoryClient
+from app.services import enrichment, retention, rollups, sessions
+from app.utils.cache import TTLCache
+from app.utils.pagination import clamp_page_size, decode_page_token, encode_page_token
 import firebase_admin
 from google.oauth2 import service_account
+import asyncio
+import contextvars
+import inspect
+import time
 import uuid
 
-# Lazy initialization of Firestore client
+# Lazy initialization of Firestore clients
 _db = None
+_async_db = None
 
-def get_db():
-    """Get Firestore client with proper credentials (lazy initialization)"""
-    global _db
-    if _db is not None:
-        return _db
-    
+
+def _get_credentials():
+    """Build service account credentials compatible with google-auth-library-python"""
     # Ensure Firebase Admin is initialized
     if not firebase_admin._apps:
         from app.core.security import init_firebase
@@ -31,7 +39,7 @@ def get_db():
     # Use the same credentials as Firebase Admin but create service account credentials
     if settings.FIREBASE_SERVICE_ACCOUNT_PATH:
         # Use service account file if available
-        credentials = service_account.Credentials.from_service_account_file(
+        return service_account.Credentials.from_service_account_file(
             settings.FIREBASE_SERVICE_ACCOUNT_PATH
         )
     elif settings.FIREBASE_PRIVATE_KEY:
@@ -46,39 +54,528 @@ def get_db():
             "auth_uri": settings.FIREBASE_AUTH_URI,
             "token_uri": settings.FIREBASE_TOKEN_URI,
         }
-        credentials = service_account.Credentials.from_service_account_info(
+        return service_account.Credentials.from_service_account_info(
             service_account_info
         )
-    else:
-        raise ValueError("Firebase credentials not configured. Please check your .env file.")
+    raise ValueError("Firebase credentials not configured. Please check your .env file.")
+
+
+def get_db():
+    """Get blocking Firestore client (lazy initialization), for scripts outside the event loop"""
+    global _db
+    if _db is not None:
+        return _db
+    if settings.FIRESTORE_BACKEND == "memory":
+        raise RuntimeError("The blocking Firestore client is not available with FIRESTORE_BACKEND=memory")
     
-    # Create Firestore client with explicit credentials
-    _db = firestore.Client(project=project_id, credentials=credentials)
+    credentials = _get_credentials()
+    _db = firestore.Client(project=settings.FIREBASE_PROJECT_ID, credentials=credentials)
     return _db
 
 
+def get_async_db():
+    """
+    Get Firestore AsyncClient (lazy initialization)
+    
+    Request handlers must use this client so a slow Firestore round trip
+    yields to the event loop instead of blocking every other request.
+    """
+    global _async_db
+    if _async_db is not None:
+        return _async_db
+    
+    if settings.FIRESTORE_BACKEND == "memory":
+        logger.warning("Using the in-memory Firestore backend, data will not be persisted")
+        _async_db = MemoryClient()
+        return _async_db
+    
+    credentials = _get_credentials()
+    _async_db = firestore.AsyncClient(project=settings.FIREBASE_PROJECT_ID, credentials=credentials)
+    return _async_db
+
+
+async def run_transaction(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run fn(transaction, *args, **kwargs) in a Firestore transaction
+    
+    fn reads through the transaction (doc_ref.get(transaction=transaction))
+    before writing with transaction.set/update/create/delete; it is retried
+    on contention, so it must not have side effects outside the transaction.
+    """
+    db = get_async_db()
+    if isinstance(db, MemoryClient):
+        return await db.run_transaction(fn, *args, **kwargs)
+    return await firestore.async_transactional(fn)(db.transaction(), *args, **kwargs)
+
+
+# Query filter as (field, operator, value), e.g. ("role", "==", "admin")
+QueryFilter = Tuple[str, str, Any]
+
+# Conversation fields needed by list views and statistics (everything but messages)
+CONVERSATION_METADATA_FIELDS = ["user_id", "title", "title_preview", "message_count", "created_at", "updated_at"]
+
+
+def _filtered_query(collection: str, filters: Optional[List[QueryFilter]] = None):
+    """Collection query with equality/range filters applied"""
+    query = get_async_db().collection(collection)
+    for field, op, value in filters or []:
+        query = query.where(filter=FieldFilter(field, op, value))
+    return query
+
+
+async def _aggregation_value(aggregation_query) -> Any:
+    """Run a single aggregation query and return its value (billed at least one read)"""
+    record_query()
+    record_reads()
+    with firestore_operation_duration.time(operation="aggregation"):
+        results = await aggregation_query.get()
+    if not results or not results[0]:
+        return None
+    return results[0][0].value
+
+
+async def _timed(documents, operation: str):
+    """
+    Iterate an async document stream, observing its latency once exhausted
+    
+    Time spent by the caller between documents is excluded.
+    """
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                doc = await documents.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - started
+            yield doc
+    finally:
+        firestore_operation_duration.observe(elapsed, operation=operation)
+
+
+async def _stream(query):
+    """Stream a query's documents, counting the query and its reads for the current request"""
+    record_query()
+    returned = 0
+    async for doc in _timed(query.stream(), "query"):
+        returned += 1
+        record_reads()
+        yield doc
+    if not returned:
+        # A query matching nothing is still billed one read
+        record_reads()
+
+
+async def _get_all(db, refs, **kwargs):
+    """Get several documents in one call, counting their reads for the current request"""
+    async for doc in _timed(db.get_all(refs, **kwargs), "get_all"):
+        record_reads()
+        yield doc
+
+
+async def _get(doc_ref, **kwargs):
+    """Get one document, counting the read for the current request"""
+    record_reads()
+    with firestore_operation_duration.time(operation="get"):
+        return await doc_ref.get(**kwargs)
+
+
+async def _write(operation: str, write, count: int = 1):
+    """Await a set/update/delete (or a batch commit of count writes), counting them for the current request"""
+    with firestore_operation_duration.time(operation=operation):
+        result = await write
+    record_writes(count)
+    return result
+
+
+def _add_rollups(batch, db, deltas: "rollups.RollupDeltas") -> int:
+    """Queue the rollup increments of deltas in a write batch, returns the number of writes"""
+    for (collection, doc_id), delta in deltas.items():
+        batch.set(db.collection(collection).document(doc_id), rollups.as_increments(delta), merge=True)
+    return len(deltas)
+
+
+async def _commit_rollups(db, deltas: "rollups.RollupDeltas") -> "rollups.RollupDeltas":
+    """
+    Write the rollup increments of deltas in batches, returns the deltas of the failed batches
+    
+    Firestore rejects a commit applying more than 500 field transforms to one
+    document, which a busy bucket merged over many visits exceeds (HLL
+    registers, sketch bins, per-page counts): each document's delta is split
+    (rollups.split_delta) and its k-th part is written in the k-th round of
+    batches, so no commit holds two parts of the same document.
+    """
+    rounds: List[rollups.RollupDeltas] = []
+    for key, delta in deltas.items():
+        for index, part in enumerate(rollups.split_delta(delta)):
+            if index == len(rounds):
+                rounds.append({})
+            rounds[index][key] = part
+    
+    failed: rollups.RollupDeltas = {}
+    for parts in rounds:
+        items = list(parts.items())
+        for first in range(0, len(items), BatchWriter.MAX_BATCH_SIZE):
+            chunk = dict(items[first:first + BatchWriter.MAX_BATCH_SIZE])
+            batch = db.batch()
+            writes = _add_rollups(batch, db, chunk)
+            try:
+                await _write("batch_commit", batch.commit(), count=writes)
+            except Exception as e:
+                logger.error(f"Error writing {writes} rollup documents: {e}")
+                rollups.merge_deltas(failed, chunk)
+    return failed
+
+
+class BatchWriter:
+    """
+    Buffered Firestore writes committed as WriteBatch chunks
+    
+    Operations are grouped in batches of at most 500 (Firestore's limit) and
+    each full batch is committed in the background while the caller keeps
+    queueing, with at most max_concurrency commits in flight. Batches are not
+    atomic with each other: a failed batch is logged and reported by flush().
+    
+    Usage:
+        async with FirestoreService.batch_writer() as writer:
+            async for doc in query.stream():
+                await writer.update(doc.reference, {...})
+        writer.written  # number of committed operations
+    """
+    
+    MAX_BATCH_SIZE = 500
+    
+    def __init__(self, batch_size: int = MAX_BATCH_SIZE, max_concurrency: Optional[int] = None):
+        self.batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        self.max_concurrency = max(1, max_concurrency or settings.FIRESTORE_BATCH_MAX_CONCURRENCY)
+        self._db = get_async_db()
+        self._batch = None
+        self._batch_ops = 0
+        self._in_flight: set = set()
+        self._errors: List[Exception] = []
+        self.written = 0
+        self.failed = 0
+    
+    async def set(self, doc_ref, data: Dict[str, Any], merge: bool = False):
+        await self._add("set", doc_ref, data, merge=merge)
+    
+    async def create(self, doc_ref, data: Dict[str, Any]):
+        await self._add("create", doc_ref, data)
+    
+    async def update(self, doc_ref, data: Dict[str, Any]):
+        await self._add("update", doc_ref, data)
+    
+    async def delete(self, doc_ref):
+        await self._add("delete", doc_ref)
+    
+    async def _add(self, operation: str, *args, **kwargs):
+        if self._batch is None:
+            self._batch = self._db.batch()
+        getattr(self._batch, operation)(*args, **kwargs)
+        self._batch_ops += 1
+        if self._batch_ops >= self.batch_size:
+            await self._dispatch()
+    
+    async def _dispatch(self):
+        """Start committing the current batch, waiting for a slot if all are busy"""
+        if self._batch is None:
+            return
+        batch, ops = self._batch, self._batch_ops
+        self._batch = None
+        self._batch_ops = 0
+        
+        while len(self._in_flight) >= self.max_concurrency:
+            _, self._in_flight = await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+        self._in_flight.add(asyncio.ensure_future(self._commit(batch, ops)))
+    
+    async def _commit(self, batch, ops: int):
+        try:
+            with firestore_operation_duration.time(operation="batch_commit"):
+                await batch.commit()
+            self.written += ops
+            record_writes(ops)
+        except Exception as e:
+            self.failed += ops
+            self._errors.append(e)
+            logger.error(f"Error committing batch of {ops} writes: {e}")
+    
+    async def flush(self):
+        """
+        Commit everything queued so far and wait for in-flight batches
+        
+        Raises:
+            Exception: the first commit error since the last flush
+        """
+        await self._dispatch()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight)
+            self._in_flight = set()
+        if self._errors:
+            errors, self._errors = self._errors, []
+            raise errors[0]
+
+    
+    async def __aenter__(self) -> "BatchWriter":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.flush()
+        else:
+            # Let already started commits finish, drop what was not dispatched
+            self._batch = None
+            if self._in_flight:
+                await asyncio.gather(*self._in_flight)
+                self._in_flight = set()
+
+
+# Rollup collections every page visit writes to (a few documents per hour, day
+# or week, shared by all users): their increments go through the RollupBuffer
+SHARED_ROLLUP_COLLECTIONS = frozenset([
+    *rollups.ROLLUP_COLLECTIONS.values(),
+    rollups.PAGE_FLOW_ROLLUP_COLLECTION,
+    retention.COHORT_COLLECTION,
+])
+
+
+def _split_shared(deltas: "rollups.RollupDeltas") -> Tuple["rollups.RollupDeltas", "rollups.RollupDeltas"]:
+    """(own, shared) parts of deltas: per-session documents, and those of SHARED_ROLLUP_COLLECTIONS"""
+    own: rollups.RollupDeltas = {}
+    shared: rollups.RollupDeltas = {}
+    for key, delta in deltas.items():
+        (shared if key[0] in SHARED_ROLLUP_COLLECTIONS else own)[key] = delta
+    return own, shared
+
+
+class RollupBuffer:
+    """
+    Rollup increments merged in memory and written off the request path
+    
+    Concurrent page visits all increment the same hourly, daily and weekly
+    documents, well past Firestore's sustained ~1 write/s per document.
+    Requests merge their deltas here instead, and flush_seconds after the
+    first pending delta a background flush writes each touched document
+    (split in several writes past 500 transforms, see _commit_rollups).
+    
+    A document failing to flush is retried with the next flushes, then dropped
+    after MAX_FLUSH_ATTEMPTS; at most max_documents are pending (more flush
+    right away, and failed ones past the cap are dropped). Dropped deltas,
+    and those pending when the process dies, are lost: the rebuild jobs
+    recompute the rollups from the visits.
+    """
+    
+    MAX_FLUSH_ATTEMPTS = 5
+    
+    def __init__(self, flush_seconds: float, max_documents: int):
+        self.flush_seconds = flush_seconds
+        self.max_documents = max(1, max_documents)
+        self._pending: rollups.RollupDeltas = {}
+        self._attempts: Dict[Tuple[str, str], int] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.dropped = 0
+    
+    async def add(self, deltas: "rollups.RollupDeltas"):
+        """Queue deltas for the next flush (written right away if flush_seconds is 0 or the buffer is full)"""
+        if not deltas:
+            return
+        rollups.merge_deltas(self._pending, deltas)
+        if self.flush_seconds <= 0 or len(self._pending) >= self.max_documents:
+            await self.flush()
+        else:
+            self._schedule()
+    
+    def _schedule(self):
+        if self._flusher is None:
+            # Outside the request's context: the flush is not the request's usage
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_later(), context=contextvars.Context())
+    
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_seconds)
+        finally:
+            self._flusher = None
+        await self.flush()
+    
+    async def flush(self):
+        """Write the pending deltas; failed documents are kept for the next flushes, up to MAX_FLUSH_ATTEMPTS"""
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        failed = await _commit_rollups(get_async_db(), pending)
+        for key in pending:
+            if key not in failed:
+                self._attempts.pop(key, None)
+        
+        dropped = 0
+        for key, delta in failed.items():
+            attempts = self._attempts.pop(key, 0) + 1
+            if attempts >= self.MAX_FLUSH_ATTEMPTS or (key not in self._pending and len(self._pending) >= self.max_documents):
+                dropped += 1
+                continue
+            self._attempts[key] = attempts
+            rollups.merge_deltas(self._pending, {key: delta})
+        if dropped:
+            self.dropped += dropped
+            logger.error(f"Dropped the increments of {dropped} rollup documents after failed flushes (rebuild_rollups recomputes them)")
+        if self._pending and self.flush_seconds > 0:
+            self._schedule()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self._pending), "retrying": len(self._attempts), "dropped": self.dropped}
+
+
+rollup_buffer = RollupBuffer(settings.ROLLUP_FLUSH_SECONDS, settings.ROLLUP_BUFFER_MAX_DOCUMENTS)
+
+
+# Read-through cache of user documents (role checks hit it on every admin request)
+_user_cache = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+)
+
+# Callbacks run after a local user invalidation, e.g. to notify other instances
+_user_invalidation_hooks: List[Callable[[str], Any]] = []
+
+
 class FirestoreService:
     """Service for Firestore operations"""
     
     @staticmethod
-    def get_user(uid: str) -> Optional[Dict[str, Any]]:
-        """Get user document from Firestore"""
+    def register_user_invalidation_hook(hook: Callable[[str], Any]):
+        """
+        Register a callback called with the uid whenever a user document changes
+        
+        Use it to propagate invalidations across instances (Pub/Sub, Redis...);
+        the receiving side calls invalidate_user_cache(uid, propagate=False).
+        The hook may be sync or async.
+        """
+        _user_invalidation_hooks.append(hook)
+    
+    @staticmethod
+    async def invalidate_user_cache(uid: str, propagate: bool = True):
+        """Drop a user from the local cache and optionally notify other instances"""
+        _user_cache.invalidate(uid)
+        if not propagate:
+            return
+        for hook in _user_invalidation_hooks:
+            try:
+                result = hook(uid)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"User invalidation hook failed for {uid}: {e}")
+    
+    @staticmethod
+    def get_user_cache_stats() -> Dict[str, Any]:
+        """Hit/miss counters of the user cache"""
+        return _user_cache.stats()
+    
+    # Aggregations (computed server-side, billed one read per 1000 index entries)
+    
+    @staticmethod
+    async def count(collection: str, filters: Optional[List[QueryFilter]] = None) -> int:
+        """Count the documents of a collection matching the filters"""
+        try:
+            count = int(await _aggregation_value(_filtered_query(collection, filters).count()) or 0)
+            # One read per started batch of 1000 counted index entries
+            record_reads(max(0, (count - 1) // 1000))
+            return count
+        except Exception as e:
+            logger.error(f"Error counting {collection}: {e}")
+            raise
+    
+    @staticmethod
+    async def sum(collection: str, field: str, filters: Optional[List[QueryFilter]] = None) -> float:
+        """Sum a numeric field over the documents matching the filters"""
+        try:
+            value = await _aggregation_value(_filtered_query(collection, filters).sum(field))
+            return value or 0
+        except Exception as e:
+            logger.error(f"Error summing {collection}.{field}: {e}")
+            raise
+    
+    @staticmethod
+    async def avg(collection: str, field: str, filters: Optional[List[QueryFilter]] = None) -> Optional[float]:
+        """Average a numeric field over the documents matching the filters (None if no document has it)"""
         try:
-            db = get_db()
+            return await _aggregation_value(_filtered_query(collection, filters).avg(field))
+        except Exception as e:
+            logger.error(f"Error averaging {collection}.{field}: {e}")
+            raise
+    
+    @staticmethod
+    def batch_writer(batch_size: int = BatchWriter.MAX_BATCH_SIZE, max_concurrency: Optional[int] = None) -> BatchWriter:
+        """Batched writer for mass updates (see BatchWriter)"""
+        return BatchWriter(batch_size=batch_size, max_concurrency=max_concurrency)
+    
+    # Cursor pagination
+    
+    @staticmethod
+    async def _paginate(
+        query,
+        collection: str,
+        limit: Optional[int] = None,
+        page_token: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Any], Optional[str]]:
+        """
+        Run one page of a query
+        
+        The page token points at the last document of the previous page and the
+        query resumes right after it (start_after), so each page costs at most
+        limit + 1 reads whatever the collection size.
+        
+        fields projects both the page and the cursor document; it must include
+        the query's order_by fields.
+        
+        Returns:
+            (document snapshots, next page token or None on the last page)
+        
+        Raises:
+            ValueError: malformed page token or cursor document deleted
+        """
+        page_size = clamp_page_size(limit)
+        if page_token:
+            cursor_id = decode_page_token(page_token)
+            cursor = await _get(get_async_db().collection(collection).document(cursor_id), field_paths=fields)
+            if not cursor.exists:
+                raise ValueError("Page token is no longer valid")
+            query = query.start_after(cursor)
+        if fields:
+            query = query.select(fields)
+        
+        # One extra document tells whether a next page exists
+        docs = [doc async for doc in _stream(query.limit(page_size + 1))]
+        next_page_token = encode_page_token(docs[page_size - 1].id) if len(docs) > page_size else None
+        return docs[:page_size], next_page_token
+    
+    @staticmethod
+    async def get_user(uid: str) -> Optional[Dict[str, Any]]:
+        """Get user document from Firestore (read-through cached)"""
+        cached = _user_cache.get(uid)
+        if cached is not None:
+            return dict(cached)
+        
+        try:
+            db = get_async_db()
             doc_ref = db.collection("users").document(uid)
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             if doc.exists:
-                return doc.to_dict()
+                data = doc.to_dict()
+                _user_cache.set(uid, data)
+                return dict(data)
             return None
         except Exception as e:
             logger.error(f"Error getting user {uid}: {e}")
             return None
     
     @staticmethod
-    def create_user(uid: str, email: Optional[str] = None, role: str = "user") -> Dict[str, Any]:
+    async def create_user(uid: str, email: Optional[str] = None, role: str = "user") -> Dict[str, Any]:
         """Create user document in Firestore"""
         try:
-            db = get_db()
+            db = get_async_db()
             user_data = {
                 "role": role,
                 "created_at": firestore.SERVER_TIMESTAMP,
@@ -87,31 +584,83 @@ class FirestoreService:
                 user_data["email"] = email
             
             doc_ref = db.collection("users").document(uid)
-            doc_ref.set(user_data)
+            await _write("set", doc_ref.set(user_data))
+            await FirestoreService.invalidate_user_cache(uid)
             return user_data
         except Exception as e:
             logger.error(f"Error creating user {uid}: {e}")
             raise
     
     @staticmethod
-    def update_user(uid: str, updates: Dict[str, Any]) -> bool:
+    async def update_user(uid: str, updates: Dict[str, Any]) -> bool:
         """Update user document"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("users").document(uid)
-            doc_ref.update(updates)
+            await _write("update", doc_ref.update(updates))
+            await FirestoreService.invalidate_user_cache(uid)
             return True
         except Exception as e:
             logger.error(f"Error updating user {uid}: {e}")
             return False
     
     @staticmethod
-    def get_profile(user_id: str) -> Optional[Dict[str, Any]]:
+    async def update_user_role(uid: str, role: str) -> bool:
+        """
+        Update user role, in Firestore and in the user's role custom claim
+        
+        Admin routes authorize from the claim, so it is set first (revoking the
+        user's tokens on demotion, see set_role_claim): a failure raises before
+        Firestore is updated instead of leaving a stale "admin" claim behind.
+        """
+        from app.core.security import set_role_claim
+        await set_role_claim(uid, role)
+        return await FirestoreService.update_user(uid, {"role": role})
+    
+    @staticmethod
+    async def list_users(fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """List all user documents, only the given fields if set"""
+        try:
+            db = get_async_db()
+            query = db.collection("users")
+            if fields:
+                query = query.select(fields)
+            docs = _stream(query)
+            
+            users = []
+            async for doc in docs:
+                data = doc.to_dict()
+                data["uid"] = doc.id
+                users.append(data)
+            
+            return users
+        except Exception as e:
+            logger.error(f"Error listing users: {e}")
+            raise
+    
+    @staticmethod
+    async def list_users_page(
+        limit: Optional[int] = None,
+        page_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """List one page of user documents, returns (users, next page token)"""
+        query = get_async_db().collection("users")
+        docs, next_page_token = await FirestoreService._paginate(query, "users", limit, page_token)
+        
+        users = []
+        for doc in docs:
+            data = doc.to_dict()
+            data["uid"] = doc.id
+            users.append(data)
+        return users, next_page_token
+    
+    @staticmethod
+    async def get_profile(user_id: str) -> Optional[Dict[str, Any]]:
         """Get user profile"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("profiles").document(user_id)
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             if doc.exists:
                 return doc.to_dict()
             return None
@@ -120,23 +669,23 @@ class FirestoreService:
             return None
     
     @staticmethod
-    def create_or_update_profile(user_id: str, profile_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_or_update_profile(user_id: str, profile_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create or update user profile"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("profiles").document(user_id)
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             
             if doc.exists:
                 # Update existing profile
                 profile_data["updated_at"] = firestore.SERVER_TIMESTAMP
-                doc_ref.update(profile_data)
+                await _write("update", doc_ref.update(profile_data))
             else:
                 # Create new profile
                 profile_data["user_id"] = user_id
                 profile_data["created_at"] = firestore.SERVER_TIMESTAMP
                 profile_data["updated_at"] = firestore.SERVER_TIMESTAMP
-                doc_ref.set(profile_data)
+                await _write("set", doc_ref.set(profile_data))
             
             return profile_data
         except Exception as e:
@@ -144,32 +693,48 @@ class FirestoreService:
             raise
     
     @staticmethod
-    def create_conversation(user_id: str, title: Optional[str] = None) -> str:
+    async def list_profiles(fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """List all user profiles, only the given fields if set"""
+        try:
+            db = get_async_db()
+            query = db.collection("profiles")
+            if fields:
+                query = query.select(fields)
+            docs = _stream(query)
+            return [doc.to_dict() async for doc in docs]
+        except Exception as e:
+            logger.error(f"Error listing profiles: {e}")
+            raise
+    
+    @staticmethod
+    async def create_conversation(user_id: str, title: Optional[str] = None) -> str:
         """Create a new conversation"""
         try:
-            db = get_db()
+            db = get_async_db()
             conversation_id = str(uuid.uuid4())
             conversation_data = {
                 "user_id": user_id,
                 "title": title or "New Conversation",
                 "messages": [],
+                "message_count": 0,
                 "created_at": firestore.SERVER_TIMESTAMP,
                 "updated_at": firestore.SERVER_TIMESTAMP,
             }
             doc_ref = db.collection("conversations").document(conversation_id)
-            doc_ref.set(conversation_data)
+            await _write("set", doc_ref.set(conversation_data))
             return conversation_id
         except Exception as e:
             logger.error(f"Error creating conversation: {e}")
             raise
     
     @staticmethod
-    def add_message_to_conversation(conversation_id: str, role: str, content: str):
+    async def add_message_to_conversation(conversation_id: str, role: str, content: str):
         """Add a message to a conversation"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("conversations").document(conversation_id)
-            doc = doc_ref.get()
+            # Only the denormalized metadata is needed, not the messages
+            doc = await _get(doc_ref, field_paths=["message_count", "title_preview"])
             
             if not doc.exists:
                 raise ValueError(f"Conversation {conversation_id} not found")
@@ -182,21 +747,36 @@ class FirestoreService:
                 "timestamp": datetime.utcnow(),
             }
             
-            doc_ref.update({
+            updates = {
                 "messages": firestore.ArrayUnion([message]),
                 "updated_at": firestore.SERVER_TIMESTAMP,
-            })
+            }
+            data = doc.to_dict() or {}
+            if "message_count" in data:
+                updates["message_count"] = firestore.Increment(1)
+                if role == "user" and not data.get("title_preview"):
+                    updates["title_preview"] = content[:50]
+            else:
+                # Conversation created before the metadata was denormalized: backfill it
+                legacy_doc = await _get(doc_ref, field_paths=["messages"])
+                messages = (legacy_doc.to_dict() or {}).get("messages", []) + [message]
+                updates["message_count"] = len(messages)
+                title_preview = FirestoreService._title_preview(messages)
+                if title_preview is not None:
+                    updates["title_preview"] = title_preview
+            
+            await _write("update", doc_ref.update(updates))
         except Exception as e:
             logger.error(f"Error adding message to conversation: {e}")
             raise
     
     @staticmethod
-    def get_conversation(conversation_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_conversation(conversation_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Get a conversation"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("conversations").document(conversation_id)
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             
             if not doc.exists:
                 return None
@@ -211,55 +791,84 @@ class FirestoreService:
             return None
     
     @staticmethod
-    def list_conversations(user_id: str) -> List[Dict[str, Any]]:
+    def _title_preview(messages: List[Dict[str, Any]]) -> Optional[str]:
+        """First 50 chars of the first user message, None if there is none"""
+        first_user_msg = next((msg for msg in messages if msg.get("role") == "user"), None)
+        if first_user_msg:
+            return first_user_msg.get("content", "")[:50]
+        return None
+    
+    @staticmethod
+    async def _with_message_counts(conversations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fill message_count/title_preview of projected conversation metadata
+        
+        Conversations written before these fields were denormalized are read
+        again with their messages (one batched get), the others cost nothing.
+        """
+        legacy = {conv["conversation_id"]: conv for conv in conversations if "message_count" not in conv}
+        if not legacy:
+            return conversations
+        
+        db = get_async_db()
+        refs = [db.collection("conversations").document(conversation_id) for conversation_id in legacy]
+        async for doc in _get_all(db, refs, field_paths=["messages"]):
+            messages = (doc.to_dict() or {}).get("messages", []) if doc.exists else []
+            conv = legacy[doc.id]
+            conv["message_count"] = len(messages)
+            if not conv.get("title_preview"):
+                conv["title_preview"] = FirestoreService._title_preview(messages)
+        return conversations
+    
+    @staticmethod
+    def _conversation_summary(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Summary of conversation metadata for list views"""
+        # Get title: use first user message if available, otherwise use stored title
+        title = data.get("title_preview") or data.get("title", "Untitled")
+        
+        # Convert Firestore timestamps to datetime if needed
+        updated_at = data.get("updated_at")
+        created_at = data.get("created_at")
+        
+        # Handle Firestore Timestamp objects
+        if hasattr(updated_at, 'timestamp'):
+            updated_at = datetime.fromtimestamp(updated_at.timestamp())
+        elif isinstance(updated_at, datetime):
+            pass  # Already a datetime
+        else:
+            updated_at = datetime.utcnow()  # Fallback
+        
+        if hasattr(created_at, 'timestamp'):
+            created_at = datetime.fromtimestamp(created_at.timestamp())
+        elif isinstance(created_at, datetime):
+            pass  # Already a datetime
+        else:
+            created_at = datetime.utcnow()  # Fallback
+        
+        return {
+            "conversation_id": data["conversation_id"],
+            "title": title,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "message_count": data.get("message_count", 0),
+        }
+    
+    @staticmethod
+    async def list_conversations(user_id: str) -> List[Dict[str, Any]]:
         """List all conversations for a user"""
         try:
-            db = get_db()
+            db = get_async_db()
             conversations_ref = db.collection("conversations")
             # Filter by user_id only (no order_by to avoid index requirement)
             # Use FieldFilter to avoid deprecation warning
             query = conversations_ref.where(filter=FieldFilter("user_id", "==", user_id))
-            docs = query.stream()
+            docs = _stream(query.select(CONVERSATION_METADATA_FIELDS))
             
-            conversations = []
-            for doc in docs:
-                data = doc.to_dict()
-                messages = data.get("messages", [])
-                
-                # Get title: use first user message if available, otherwise use stored title
-                title = data.get("title", "Untitled")
-                if messages:
-                    # Find first user message
-                    first_user_msg = next((msg for msg in messages if msg.get("role") == "user"), None)
-                    if first_user_msg:
-                        title = first_user_msg.get("content", title)[:50]  # First 50 chars of first question
-                
-                # Convert Firestore timestamps to datetime if needed
-                updated_at = data.get("updated_at")
-                created_at = data.get("created_at")
-                
-                # Handle Firestore Timestamp objects
-                if hasattr(updated_at, 'timestamp'):
-                    updated_at = datetime.fromtimestamp(updated_at.timestamp())
-                elif isinstance(updated_at, datetime):
-                    pass  # Already a datetime
-                else:
-                    updated_at = datetime.utcnow()  # Fallback
-                
-                if hasattr(created_at, 'timestamp'):
-                    created_at = datetime.fromtimestamp(created_at.timestamp())
-                elif isinstance(created_at, datetime):
-                    pass  # Already a datetime
-                else:
-                    created_at = datetime.utcnow()  # Fallback
-                
-                conversations.append({
-                    "conversation_id": doc.id,
-                    "title": title,
-                    "created_at": created_at,
-                    "updated_at": updated_at,
-                    "message_count": len(messages),
-                })
+            metadata = []
+            async for doc in docs:
+                metadata.append({**doc.to_dict(), "conversation_id": doc.id})
+            metadata = await FirestoreService._with_message_counts(metadata)
+            conversations = [FirestoreService._conversation_summary(data) for data in metadata]
             
             # Sort in Python memory by updated_at descending
             conversations.sort(key=lambda x: x["updated_at"], reverse=True)
@@ -272,12 +881,63 @@ class FirestoreService:
             return []
     
     @staticmethod
-    def delete_conversation(conversation_id: str, user_id: str) -> bool:
+    async def list_conversations_page(
+        user_id: str,
+        limit: Optional[int] = None,
+        page_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        List one page of a user's conversations, most recently updated first
+        
+        Requires the (user_id, updated_at desc) composite index declared in
+        firestore.indexes.json.
+        """
+        db = get_async_db()
+        query = db.collection("conversations") \
+            .where(filter=FieldFilter("user_id", "==", user_id)) \
+            .order_by("updated_at", direction=firestore.Query.DESCENDING)
+        docs, next_page_token = await FirestoreService._paginate(
+            query, "conversations", limit, page_token, fields=CONVERSATION_METADATA_FIELDS
+        )
+        metadata = await FirestoreService._with_message_counts(
+            [{**doc.to_dict(), "conversation_id": doc.id} for doc in docs]
+        )
+        return [FirestoreService._conversation_summary(data) for data in metadata], next_page_token
+    
+    @staticmethod
+    async def list_all_conversations(fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """List conversations of all users (for admin statistics), only the given fields if set"""
+        try:
+            db = get_async_db()
+            query = db.collection("conversations")
+            if fields:
+                query = query.select(fields)
+            docs = _stream(query)
+            
+            conversations = []
+            async for doc in docs:
+                data = doc.to_dict()
+                data["conversation_id"] = doc.id
+                conversations.append(data)
+            
+            return conversations
+        except Exception as e:
+            logger.error(f"Error listing all conversations: {e}")
+            raise
+    
+    @staticmethod
+    async def list_all_conversation_metadata() -> List[Dict[str, Any]]:
+        """List conversations of all users without their messages, message_count always set"""
+        conversations = await FirestoreService.list_all_conversations(fields=CONVERSATION_METADATA_FIELDS)
+        return await FirestoreService._with_message_counts(conversations)
+    
+    @staticmethod
+    async def delete_conversation(conversation_id: str, user_id: str) -> bool:
         """Delete a conversation"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("conversations").document(conversation_id)
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             
             if not doc.exists:
                 return False
@@ -286,31 +946,31 @@ class FirestoreService:
             if data.get("user_id") != user_id:
                 return False  # User doesn't own this conversation
             
-            doc_ref.delete()
+            await _write("delete", doc_ref.delete())
             return True
         except Exception as e:
             logger.error(f"Error deleting conversation: {e}")
             return False
     
     @staticmethod
-    def save_agent_config(config: Dict[str, Any]):
+    async def save_agent_config(config: Dict[str, Any]):
         """Save AI agent configuration"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("ai_config").document("current")
             config["updated_at"] = firestore.SERVER_TIMESTAMP
-            doc_ref.set(config)
+            await _write("set", doc_ref.set(config))
         except Exception as e:
             logger.error(f"Error saving agent config: {e}")
             raise
     
     @staticmethod
-    def get_agent_config() -> Optional[Dict[str, Any]]:
+    async def get_agent_config() -> Optional[Dict[str, Any]]:
         """Get AI agent configuration"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("ai_config").document("current")
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             
             if doc.exists:
                 return doc.to_dict()
@@ -320,7 +980,7 @@ class FirestoreService:
             return None
     
     @staticmethod
-    def log_page_visit(
+    async def log_page_visit(
         user_id: str,
         page_path: str,
         start_time: datetime,
@@ -341,7 +1001,7 @@ class FirestoreService:
             Visit ID
         """
         try:
-            db = get_db()
+            db = get_async_db()
             visit_id = str(uuid.uuid4())
             
             # Calculate duration if end_time is provided
@@ -360,8 +1020,65 @@ class FirestoreService:
             if metadata:
                 visit_data.update(metadata)
             
-            doc_ref = db.collection("page_visits").document(visit_id)
-            doc_ref.set(visit_data)
+            visit_ref = db.collection("page_visits").document(visit_id)
+            head_ref = db.collection(sessions.SESSION_HEADS_COLLECTION).document(user_id)
+            activity_ref = db.collection(retention.USER_ACTIVITY_COLLECTION).document(user_id)
+            week = retention.week_id(start_time)
+            
+            # Only the user's own documents are written in the transaction: the
+            # visit itself, their session head (and activity, unless the head
+            # already recorded this week) read and rewritten so concurrent visits
+            # agree, and their session document incremented. Session counters are
+            # thus never incremented for a visit that was not written. Shared
+            # rollups (page flows, cohorts) are returned and buffered.
+            async def assign(transaction) -> Tuple[str, int, rollups.RollupDeltas]:
+                head = await _get(head_ref, transaction=transaction)
+                current = head.to_dict() if head.exists else None
+                activity_update = None
+                if not current or current.get("active_week") != week:
+                    activity = await _get(activity_ref, transaction=transaction)
+                    activity_update = retention.record_activity(activity.to_dict() if activity.exists else None, start_time)
+                assignment = sessions.assign_visit(current, user_id, page_path, start_time, end_time)
+                own, shared = _split_shared(assignment.deltas)
+                transaction.set(visit_ref, {**visit_data, "analytics_session_id": assignment.session_id})
+                writes = 1
+                if activity_update is not None:
+                    activity_doc, cohort_deltas = activity_update
+                    transaction.set(activity_ref, activity_doc)
+                    rollups.merge_deltas(shared, cohort_deltas)
+                    writes += 1
+                writes += _add_rollups(transaction, db, own)
+                new_head = assignment.head
+                recorded_week = max(week, (current or {}).get("active_week") or "")
+                if new_head is not None and new_head.get("active_week") != recorded_week:
+                    new_head = {**new_head, "active_week": recorded_week}
+                if new_head is None and current is not None:
+                    transaction.delete(head_ref)
+                    writes += 1
+                elif new_head is not None and new_head != current:
+                    transaction.set(head_ref, new_head)
+                    writes += 1
+                return assignment.session_id, writes, shared
+            
+            shared_deltas = rollups.visit_deltas(
+                start_time,
+                page_path,
+                user_id=user_id,
+                session_id=visit_data.get("session_id"),
+                pageviews=1,
+                duration_seconds=duration_seconds,
+            )
+            try:
+                with firestore_operation_duration.time(operation="transaction"):
+                    session_id, writes, session_deltas = await run_transaction(assign)
+                record_writes(writes)
+                rollups.merge_deltas(shared_deltas, session_deltas)
+            except Exception as e:
+                # The visit is kept without its session: rebuild_sessions assigns it later
+                logger.error(f"Error assigning page visit of user {user_id} to a session: {e}")
+                await _write("set", visit_ref.set(visit_data))
+            
+            await rollup_buffer.add(shared_deltas)
             logger.info(f"Logged page visit: {page_path} for user {user_id} (duration: {duration_seconds}s)")
             return visit_id
         except Exception as e:
@@ -369,7 +1086,7 @@ class FirestoreService:
             raise
     
     @staticmethod
-    def update_page_visit_end_time(visit_id: str, end_time: datetime):
+    async def update_page_visit_end_time(visit_id: str, end_time: datetime):
         """
         Update the end_time of a page visit (when user leaves the page)
         
@@ -378,67 +1095,97 @@ class FirestoreService:
             end_time: When the user left the page
         """
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("page_visits").document(visit_id)
-            doc = doc_ref.get()
             
-            if not doc.exists:
-                logger.warning(f"Page visit {visit_id} not found for update")
-                return
-            
-            data = doc.to_dict()
-            start_time = data.get("start_time")
+            # Ensure end_time is timezone-aware (UTC)
+            if end_time.tzinfo is None:
+                end_time = end_time.replace(tzinfo=timezone.utc)
             
-            # Convert start_time to datetime, ensuring it's timezone-aware (UTC)
-            if isinstance(start_time, str):
-                try:
-                    start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                    # Ensure it's timezone-aware
+            # The visit is read in the transaction that rewrites it: of two end
+            # beacons, the second sees the first's duration and only corrects it.
+            # The user's session head is read too, so a head closed meanwhile is
+            # not recreated by the last activity update.
+            async def close(transaction) -> Optional[Tuple[float, int, rollups.RollupDeltas]]:
+                doc = await _get(doc_ref, transaction=transaction)
+                if not doc.exists:
+                    return None
+                
+                data = doc.to_dict()
+                user_id = data.get("user_id")
+                session_id = data.get("analytics_session_id")
+                head_exists = False
+                if user_id and session_id:
+                    head_ref = db.collection(sessions.SESSION_HEADS_COLLECTION).document(user_id)
+                    head_exists = (await _get(head_ref, transaction=transaction)).exists
+                start_time = data.get("start_time")
+                
+                # Convert start_time to datetime, ensuring it's timezone-aware (UTC)
+                if isinstance(start_time, str):
+                    try:
+                        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+                        # Ensure it's timezone-aware
+                        if start_time.tzinfo is None:
+                            start_time = start_time.replace(tzinfo=timezone.utc)
+                    except:
+                        start_time = datetime.now(timezone.utc)
+                elif hasattr(start_time, 'timestamp'):
+                    # Firestore Timestamp object
+                    start_time = datetime.fromtimestamp(start_time.timestamp(), tz=timezone.utc)
+                elif isinstance(start_time, datetime):
+                    # Already a datetime object
                     if start_time.tzinfo is None:
+                        # Make it timezone-aware (UTC)
                         start_time = start_time.replace(tzinfo=timezone.utc)
-                except:
+                else:
                     start_time = datetime.now(timezone.utc)
-            elif hasattr(start_time, 'timestamp'):
-                # Firestore Timestamp object
-                start_time = datetime.fromtimestamp(start_time.timestamp(), tz=timezone.utc)
-            elif isinstance(start_time, datetime):
-                # Already a datetime object
-                if start_time.tzinfo is None:
-                    # Make it timezone-aware (UTC)
-                    start_time = start_time.replace(tzinfo=timezone.utc)
-            else:
-                start_time = datetime.now(timezone.utc)
-            
-            # Ensure end_time is also timezone-aware (UTC)
-            if end_time.tzinfo is None:
-                end_time = end_time.replace(tzinfo=timezone.utc)
-            
-            duration_seconds = (end_time - start_time).total_seconds()
-            
-            # Ensure duration is positive
-            if duration_seconds < 0:
-                logger.warning(f"Negative duration calculated for visit {visit_id}, using 0")
-                duration_seconds = 0
-            
-            update_data = {
-                "end_time": end_time,
-                "duration_seconds": duration_seconds,
-                "updated_at": firestore.SERVER_TIMESTAMP,
-            }
+                
+                duration_seconds = (end_time - start_time).total_seconds()
+                
+                # Ensure duration is positive
+                if duration_seconds < 0:
+                    logger.warning(f"Negative duration calculated for visit {visit_id}, using 0")
+                    duration_seconds = 0
+                
+                transaction.update(doc_ref, {
+                    "end_time": end_time,
+                    "duration_seconds": duration_seconds,
+                    "updated_at": firestore.SERVER_TIMESTAMP,
+                })
+                
+                # Rollups replace the duration already recorded, if any; the session lasts at least until then
+                deltas = rollups.visit_deltas(
+                    start_time,
+                    data.get("page_path"),
+                    duration_seconds=duration_seconds,
+                    previous_duration_seconds=data.get("duration_seconds"),
+                )
+                if user_id:
+                    deltas.update(sessions.visit_end_deltas(session_id, user_id, end_time, head_exists))
+                own, shared = _split_shared(deltas)
+                return duration_seconds, 1 + _add_rollups(transaction, db, own), shared
             
-            logger.info(f"Updating page visit {visit_id} with end_time={end_time.isoformat()}, duration_seconds={duration_seconds}")
-            doc_ref.update(update_data)
+            logger.info(f"Updating page visit {visit_id} with end_time={end_time.isoformat()}")
+            with firestore_operation_duration.time(operation="transaction"):
+                closed = await run_transaction(close)
+            if closed is None:
+                logger.warning(f"Page visit {visit_id} not found for update")
+                return
+            duration_seconds, writes, shared_deltas = closed
+            record_writes(writes)
+            await rollup_buffer.add(shared_deltas)
             logger.info(f"Successfully updated page visit {visit_id} end_time (duration: {duration_seconds}s)")
         except Exception as e:
             logger.error(f"Error updating page visit end_time: {e}")
             raise
     
     @staticmethod
-    def get_page_visits(
+    async def get_page_visits(
         user_id: Optional[str] = None,
         page_path: Optional[str] = None,
         start_time: Optional[datetime] = None,
-        end_time: Optional[datetime] = None
+        end_time: Optional[datetime] = None,
+        fields: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """
         Get page visits with optional filters
@@ -448,12 +1195,13 @@ class FirestoreService:
             page_path: Filter by page path
             start_time: Filter visits that started after this time
             end_time: Filter visits that started before this time
+            fields: Only read these fields (start_time is always read)
         
         Returns:
             List of page visits
         """
         try:
-            db = get_db()
+            db = get_async_db()
             visits_ref = db.collection("page_visits")
             query = visits_ref
             
@@ -467,11 +1215,14 @@ class FirestoreService:
             if end_time:
                 query = query.where(filter=FieldFilter("start_time", "<=", end_time))
             
+            if fields:
+                query = query.select(sorted(set(fields) | {"start_time"}))
+            
             # Order by start_time descending
-            docs = query.order_by("start_time", direction=firestore.Query.DESCENDING).stream()
+            docs = _stream(query.order_by("start_time", direction=firestore.Query.DESCENDING))
             
             visits = []
-            for doc in docs:
+            async for doc in docs:
                 data = doc.to_dict()
                 # Convert Firestore timestamps to datetime if needed
                 start_time_visit = data.get("start_time")
@@ -513,11 +1264,312 @@ class FirestoreService:
             logger.error(f"Error getting page visits: {e}")
             return []
     
+    @staticmethod
+    async def get_page_visit_rollups(
+        granularity: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get hourly or daily page-visit rollups, oldest first
+        
+        Args:
+            granularity: "hour" or "day"
+            start_time: First bucket is the one containing this time (default: earliest)
+            end_time: Last bucket is the one containing this time (default: latest)
+        """
+        if granularity not in rollups.ROLLUP_COLLECTIONS:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        try:
+            db = get_async_db()
+            query = db.collection(rollups.ROLLUP_COLLECTIONS[granularity])
+            if start_time:
+                query = query.where(filter=FieldFilter("bucket_start", ">=", rollups.bucket_start(start_time, granularity)))
+            if end_time:
+                query = query.where(filter=FieldFilter("bucket_start", "<=", rollups.bucket_start(end_time, granularity)))
+            docs = _stream(query.order_by("bucket_start"))
+            return [doc.to_dict() async for doc in docs]
+        except Exception as e:
+            logger.error(f"Error getting {granularity} page visit rollups: {e}")
+            raise
+    
+    @staticmethod
+    async def rebuild_page_visit_rollups(start_time: Optional[datetime] = None) -> int:
+        """
+        Recompute rollups from the raw page visits (backfill, or repair after a failure)
+        
+        Buckets from the one containing start_time onwards are overwritten; the
+        visits keep being logged meanwhile, so run it when traffic is low.
+        
+        Returns:
+            Number of rollup documents written
+        """
+        try:
+            db = get_async_db()
+            query = db.collection("page_visits")
+            if start_time:
+                query = query.where(filter=FieldFilter("start_time", ">=", rollups.bucket_start(start_time, rollups.DAY)))
+            docs = _stream(query.select(["start_time", "page_path", "user_id", "session_id", "duration_seconds"]))
+            
+            deltas: rollups.RollupDeltas = {}
+            async for doc in docs:
+                data = doc.to_dict()
+                visit_start = rollups.to_utc(data.get("start_time"))
+                if visit_start is None:
+                    continue
+                duration_seconds = data.get("duration_seconds")
+                rollups.merge_deltas(deltas, rollups.visit_deltas(
+                    visit_start,
+                    data.get("page_path"),
+                    user_id=data.get("user_id"),
+                    session_id=data.get("session_id"),
+                    pageviews=1,
+                    duration_seconds=duration_seconds,
+                ))
+            
+            async with FirestoreService.batch_writer() as writer:
+                for (collection, doc_id), delta in deltas.items():
+                    await writer.set(db.collection(collection).document(doc_id), rollups.as_document(delta))
+            logger.info(f"Rebuilt {writer.written} page visit rollups")
+            return writer.written
+        except Exception as e:
+            logger.error(f"Error rebuilding page visit rollups: {e}")
+            raise
+    
+    @staticmethod
+    async def get_sessions(
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get sessions started in a time range, oldest first
+        
+        Args:
+            start_time: Filter sessions that started after this time
+            end_time: Filter sessions that started before this time
+            fields: Only read these fields (start_time is always read)
+        """
+        try:
+            db = get_async_db()
+            query = db.collection(sessions.SESSIONS_COLLECTION)
+            if start_time:
+                query = query.where(filter=FieldFilter("start_time", ">=", rollups.to_utc(start_time)))
+            if end_time:
+                query = query.where(filter=FieldFilter("start_time", "<=", rollups.to_utc(end_time)))
+            if fields:
+                query = query.select(sorted(set(fields) | {"start_time"}))
+            docs = _stream(query.order_by("start_time"))
+            return [doc.to_dict() async for doc in docs]
+        except Exception as e:
+            logger.error(f"Error getting sessions: {e}")
+            raise
+    
+    @staticmethod
+    async def rebuild_sessions() -> int:
+        """
+        Recompute every session, session head, visit session id and daily
+        page-flow rollup from the raw page visits
+        
+        Sessions and heads are overwritten, not deleted (page-flow rollups of
+        days left without flows are): run it when traffic is low, after a
+        change of the sessionization rules or to backfill visits logged before
+        sessions existed. Sessions timed out by now are closed.
+        
+        Returns:
+            Number of session documents written
+        """
+        try:
+            db = get_async_db()
+            docs = _stream(db.collection("page_visits").select([
+                "user_id", "page_path", "start_time", "end_time", "auto_closed", "analytics_session_id",
+            ]))
+            visits = [(doc.id, doc.to_dict()) async for doc in docs]
+            visit_sessions, deltas, heads = sessions.sessionize(visits, now=datetime.now(timezone.utc))
+            session_count = sum(1 for collection, _ in deltas if collection == sessions.SESSIONS_COLLECTION)
+            flow_days = [doc.reference async for doc in _stream(db.collection(rollups.PAGE_FLOW_ROLLUP_COLLECTION).select(["bucket_start"]))]
+            
+            async with FirestoreService.batch_writer() as writer:
+                for doc_ref in flow_days:
+                    if (rollups.PAGE_FLOW_ROLLUP_COLLECTION, doc_ref.id) not in deltas:
+                        await writer.delete(doc_ref)
+                for (collection, doc_id), delta in deltas.items():
+                    await writer.set(db.collection(collection).document(doc_id), rollups.as_document(delta))
+                for user_id, head in heads.items():
+                    head_ref = db.collection(sessions.SESSION_HEADS_COLLECTION).document(user_id)
+                    if head is None:
+                        await writer.delete(head_ref)
+                    else:
+                        await writer.set(head_ref, head)
+                for visit_id, data in visits:
+                    session_id = visit_sessions.get(visit_id)
+                    if data.get("analytics_session_id") != session_id:
+                        await writer.update(
+                            db.collection("page_visits").document(visit_id), {"analytics_session_id": session_id}
+                        )
+            logger.info(f"Rebuilt {session_count} sessions ({writer.written} writes)")
+            return session_count
+        except Exception as e:
+            logger.error(f"Error rebuilding sessions: {e}")
+            raise
+    
+    @staticmethod
+    async def close_expired_sessions(now: Optional[datetime] = None) -> int:
+        """
+        Close the sessions whose user has been inactive for longer than the
+        session timeout: their entry and exit pages are counted in the
+        page-flow rollups and their heads deleted
+        
+        Sessions of returning users are closed by their next visit; this
+        closes those of the users who did not come back.
+        
+        Returns:
+            Number of sessions closed
+        """
+        try:
+            db = get_async_db()
+            now = now or datetime.now(timezone.utc)
+            cutoff = rollups.to_utc(now).timestamp() - sessions.SESSION_TIMEOUT_SECONDS
+            query = db.collection(sessions.SESSION_HEADS_COLLECTION).where(
+                filter=FieldFilter("last_activity_ts", "<", cutoff)
+            )
+            closed_count = 0
+            async for doc in _stream(query):
+                # Re-read in a transaction: a visit may have extended the session meanwhile
+                async def close(transaction, head_ref) -> Optional[int]:
+                    head = await _get(head_ref, transaction=transaction)
+                    if not head.exists:
+                        return None
+                    closing = sessions.close_expired(head.to_dict(), now)
+                    if closing is None:
+                        return None
+                    transaction.delete(head_ref)
+                    return 1 + _add_rollups(transaction, db, closing)
+                
+                writes = await run_transaction(close, doc.reference)
+                if writes:
+                    record_writes(writes)
+                    closed_count += 1
+            logger.info(f"Closed {closed_count} expired sessions")
+            return closed_count
+        except Exception as e:
+            logger.error(f"Error closing expired sessions: {e}")
+            raise
+    
+    @staticmethod
+    async def get_page_flow_rollups(
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get daily page-flow rollups (transitions, entry and exit pages), oldest first
+        
+        Args:
+            start_time: First bucket is the day containing this time (default: earliest)
+            end_time: Last bucket is the day containing this time (default: latest)
+        """
+        try:
+            db = get_async_db()
+            query = db.collection(rollups.PAGE_FLOW_ROLLUP_COLLECTION)
+            if start_time:
+                query = query.where(filter=FieldFilter("bucket_start", ">=", rollups.bucket_start(start_time, rollups.DAY)))
+            if end_time:
+                query = query.where(filter=FieldFilter("bucket_start", "<=", rollups.bucket_start(end_time, rollups.DAY)))
+            docs = _stream(query.order_by("bucket_start"))
+            return [doc.to_dict() async for doc in docs]
+        except Exception as e:
+            logger.error(f"Error getting page flow rollups: {e}")
+            raise
+    
+    @staticmethod
+    async def get_retention_cohorts(start_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Get the weekly retention cohort documents, oldest first
+        
+        Args:
+            start_time: First cohort is the week containing this time (default: earliest)
+        """
+        try:
+            db = get_async_db()
+            query = db.collection(retention.COHORT_COLLECTION)
+            if start_time:
+                query = query.where(filter=FieldFilter("cohort_start", ">=", retention.week_start(start_time)))
+            docs = _stream(query.order_by("cohort_start"))
+            return [doc.to_dict() async for doc in docs]
+        except Exception as e:
+            logger.error(f"Error getting retention cohorts: {e}")
+            raise
+    
+    @staticmethod
+    async def rebuild_retention() -> int:
+        """
+        Recompute every user activity document and retention cohort from the raw page visits
+        
+        Needed once for the visits logged before retention was tracked. Run it
+        when traffic is low: visits logged meanwhile may be counted twice.
+        
+        Returns:
+            Number of documents written
+        """
+        try:
+            db = get_async_db()
+            docs = _stream(db.collection("page_visits").select(["user_id", "start_time"]))
+            activities, cohorts = retention.build([doc.to_dict() async for doc in docs])
+            stale_cohorts = [
+                doc.reference async for doc in _stream(db.collection(retention.COHORT_COLLECTION).select(["cohort_start"]))
+                if doc.id not in cohorts
+            ]
+            
+            async with FirestoreService.batch_writer() as writer:
+                for doc_ref in stale_cohorts:
+                    await writer.delete(doc_ref)
+                for doc_id, cohort in cohorts.items():
+                    await writer.set(db.collection(retention.COHORT_COLLECTION).document(doc_id), cohort)
+                for user_id, activity in activities.items():
+                    await writer.set(db.collection(retention.USER_ACTIVITY_COLLECTION).document(user_id), activity)
+            logger.info(f"Rebuilt {len(cohorts)} retention cohorts of {len(activities)} users ({writer.written} writes)")
+            return len(cohorts) + len(activities)
+        except Exception as e:
+            logger.error(f"Error rebuilding retention: {e}")
+            raise
+    
+    @staticmethod
+    async def enrich_page_visits() -> int:
+        """
+        Store the enrichment fields (device type, browser, OS, channel) on the
+        page visits missing them or holding outdated ones
+        
+        Needed for visits logged before ingest-time enrichment, or after a
+        change of the classification rules.
+        
+        Returns:
+            Number of page visits updated
+        """
+        try:
+            db = get_async_db()
+            docs = _stream(db.collection("page_visits").select([
+                "user_agent", "referrer", "referer", "previous_page", "utm_source", "utm_medium", "acquisition_channel",
+            ] + enrichment.ENRICHED_FIELDS))
+            
+            updated = 0
+            async with FirestoreService.batch_writer() as writer:
+                async for doc in docs:
+                    data = doc.to_dict()
+                    fields = enrichment.enrich_visit(data)
+                    if any(data.get(name) != value for name, value in fields.items()):
+                        await writer.update(db.collection("page_visits").document(doc.id), fields)
+                        updated += 1
+            logger.info(f"Enriched {updated} page visits")
+            return updated
+        except Exception as e:
+            logger.error(f"Error enriching page visits: {e}")
+            raise
+    
     # Removed log_analytics_event - now using page_visits collection only
     # Analytics events are logged as special page visits with event_type in metadata
     
     @staticmethod
-    def log_ai_event(
+    async def log_ai_event(
         event_type: str,
         user_id: str,
         conversation_id: Optional[str] = None,
@@ -536,7 +1588,7 @@ class FirestoreService:
             Event ID
         """
         try:
-            db = get_db()
+            db = get_async_db()
             event_id = str(uuid.uuid4())
             event_data = {
                 "event_type": event_type,
@@ -548,8 +1600,11 @@ class FirestoreService:
             if metadata:
                 event_data.update(metadata)
             
-            doc_ref = db.collection("ai_events").document(event_id)
-            doc_ref.set(event_data)
+            # The event and its daily rollup increments are committed together
+            batch = db.batch()
+            batch.set(db.collection("ai_events").document(event_id), event_data)
+            writes = 1 + _add_rollups(batch, db, rollups.ai_event_deltas(event_data))
+            await _write("batch_commit", batch.commit(), count=writes)
             logger.debug(f"Logged AI event: {event_type} for user {user_id}")
             return event_id
         except Exception as e:
@@ -560,7 +1615,54 @@ class FirestoreService:
     # To get analytics events, query page_visits with event_type filter in metadata
     
     @staticmethod
-    def get_ai_events(
+    async def get_ai_event_rollups(start_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Get daily AI-event rollups, oldest first
+        
+        Args:
+            start_time: First bucket is the day containing this time (default: all)
+        """
+        try:
+            db = get_async_db()
+            query = db.collection(rollups.AI_EVENT_ROLLUP_COLLECTION)
+            if start_time:
+                query = query.where(filter=FieldFilter("bucket_start", ">=", rollups.bucket_start(start_time, rollups.DAY)))
+            docs = _stream(query.order_by("bucket_start"))
+            return [doc.to_dict() async for doc in docs]
+        except Exception as e:
+            logger.error(f"Error getting AI event rollups: {e}")
+            raise
+    
+    @staticmethod
+    async def rebuild_ai_event_rollups() -> int:
+        """
+        Recompute the daily AI-event rollups from the raw events (backfill, or repair after a failure)
+        
+        Returns:
+            Number of rollup documents written
+        """
+        try:
+            db = get_async_db()
+            docs = _stream(db.collection("ai_events").select([
+                "event_type", "created_at", "provider", "model",
+                "input_tokens", "output_tokens", "cost_usd", "latency_ms",
+            ]))
+            
+            deltas: rollups.RollupDeltas = {}
+            async for doc in docs:
+                rollups.merge_deltas(deltas, rollups.ai_event_deltas(doc.to_dict()))
+            
+            async with FirestoreService.batch_writer() as writer:
+                for (collection, doc_id), delta in deltas.items():
+                    await writer.set(db.collection(collection).document(doc_id), rollups.as_document(delta))
+            logger.info(f"Rebuilt {writer.written} AI event rollups")
+            return writer.written
+        except Exception as e:
+            logger.error(f"Error rebuilding AI event rollups: {e}")
+            raise
+    
+    @staticmethod
+    async def get_ai_events(
         event_type: Optional[str] = None,
         user_id: Optional[str] = None,
         conversation_id: Optional[str] = None,
@@ -573,7 +1675,7 @@ class FirestoreService:
         to avoid requiring a composite index in Firestore.
         """
         try:
-            db = get_db()
+            db = get_async_db()
             events_ref = db.collection("ai_events")
             query = events_ref
             
@@ -594,15 +1696,15 @@ class FirestoreService:
                 
                 # Only order_by if we don't have complex filters that require index
                 if not (start_time or end_time):
-                    docs = query.order_by("created_at", direction=firestore.Query.DESCENDING).stream()
+                    docs = _stream(query.order_by("created_at", direction=firestore.Query.DESCENDING))
                 else:
-                    docs = query.stream()
+                    docs = _stream(query)
             else:
                 # We have event_type filter, fetch all and filter in memory
-                docs = query.stream()
+                docs = _stream(query)
             
             events = []
-            for doc in docs:
+            async for doc in docs:
                 data = doc.to_dict()
                 
                 # Filter by event_type in memory if needed
@@ -653,7 +1755,7 @@ class FirestoreService:
             return []
     
     @staticmethod
-    def close_inactive_page_visits(inactivity_minutes: int = 30) -> int:
+    async def close_inactive_page_visits(inactivity_minutes: int = 30) -> int:
         """
         Close page visits that have end_time == None
         Sets end_time = start_time + 30 minutes
@@ -665,78 +1767,91 @@ class FirestoreService:
             Number of visits closed
         """
         try:
-            db = get_db()
+            db = get_async_db()
             
-            # Get all page visits without end_time
+            # Get all page visits without end_time (start_time is all we need)
             visits_ref = db.collection("page_visits")
             query = visits_ref.where(filter=FieldFilter("end_time", "==", None))
             
-            docs = query.stream()
+            docs = _stream(query.select(["start_time", "page_path"]))
             
             closed_count = 0
-            for doc in docs:
-                data = doc.to_dict()
-                start_time = data.get("start_time")
-                
-                if not start_time:
-                    continue
-                
-                # Convert start_time to datetime, ensuring it's timezone-aware
-                if isinstance(start_time, str):
-                    try:
-                        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+            rollup_deltas: rollups.RollupDeltas = {}
+            async with FirestoreService.batch_writer() as writer:
+                async for doc in docs:
+                    data = doc.to_dict()
+                    start_time = data.get("start_time")
+                    
+                    if not start_time:
+                        continue
+                    
+                    # Convert start_time to datetime, ensuring it's timezone-aware
+                    if isinstance(start_time, str):
+                        try:
+                            start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+                            if start_time.tzinfo is None:
+                                start_time = start_time.replace(tzinfo=timezone.utc)
+                        except:
+                            continue
+                    elif hasattr(start_time, 'timestamp'):
+                        start_time = datetime.fromtimestamp(start_time.timestamp(), tz=timezone.utc)
+                    elif isinstance(start_time, datetime):
                         if start_time.tzinfo is None:
                             start_time = start_time.replace(tzinfo=timezone.utc)
-                    except:
+                    else:
                         continue
-                elif hasattr(start_time, 'timestamp'):
-                    start_time = datetime.fromtimestamp(start_time.timestamp(), tz=timezone.utc)
-                elif isinstance(start_time, datetime):
-                    if start_time.tzinfo is None:
-                        start_time = start_time.replace(tzinfo=timezone.utc)
-                else:
-                    continue
-                
-                # Set end_time = start_time + inactivity_minutes
-                end_time = start_time + timedelta(minutes=inactivity_minutes)
-                duration_seconds = (end_time - start_time).total_seconds()
-                
-                doc_ref = db.collection("page_visits").document(doc.id)
-                doc_ref.update({
-                    "end_time": end_time,
-                    "duration_seconds": duration_seconds,
-                    "updated_at": firestore.SERVER_TIMESTAMP,
-                })
-                closed_count += 1
-                logger.info(f"Closed page visit {doc.id} (end_time = start_time + {inactivity_minutes} minutes)")
+                    
+                    # Set end_time = start_time + inactivity_minutes
+                    end_time = start_time + timedelta(minutes=inactivity_minutes)
+                    duration_seconds = (end_time - start_time).total_seconds()
+                    
+                    # Estimated ends are not user activity: sessions keep their last real one
+                    await writer.update(doc.reference, {
+                        "end_time": end_time,
+                        "duration_seconds": duration_seconds,
+                        "auto_closed": True,
+                        "updated_at": firestore.SERVER_TIMESTAMP,
+                    })
+                    rollups.merge_deltas(rollup_deltas, rollups.visit_deltas(
+                        start_time,
+                        data.get("page_path"),
+                        duration_seconds=duration_seconds,
+                        previous_duration_seconds=data.get("duration_seconds"),
+                    ))
+                    closed_count += 1
             
+            # One increment per touched bucket, not per closed visit (split past
+            # 500 transforms per document); failed ones are retried by the buffer
+            failed = await _commit_rollups(db, rollup_deltas)
+            await rollup_buffer.add(failed)
+            logger.info(f"Closed {closed_count} page visits (end_time = start_time + {inactivity_minutes} minutes)")
             return closed_count
         except Exception as e:
             logger.error(f"Error closing inactive page visits: {e}")
             raise
     
     @staticmethod
-    def create_poi(poi_data: Dict[str, Any]) -> str:
+    async def create_poi(poi_data: Dict[str, Any]) -> str:
         """Create a new POI"""
         try:
-            db = get_db()
+            db = get_async_db()
             poi_data["created_at"] = firestore.SERVER_TIMESTAMP
             poi_data["updated_at"] = firestore.SERVER_TIMESTAMP
             
             doc_ref = db.collection("poi").document()
-            doc_ref.set(poi_data)
+            await _write("set", doc_ref.set(poi_data))
             return doc_ref.id
         except Exception as e:
             logger.error(f"Error creating POI: {e}")
             raise
     
     @staticmethod
-    def get_poi(poi_id: str) -> Optional[Dict[str, Any]]:
+    async def get_poi(poi_id: str) -> Optional[Dict[str, Any]]:
         """Get a POI by ID"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("poi").document(poi_id)
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             if doc.exists:
                 data = doc.to_dict()
                 data["poi_id"] = doc.id
@@ -747,15 +1862,15 @@ class FirestoreService:
             return None
     
     @staticmethod
-    def list_pois() -> List[Dict[str, Any]]:
+    async def list_pois() -> List[Dict[str, Any]]:
         """List all POIs"""
         try:
-            db = get_db()
+            db = get_async_db()
             pois_ref = db.collection("poi")
-            docs = pois_ref.stream()
+            docs = _stream(pois_ref)
             
             pois = []
-            for doc in docs:
+            async for doc in docs:
                 data = doc.to_dict()
                 data["poi_id"] = doc.id
                 pois.append(data)
@@ -766,25 +1881,41 @@ class FirestoreService:
             return []
     
     @staticmethod
-    def update_poi(poi_id: str, updates: Dict[str, Any]) -> bool:
+    async def list_pois_page(
+        limit: Optional[int] = None,
+        page_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """List one page of POIs, returns (pois, next page token)"""
+        query = get_async_db().collection("poi")
+        docs, next_page_token = await FirestoreService._paginate(query, "poi", limit, page_token)
+        
+        pois = []
+        for doc in docs:
+            data = doc.to_dict()
+            data["poi_id"] = doc.id
+            pois.append(data)
+        return pois, next_page_token
+    
+    @staticmethod
+    async def update_poi(poi_id: str, updates: Dict[str, Any]) -> bool:
         """Update a POI"""
         try:
-            db = get_db()
+            db = get_async_db()
             updates["updated_at"] = firestore.SERVER_TIMESTAMP
             doc_ref = db.collection("poi").document(poi_id)
-            doc_ref.update(updates)
+            await _write("update", doc_ref.update(updates))
             return True
         except Exception as e:
             logger.error(f"Error updating POI {poi_id}: {e}")
             return False
     
     @staticmethod
-    def delete_poi(poi_id: str) -> bool:
+    async def delete_poi(poi_id: str) -> bool:
         """Delete a POI"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("poi").document(poi_id)
-            doc_ref.delete()
+            await _write("delete", doc_ref.delete())
             return True
         except Exception as e:
             logger.error(f"Error deleting POI {poi_id}: {e}")
@@ -792,27 +1923,27 @@ class FirestoreService:
     
     # Ads (Advertisements) methods
     @staticmethod
-    def create_ad(ad_data: Dict[str, Any]) -> str:
+    async def create_ad(ad_data: Dict[str, Any]) -> str:
         """Create a new ad"""
         try:
-            db = get_db()
+            db = get_async_db()
             ad_data["created_at"] = firestore.SERVER_TIMESTAMP
             ad_data["updated_at"] = firestore.SERVER_TIMESTAMP
             
             doc_ref = db.collection("ads").document()
-            doc_ref.set(ad_data)
+            await _write("set", doc_ref.set(ad_data))
             return doc_ref.id
         except Exception as e:
             logger.error(f"Error creating ad: {e}")
             raise
     
     @staticmethod
-    def get_ad(ad_id: str) -> Optional[Dict[str, Any]]:
+    async def get_ad(ad_id: str) -> Optional[Dict[str, Any]]:
         """Get an ad by ID"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("ads").document(ad_id)
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             if doc.exists:
                 data = doc.to_dict()
                 data["ad_id"] = doc.id
@@ -823,10 +1954,10 @@ class FirestoreService:
             return None
     
     @staticmethod
-    def list_ads(position: Optional[str] = None, active_only: bool = False) -> List[Dict[str, Any]]:
+    async def list_ads(position: Optional[str] = None, active_only: bool = False) -> List[Dict[str, Any]]:
         """List all ads, optionally filtered by position and active status"""
         try:
-            db = get_db()
+            db = get_async_db()
             ads_ref = db.collection("ads")
             
             # Apply filters
@@ -835,10 +1966,10 @@ class FirestoreService:
             if active_only:
                 ads_ref = ads_ref.where("active", "==", True)
             
-            docs = ads_ref.stream()
+            docs = _stream(ads_ref)
             
             ads = []
-            for doc in docs:
+            async for doc in docs:
                 data = doc.to_dict()
                 data["ad_id"] = doc.id
                 ads.append(data)
@@ -852,25 +1983,25 @@ class FirestoreService:
             return []
     
     @staticmethod
-    def update_ad(ad_id: str, updates: Dict[str, Any]) -> bool:
+    async def update_ad(ad_id: str, updates: Dict[str, Any]) -> bool:
         """Update an ad"""
         try:
-            db = get_db()
+            db = get_async_db()
             updates["updated_at"] = firestore.SERVER_TIMESTAMP
             doc_ref = db.collection("ads").document(ad_id)
-            doc_ref.update(updates)
+            await _write("update", doc_ref.update(updates))
             return True
         except Exception as e:
             logger.error(f"Error updating ad {ad_id}: {e}")
             return False
     
     @staticmethod
-    def delete_ad(ad_id: str) -> bool:
+    async def delete_ad(ad_id: str) -> bool:
         """Delete an ad"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("ads").document(ad_id)
-            doc_ref.delete()
+            await _write("delete", doc_ref.delete())
             return True
         except Exception as e:
             logger.error(f"Error deleting ad {ad_id}: {e}")
@@ -878,28 +2009,28 @@ class FirestoreService:
     
     # Quiz Questions methods
     @staticmethod
-    def create_quiz_question(question_data: Dict[str, Any]) -> str:
+    async def create_quiz_question(question_data: Dict[str, Any]) -> str:
         """Create a new quiz question"""
         try:
-            db = get_db()
+            db = get_async_db()
             question_id = str(uuid.uuid4())
             question_data["question_id"] = question_id
             question_data["created_at"] = firestore.SERVER_TIMESTAMP
             question_data["updated_at"] = firestore.SERVER_TIMESTAMP
             doc_ref = db.collection("quiz_questions").document(question_id)
-            doc_ref.set(question_data)
+            await _write("set", doc_ref.set(question_data))
             return question_id
         except Exception as e:
             logger.error(f"Error creating quiz question: {e}")
             raise
     
     @staticmethod
-    def get_quiz_question(question_id: str) -> Optional[Dict[str, Any]]:
+    async def get_quiz_question(question_id: str) -> Optional[Dict[str, Any]]:
         """Get a quiz question by ID"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("quiz_questions").document(question_id)
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             if doc.exists:
                 return doc.to_dict()
             return None
@@ -908,39 +2039,39 @@ class FirestoreService:
             return None
     
     @staticmethod
-    def list_quiz_questions(active_only: bool = False) -> List[Dict[str, Any]]:
+    async def list_quiz_questions(active_only: bool = False) -> List[Dict[str, Any]]:
         """List all quiz questions"""
         try:
-            db = get_db()
+            db = get_async_db()
             query = db.collection("quiz_questions")
             if active_only:
                 query = query.where("is_active", "==", True)
-            docs = query.stream()
-            return [doc.to_dict() for doc in docs]
+            docs = _stream(query)
+            return [doc.to_dict() async for doc in docs]
         except Exception as e:
             logger.error(f"Error listing quiz questions: {e}")
             return []
     
     @staticmethod
-    def update_quiz_question(question_id: str, updates: Dict[str, Any]) -> bool:
+    async def update_quiz_question(question_id: str, updates: Dict[str, Any]) -> bool:
         """Update a quiz question"""
         try:
-            db = get_db()
+            db = get_async_db()
             updates["updated_at"] = firestore.SERVER_TIMESTAMP
             doc_ref = db.collection("quiz_questions").document(question_id)
-            doc_ref.update(updates)
+            await _write("update", doc_ref.update(updates))
             return True
         except Exception as e:
             logger.error(f"Error updating quiz question {question_id}: {e}")
             return False
     
     @staticmethod
-    def delete_quiz_question(question_id: str) -> bool:
+    async def delete_quiz_question(question_id: str) -> bool:
         """Delete a quiz question"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("quiz_questions").document(question_id)
-            doc_ref.delete()
+            await _write("delete", doc_ref.delete())
             return True
         except Exception as e:
             logger.error(f"Error deleting quiz question {question_id}: {e}")
@@ -948,36 +2079,36 @@ class FirestoreService:
     
     # Quiz Submissions methods
     @staticmethod
-    def create_quiz_submission(submission_data: Dict[str, Any]) -> str:
+    async def create_quiz_submission(submission_data: Dict[str, Any]) -> str:
         """Create a new quiz submission"""
         try:
-            db = get_db()
+            db = get_async_db()
             submission_id = str(uuid.uuid4())
             submission_data["submission_id"] = submission_id
             submission_data["submitted_at"] = firestore.SERVER_TIMESTAMP
             doc_ref = db.collection("quiz_submissions").document(submission_id)
-            doc_ref.set(submission_data)
+            await _write("set", doc_ref.set(submission_data))
             return submission_id
         except Exception as e:
             logger.error(f"Error creating quiz submission: {e}")
             raise
     
     @staticmethod
-    def get_user_quiz_submission_today(user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_user_quiz_submission_today(user_id: str) -> Optional[Dict[str, Any]]:
         """Check if user has already taken a quiz today"""
         try:
-            db = get_db()
+            db = get_async_db()
             today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
             today_end = today_start + timedelta(days=1)
             
             # Get all user submissions without order_by to avoid composite index requirement
             # Just filter by user_id (single field index, which should exist)
             query = db.collection("quiz_submissions").where("user_id", "==", user_id)
-            docs = list(query.stream())
+            docs = _stream(query)
             
             # Filter by today's date and find the most recent one
             today_submissions = []
-            for doc in docs:
+            async for doc in docs:
                 submission = doc.to_dict()
                 submitted_at = submission.get("submitted_at")
                 
@@ -1011,12 +2142,12 @@ class FirestoreService:
             return None
     
     @staticmethod
-    def get_quiz_submission(submission_id: str) -> Optional[Dict[str, Any]]:
+    async def get_quiz_submission(submission_id: str) -> Optional[Dict[str, Any]]:
         """Get a quiz submission by ID"""
         try:
-            db = get_db()
+            db = get_async_db()
             doc_ref = db.collection("quiz_submissions").document(submission_id)
-            doc = doc_ref.get()
+            doc = await _get(doc_ref)
             if doc.exists:
                 return doc.to_dict()
             return None
@@ -1025,16 +2156,95 @@ class FirestoreService:
             return None
     
     @staticmethod
-    def list_quiz_submissions(user_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """List quiz submissions, optionally filtered by user"""
+    async def list_quiz_submissions(
+        user_id: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """List quiz submissions, optionally filtered by user and projected on fields"""
         try:
-            db = get_db()
+            db = get_async_db()
             query = db.collection("quiz_submissions")
             if user_id:
                 query = query.where("user_id", "==", user_id)
-            docs = query.order_by("submitted_at", direction=firestore.Query.DESCENDING).stream()
-            return [doc.to_dict() for doc in docs]
+            query = query.order_by("submitted_at", direction=firestore.Query.DESCENDING)
+            if fields:
+                query = query.select(fields)
+            docs = _stream(query)
+            return [doc.to_dict() async for doc in docs]
         except Exception as e:
             logger.error(f"Error listing quiz submissions: {e}")
             return []
+    
+    @staticmethod
+    async def list_quiz_submissions_page(
+        user_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        page_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """List one page of quiz submissions, most recent first"""
+        query = get_async_db().collection("quiz_submissions")
+        if user_id:
+            query = query.where(filter=FieldFilter("user_id", "==", user_id))
+        query = query.order_by("submitted_at", direction=firestore.Query.DESCENDING)
+        docs, next_page_token = await FirestoreService._paginate(query, "quiz_submissions", limit, page_token)
+        return [doc.to_dict() for doc in docs], next_page_token
 
+    
+    # Precomputed dashboard payloads and leases (see app/services/dashboards.py)
+    
+    @staticmethod
+    async def get_dashboard_payload(key: str) -> Optional[Dict[str, Any]]:
+        """Stored payload of a dashboard ({"payload_json", "computed_at"}), None if never computed"""
+        doc = await _get(get_async_db().collection("dashboard_payloads").document(key))
+        return doc.to_dict() if doc.exists else None
+    
+    @staticmethod
+    async def set_dashboard_payload(key: str, payload_json: str, computed_at: datetime):
+        """Store the latest payload of a dashboard (JSON-encoded: payloads may hold nested arrays)"""
+        doc_ref = get_async_db().collection("dashboard_payloads").document(key)
+        await _write("set", doc_ref.set({"key": key, "payload_json": payload_json, "computed_at": computed_at}))
+    
+    @staticmethod
+    async def acquire_lease(name: str, holder: str, ttl_seconds: float) -> bool:
+        """
+        Take or renew the lease name for holder, unless another holder's lease is still running
+        
+        Leases expire after ttl_seconds, so a crashed holder does not block the others for long.
+        """
+        db = get_async_db()
+        lease_ref = db.collection("leases").document(name)
+        
+        async def take(transaction) -> bool:
+            lease = await _get(lease_ref, transaction=transaction)
+            now = datetime.now(timezone.utc)
+            if lease.exists:
+                current = lease.to_dict()
+                expires_at = rollups.to_utc(current.get("expires_at"))
+                if current.get("holder") != holder and expires_at is not None and expires_at > now:
+                    return False
+            transaction.set(lease_ref, {"holder": holder, "expires_at": now + timedelta(seconds=ttl_seconds)})
+            return True
+        
+        with firestore_operation_duration.time(operation="transaction"):
+            acquired = await run_transaction(take)
+        if acquired:
+            record_writes()
+        return acquired
+    
+    @staticmethod
+    async def release_lease(name: str, holder: str):
+        """Give up the lease name if holder still holds it"""
+        db = get_async_db()
+        lease_ref = db.collection("leases").document(name)
+        
+        async def release(transaction) -> bool:
+            lease = await _get(lease_ref, transaction=transaction)
+            if not lease.exists or lease.to_dict().get("holder") != holder:
+                return False
+            transaction.delete(lease_ref)
+            return True
+        
+        with firestore_operation_duration.time(operation="transaction"):
+            released = await run_transaction(release)
+        if released:
+            record_writes()
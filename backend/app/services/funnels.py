@@ -0,0 +1,71 @@
+"""
+Conversion funnels over the sessions' page sequences
+
+A funnel is an ordered list of pages; a session reaches step k if it visited
+the first k pages in that order, other pages possibly in between. Sessions
+are matched on the page sequence strings the sessionizer stores (see
+sessions.encode_pages): each step is a substring search from the end of the
+previous step's match, so evaluating a funnel costs a few str.find calls per
+distinct sequence (sessions are counted by sequence first) rather than a
+walk over each session's visits.
+"""
+from collections import defaultdict
+from typing import Any, Dict, List, Mapping
+from app.services.sessions import PAGE_SEPARATOR
+
+MIN_STEPS = 2
+MAX_STEPS = 10
+
+# Next page reported for sessions that ended right after their last reached step
+EXIT = "(exit)"
+
+# Drop-off destinations reported per step
+TOP_NEXT_PAGES = 5
+
+
+def evaluate_funnel(sequence_counts: Mapping[str, int], steps: List[str]) -> Dict[str, Any]:
+    """
+    Sessions reaching each step of a funnel, and where the others went instead
+
+    sequence_counts maps encoded page sequences to their number of sessions.
+    Steps are matched greedily (earliest occurrence), which finds a match
+    whenever one exists.
+    """
+    tokens = [f"{PAGE_SEPARATOR}{step}{PAGE_SEPARATOR}" for step in steps]
+    reached = [0] * len(steps)
+    next_pages: List[Dict[str, int]] = [defaultdict(int) for _ in steps]
+    sessions = 0
+    for sequence, count in sequence_counts.items():
+        sessions += count
+        text = f"{PAGE_SEPARATOR}{sequence}{PAGE_SEPARATOR}"
+        position = 0
+        for index, token in enumerate(tokens):
+            found = text.find(token, position)
+            if found < 0:
+                if index:
+                    next_pages[index - 1][_page_at(text, position)] += count
+                break
+            reached[index] += count
+            # The closing separator opens the next page
+            position = found + len(token) - 1
+
+    result_steps = []
+    for index, step in enumerate(steps):
+        previous = reached[index - 1] if index else sessions
+        dropped = sorted(next_pages[index].items(), key=lambda x: (-x[1], x[0]))[:TOP_NEXT_PAGES]
+        result_steps.append({
+            "step": index + 1,
+            "page": step,
+            "sessions": reached[index],
+            "conversion_from_previous": round(reached[index] / previous, 4) if previous else 0.0,
+            "conversion_from_start": round(reached[index] / reached[0], 4) if reached[0] else 0.0,
+            "drop_off": reached[index] - reached[index + 1] if index + 1 < len(steps) else 0,
+            "drop_off_next_pages": [{"page": page, "count": count} for page, count in dropped],
+        })
+    return {"sessions": sessions, "steps": result_steps}
+
+
+def _page_at(text: str, position: int) -> str:
+    """Page starting after the separator at position, EXIT at the end of the sequence"""
+    end = text.find(PAGE_SEPARATOR, position + 1)
+    return text[position + 1:end] if end > position + 1 else EXIT
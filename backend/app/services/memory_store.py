@@ -0,0 +1,714 @@
+"""
+In-process stand-in for the Firestore AsyncClient
+
+Implements the subset of the google-cloud-firestore async API used by
+FirestoreService (collections, documents, where/FieldFilter, order_by,
+limit, start_after, select, stream, count/sum/avg aggregations, field
+transforms, batches and transactions) on plain dicts, so routes can be
+exercised and benchmarked without a GCP project.
+
+Selected with FIRESTORE_BACKEND=memory. Data lives in the process only.
+"""
+import functools
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from google.api_core import exceptions
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_aggregation import AggregationResult
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+# Transaction attempts before giving up on contention
+MAX_TRANSACTION_ATTEMPTS = 5
+
+# Field transforms Firestore applies to one document in a commit
+MAX_TRANSFORMS_PER_DOCUMENT = 500
+
+_TRANSFORM_TYPES = (transforms.Increment, transforms.Maximum, transforms.Minimum, transforms.ArrayUnion, transforms.ArrayRemove)
+
+_MISSING = object()
+
+
+# Values
+
+def _now() -> DatetimeWithNanoseconds:
+    return _to_timestamp(datetime.now(timezone.utc))
+
+
+def _to_timestamp(value: datetime) -> DatetimeWithNanoseconds:
+    """Timestamp as returned by Firestore: UTC-aware, naive values are taken as UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    else:
+        value = value.astimezone(timezone.utc)
+    return DatetimeWithNanoseconds(
+        value.year, value.month, value.day,
+        value.hour, value.minute, value.second, value.microsecond,
+        tzinfo=timezone.utc,
+    )
+
+
+def _normalize(value: Any) -> Any:
+    """Convert a written value to its stored form (timestamps, tuples)"""
+    if isinstance(value, datetime):
+        return _to_timestamp(value)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def _copy(value: Any) -> Any:
+    """Copy the mutable containers of a stored value (scalars are immutable)"""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _type_rank(value: Any) -> int:
+    """Firestore cross-type ordering: null < bool < number < timestamp < string < bytes < reference < array < map"""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, MemoryDocumentReference):
+        return 6
+    if isinstance(value, list):
+        return 8
+    if isinstance(value, dict):
+        return 9
+    return 10
+
+
+def _compare(left: Any, right: Any) -> int:
+    rank_left, rank_right = _type_rank(left), _type_rank(right)
+    if rank_left != rank_right:
+        return -1 if rank_left < rank_right else 1
+    if rank_left == 0:
+        return 0
+    if rank_left == 6:
+        left, right = left.path, right.path
+    elif rank_left == 8:
+        for item_left, item_right in zip(left, right):
+            result = _compare(item_left, item_right)
+            if result:
+                return result
+        left, right = len(left), len(right)
+    elif rank_left == 9:
+        return _compare(sorted(left.items()), sorted(right.items()))
+    elif rank_left == 10:
+        left, right = repr(left), repr(right)
+    return (left > right) - (left < right)
+
+
+def _equals(left: Any, right: Any) -> bool:
+    return _type_rank(left) == _type_rank(right) and _compare(left, right) == 0
+
+
+def _get_path(data: Dict[str, Any], field_path: str) -> Any:
+    """Value at a dotted field path, _MISSING if absent"""
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_path(data: Dict[str, Any], field_path: str, value: Any):
+    parts = field_path.split(".")
+    target = data
+    for part in parts[:-1]:
+        child = target.get(part)
+        if not isinstance(child, dict):
+            child = {}
+            target[part] = child
+        target = child
+    target[parts[-1]] = value
+
+
+def _delete_path(data: Dict[str, Any], field_path: str):
+    parts = field_path.split(".")
+    target = data
+    for part in parts[:-1]:
+        target = target.get(part)
+        if not isinstance(target, dict):
+            return
+    target.pop(parts[-1], None)
+
+
+def _apply_value(current: Any, value: Any) -> Any:
+    """Resolve a written value against the current field value (transforms, sentinels)"""
+    if value is transforms.SERVER_TIMESTAMP:
+        return _now()
+    if isinstance(value, transforms.Increment):
+        if isinstance(current, (int, float)) and not isinstance(current, bool):
+            return current + value.value
+        return value.value
+    if isinstance(value, transforms.Maximum):
+        if isinstance(current, (int, float)) and not isinstance(current, bool):
+            return max(current, value.value)
+        return value.value
+    if isinstance(value, transforms.Minimum):
+        if isinstance(current, (int, float)) and not isinstance(current, bool):
+            return min(current, value.value)
+        return value.value
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        for item in _normalize(value.values):
+            if not any(_equals(item, existing) for existing in result):
+                result.append(item)
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        removed = _normalize(value.values)
+        if not isinstance(current, list):
+            return []
+        return [item for item in current if not any(_equals(item, other) for other in removed)]
+    if isinstance(value, dict):
+        # Maps written whole may still contain transforms
+        return {key: _apply_value(_MISSING, item) for key, item in value.items() if item is not transforms.DELETE_FIELD}
+    return _normalize(value)
+
+
+def _count_transforms(value: Any) -> int:
+    if isinstance(value, dict):
+        return sum(_count_transforms(item) for item in value.values())
+    return 1 if value is transforms.SERVER_TIMESTAMP or isinstance(value, _TRANSFORM_TYPES) else 0
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]):
+    """Deep merge of set(merge=True): nested maps are merged, not replaced"""
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and value:
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = {}
+                target[key] = child
+            _merge(child, value)
+        else:
+            target[key] = _apply_value(target.get(key, _MISSING), value)
+
+
+def _project(data: Dict[str, Any], field_paths: Optional[Iterable[str]]) -> Dict[str, Any]:
+    if field_paths is None:
+        return data
+    projected: Dict[str, Any] = {}
+    for field_path in field_paths:
+        value = _get_path(data, field_path)
+        if value is not _MISSING:
+            _set_path(projected, field_path, value)
+    return projected
+
+
+# Filters
+
+def _matches(data: Dict[str, Any], field_path: str, op: str, expected: Any) -> bool:
+    value = _get_path(data, field_path)
+    if value is _MISSING:
+        return False
+    if op == "==":
+        return _equals(value, expected)
+    if op == "!=":
+        return value is not None and not _equals(value, expected)
+    if op == "in":
+        return any(_equals(value, item) for item in expected)
+    if op == "not-in":
+        return value is not None and not any(_equals(value, item) for item in expected)
+    if op == "array-contains":
+        return isinstance(value, list) and any(_equals(item, expected) for item in value)
+    if op == "array-contains-any":
+        return isinstance(value, list) and any(_equals(item, other) for item in value for other in expected)
+    # Range filters only match values of the same type
+    if _type_rank(value) != _type_rank(expected):
+        return False
+    result = _compare(value, expected)
+    if op == "<":
+        return result < 0
+    if op == "<=":
+        return result <= 0
+    if op == ">":
+        return result > 0
+    if op == ">=":
+        return result >= 0
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+_RANGE_OPERATORS = {"<", "<=", ">", ">=", "!=", "not-in"}
+
+
+class MemoryStore:
+    """Documents of every collection, keyed by collection path then document id"""
+
+    def __init__(self):
+        self.collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.versions: Dict[str, int] = {}
+        self.lock = threading.RLock()
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        collection_path, doc_id = path.rsplit("/", 1)
+        return self.collections.get(collection_path, {}).get(doc_id)
+
+    def put(self, path: str, data: Optional[Dict[str, Any]]):
+        collection_path, doc_id = path.rsplit("/", 1)
+        documents = self.collections.setdefault(collection_path, {})
+        if data is None:
+            documents.pop(doc_id, None)
+        else:
+            documents[doc_id] = data
+        self.versions[path] = self.versions.get(path, 0) + 1
+
+    def apply(self, writes: List[Tuple[str, "MemoryDocumentReference", Any, Any]]):
+        """Apply writes atomically: all of them or none (writes are validated first)"""
+        transform_counts: Dict[str, int] = {}
+        for _, doc_ref, data, _ in writes:
+            transform_counts[doc_ref.path] = transform_counts.get(doc_ref.path, 0) + _count_transforms(data)
+        for path, count in transform_counts.items():
+            if count > MAX_TRANSFORMS_PER_DOCUMENT:
+                raise exceptions.InvalidArgument(f"A document cannot be written with more than {MAX_TRANSFORMS_PER_DOCUMENT} transforms: {path}")
+        with self.lock:
+            staged: Dict[str, Optional[Dict[str, Any]]] = {}
+            for operation, doc_ref, data, option in writes:
+                path = doc_ref.path
+                current = staged[path] if path in staged else self.get(path)
+                if operation == "create":
+                    if current is not None:
+                        raise exceptions.AlreadyExists(f"Document already exists: {path}")
+                    staged[path] = _apply_value(_MISSING, data)
+                elif operation == "set":
+                    if option and current is not None:
+                        document = _copy(current)
+                        _merge(document, data)
+                    elif option:
+                        document = {}
+                        _merge(document, data)
+                    else:
+                        document = _apply_value(_MISSING, data)
+                    staged[path] = document
+                elif operation == "update":
+                    if current is None:
+                        raise exceptions.NotFound(f"No document to update: {path}")
+                    document = _copy(current)
+                    for field_path, value in data.items():
+                        if value is transforms.DELETE_FIELD:
+                            _delete_path(document, field_path)
+                        else:
+                            existing = _get_path(document, field_path)
+                            _set_path(document, field_path, _apply_value(existing, value))
+                    staged[path] = document
+                elif operation == "delete":
+                    staged[path] = None
+            for path, document in staged.items():
+                self.put(path, document)
+            self.writes += len(writes)
+
+
+class MemoryDocumentSnapshot:
+    """Read-only view of a document at read time"""
+
+    def __init__(self, reference: "MemoryDocumentReference", data: Optional[Dict[str, Any]], field_paths: Optional[Iterable[str]] = None):
+        self.reference = reference
+        self._data = data
+        self._field_paths = list(field_paths) if field_paths is not None else None
+        self.read_time = _now()
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        if self._data is None:
+            return None
+        return _copy(_project(self._data, self._field_paths))
+
+    def get(self, field_path: str) -> Any:
+        value = _get_path(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return _copy(value)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryClient", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id: str) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    async def get(self, field_paths: Optional[Iterable[str]] = None, transaction: Optional["MemoryTransaction"] = None, **kwargs) -> MemoryDocumentSnapshot:
+        store = self._client._store
+        with store.lock:
+            data = store.get(self.path)
+            store.reads += 1
+            if transaction is not None:
+                transaction._record_read(self.path)
+        return MemoryDocumentSnapshot(self, data, field_paths)
+
+    async def create(self, document_data: Dict[str, Any], **kwargs):
+        self._client._store.apply([("create", self, document_data, None)])
+
+    async def set(self, document_data: Dict[str, Any], merge: bool = False, **kwargs):
+        self._client._store.apply([("set", self, document_data, merge)])
+
+    async def update(self, field_updates: Dict[str, Any], option=None, **kwargs):
+        self._client._store.apply([("update", self, field_updates, None)])
+
+    async def delete(self, option=None, **kwargs):
+        self._client._store.apply([("delete", self, None, None)])
+
+
+class MemoryAggregationQuery:
+    def __init__(self, query: "MemoryQuery", kind: str, field_path: Optional[str], alias: Optional[str]):
+        self._query = query
+        self._kind = kind
+        self._field_path = field_path
+        self._alias = alias or "field_1"
+
+    async def get(self, transaction: Optional["MemoryTransaction"] = None, **kwargs) -> List[List[AggregationResult]]:
+        store = self._query._client._store
+        with store.lock:
+            documents = self._query._matching()
+            # Billed one read per batch of 1000 index entries
+            store.reads += max(1, (len(documents) + 999) // 1000)
+            store.queries += 1
+
+        if self._kind == "count":
+            value: Any = len(documents)
+        else:
+            numbers = [
+                value for _, data in documents
+                for value in [_get_path(data, self._field_path)]
+                if isinstance(value, (int, float)) and not isinstance(value, bool)
+            ]
+            if self._kind == "sum":
+                value = sum(numbers)
+            else:
+                value = sum(numbers) / len(numbers) if numbers else None
+        return [[AggregationResult(alias=self._alias, value=value, read_time=_now())]]
+
+
+class MemoryQuery:
+    """Immutable query: every builder method returns a new query"""
+
+    def __init__(self, client: "MemoryClient", collection_path: str):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._orders: List[Tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._start_after: Optional[Any] = None
+        self._field_paths: Optional[List[str]] = None
+
+    def _clone(self) -> "MemoryQuery":
+        query = MemoryQuery.__new__(MemoryQuery)
+        query.__dict__.update(self.__dict__)
+        query._filters = list(self._filters)
+        query._orders = list(self._orders)
+        return query
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None, *, filter: Optional[FieldFilter] = None) -> "MemoryQuery":
+        if filter is not None:
+            if not isinstance(filter, FieldFilter):
+                raise NotImplementedError("Only FieldFilter is supported by the memory backend")
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+            if not isinstance(op_string, str):
+                # == None / == NaN are turned into unary IS_NULL / IS_NAN operators
+                op_string = "=="
+        query = self._clone()
+        if op_string in ("in", "not-in", "array-contains-any"):
+            value = [_normalize(item) for item in value]
+        else:
+            value = _normalize(value)
+        query._filters.append((field_path, op_string, value))
+        return query
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "MemoryQuery":
+        query = self._clone()
+        query._orders.append((field_path, direction))
+        return query
+
+    def limit(self, count: int) -> "MemoryQuery":
+        query = self._clone()
+        query._limit = count
+        return query
+
+    def offset(self, num_to_skip: int) -> "MemoryQuery":
+        query = self._clone()
+        query._offset = num_to_skip
+        return query
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "MemoryQuery":
+        query = self._clone()
+        query._start_after = document_fields_or_snapshot
+        return query
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        query = self._clone()
+        query._field_paths = list(field_paths)
+        return query
+
+    def count(self, alias: Optional[str] = None) -> MemoryAggregationQuery:
+        return MemoryAggregationQuery(self, "count", None, alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> MemoryAggregationQuery:
+        return MemoryAggregationQuery(self, "sum", field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> MemoryAggregationQuery:
+        return MemoryAggregationQuery(self, "avg", field_ref, alias)
+
+    def _effective_orders(self) -> List[Tuple[str, str]]:
+        """Explicit orders, then the inequality field, then the document name (like Firestore)"""
+        orders = list(self._orders)
+        ordered_fields = {field_path for field_path, _ in orders}
+        for field_path, op, _ in self._filters:
+            if op in _RANGE_OPERATORS and field_path not in ordered_fields:
+                orders.append((field_path, ASCENDING))
+                ordered_fields.add(field_path)
+        if "__name__" not in ordered_fields:
+            orders.append(("__name__", orders[-1][1] if orders else ASCENDING))
+        return orders
+
+    @staticmethod
+    def _order_value(doc_id: str, data: Dict[str, Any], field_path: str) -> Any:
+        return doc_id if field_path == "__name__" else _get_path(data, field_path)
+
+    def _cursor_values(self, orders: List[Tuple[str, str]]) -> List[Any]:
+        cursor = self._start_after
+        if isinstance(cursor, MemoryDocumentSnapshot):
+            data = cursor._data or {}
+            return [self._order_value(cursor.id, data, field_path) for field_path, _ in orders]
+        if isinstance(cursor, dict):
+            return [cursor.get(field_path, _MISSING) for field_path, _ in orders]
+        return list(cursor)
+
+    def _matching(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """(id, data) of the matching documents, ordered, cursor and offset/limit applied"""
+        documents = self._client._store.collections.get(self._collection_path, {})
+        matched = [
+            (doc_id, data) for doc_id, data in documents.items()
+            if all(_matches(data, field_path, op, value) for field_path, op, value in self._filters)
+        ]
+
+        orders = self._effective_orders()
+        # Documents missing an order_by field are excluded, like in Firestore
+        matched = [
+            (doc_id, data) for doc_id, data in matched
+            if all(self._order_value(doc_id, data, field_path) is not _MISSING for field_path, _ in orders)
+        ]
+
+        def compare_keys(left_values: List[Any], right_values: List[Any]) -> int:
+            for (field_path, direction), left, right in zip(orders, left_values, right_values):
+                if right is _MISSING:
+                    continue
+                result = _compare(left, right)
+                if result:
+                    return -result if direction == DESCENDING else result
+            return 0
+
+        keyed = [
+            ([self._order_value(doc_id, data, field_path) for field_path, _ in orders], doc_id, data)
+            for doc_id, data in matched
+        ]
+        keyed.sort(key=functools.cmp_to_key(lambda left, right: compare_keys(left[0], right[0])))
+
+        if self._start_after is not None:
+            cursor = self._cursor_values(orders)
+            keyed = [item for item in keyed if compare_keys(item[0], cursor) > 0]
+        matched = [(doc_id, data) for _, doc_id, data in keyed]
+        if self._offset:
+            matched = matched[self._offset:]
+        if self._limit is not None:
+            matched = matched[:self._limit]
+        return matched
+
+    async def stream(self, transaction: Optional["MemoryTransaction"] = None, **kwargs) -> AsyncIterator[MemoryDocumentSnapshot]:
+        store = self._client._store
+        with store.lock:
+            documents = self._matching()
+            store.reads += max(1, len(documents))
+            store.queries += 1
+            if transaction is not None:
+                for doc_id, _ in documents:
+                    transaction._record_read(f"{self._collection_path}/{doc_id}")
+        for doc_id, data in documents:
+            reference = MemoryDocumentReference(self._client, f"{self._collection_path}/{doc_id}")
+            yield MemoryDocumentSnapshot(reference, data, self._field_paths)
+
+    async def get(self, transaction: Optional["MemoryTransaction"] = None, **kwargs) -> List[MemoryDocumentSnapshot]:
+        return [snapshot async for snapshot in self.stream(transaction=transaction)]
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client: "MemoryClient", path: str):
+        super().__init__(client, path)
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        if document_id is None:
+            document_id = uuid.uuid4().hex[:20]
+        return MemoryDocumentReference(self._client, f"{self.path}/{document_id}")
+
+    async def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        doc_ref = self.document(document_id)
+        await doc_ref.create(document_data)
+        return _now(), doc_ref
+
+
+class MemoryWriteBatch:
+    """Writes applied atomically on commit"""
+
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+        self._writes: List[Tuple[str, MemoryDocumentReference, Any, Any]] = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def create(self, reference: MemoryDocumentReference, document_data: Dict[str, Any]):
+        self._writes.append(("create", reference, document_data, None))
+
+    def set(self, reference: MemoryDocumentReference, document_data: Dict[str, Any], merge: bool = False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def update(self, reference: MemoryDocumentReference, field_updates: Dict[str, Any], option=None):
+        self._writes.append(("update", reference, field_updates, None))
+
+    def delete(self, reference: MemoryDocumentReference, option=None):
+        self._writes.append(("delete", reference, None, None))
+
+    async def commit(self, **kwargs):
+        writes, self._writes = self._writes, []
+        self._client._store.apply(writes)
+        return [_now() for _ in writes]
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """
+    Optimistic transaction: commit fails if a document read through it
+    changed since, and run_transaction() retries the whole function
+    """
+
+    def __init__(self, client: "MemoryClient"):
+        super().__init__(client)
+        self._read_versions: Dict[str, int] = {}
+
+    def _record_read(self, path: str):
+        self._read_versions.setdefault(path, self._client._store.versions.get(path, 0))
+
+    async def commit(self, **kwargs):
+        store = self._client._store
+        with store.lock:
+            for path, version in self._read_versions.items():
+                if store.versions.get(path, 0) != version:
+                    raise exceptions.Aborted(f"Transaction contention on {path}")
+            return await super().commit()
+
+
+class MemoryClient:
+    """AsyncClient-like entry point of the memory backend"""
+
+    def __init__(self):
+        self._store = MemoryStore()
+
+    def collection(self, *collection_path: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, "/".join(collection_path))
+
+    def document(self, *document_path: str) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self, "/".join(document_path))
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, **kwargs) -> MemoryTransaction:
+        return MemoryTransaction(self)
+
+    async def get_all(self, references: List[MemoryDocumentReference], field_paths: Optional[Iterable[str]] = None, transaction: Optional[MemoryTransaction] = None, **kwargs) -> AsyncIterator[MemoryDocumentSnapshot]:
+        for reference in references:
+            yield await reference.get(field_paths=field_paths, transaction=transaction)
+
+    async def run_transaction(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call fn(transaction, *args, **kwargs) and commit, retrying on contention"""
+        for attempt in range(MAX_TRANSACTION_ATTEMPTS):
+            transaction = self.transaction()
+            result = await fn(transaction, *args, **kwargs)
+            try:
+                await transaction.commit()
+                return result
+            except exceptions.Aborted:
+                if attempt == MAX_TRANSACTION_ATTEMPTS - 1:
+                    raise
+
+    def load_documents(self, collection_path: str, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Bulk-load (id, data) pairs, bypassing transforms and write accounting
+
+        Meant for seeding large synthetic datasets; values are normalized
+        like regular writes (naive datetimes are taken as UTC).
+        """
+        loaded = 0
+        with self._store.lock:
+            collection = self._store.collections.setdefault(collection_path, {})
+            for doc_id, data in documents:
+                collection[doc_id] = _normalize(data)
+                loaded += 1
+        return loaded
+
+    def stats(self) -> Dict[str, int]:
+        """Operation counters, mirroring what Firestore would bill"""
+        store = self._store
+        return {
+            "reads": store.reads,
+            "writes": store.writes,
+            "queries": store.queries,
+            "documents": sum(len(documents) for documents in store.collections.values()),
+        }
+
+    def reset_stats(self):
+        self._store.reads = 0
+        self._store.writes = 0
+        self._store.queries = 0
+
+    def clear(self):
+        with self._store.lock:
+            self._store.collections.clear()
+            self._store.versions.clear()
+        self.reset_stats()
@@ -0,0 +1,143 @@
+"""
+Incremental weekly cohort retention
+
+Users belong to the cohort of the UTC week (starting Monday) of their first
+page visit, and are active in every week they visit a page. Each user has an
+activity document holding their first week and a bitset of their active
+weeks (bit i: i weeks after the first), read in the transaction assigning a
+visit to a session; a visit in a week whose bit is not set yet sets it and
+increments its cohort's count for that week offset. The retention matrix is then read
+from one small document per cohort instead of joining users with their
+visits.
+
+User activity document fields (user_activity/{user_id}):
+    first_week                      UTC start of the user's first active week
+    weeks                           bitset of the active weeks (bytes, little-endian)
+
+Cohort document fields (retention_cohorts_weekly/{YYYY-MM-DD}):
+    cohort_start                    UTC start of the cohort's week
+    active.<offset>                 users of the cohort active <offset> weeks after
+                                    it (offset 0: the cohort's size)
+
+The session head caches the latest week recorded for its user
+(active_week), so only the first visit of a session in a week reads the
+activity document. Cohort counts are only written with Increment
+transforms: a user moved to an earlier cohort is a -1 in the old one.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.services import rollups
+
+USER_ACTIVITY_COLLECTION = "user_activity"
+COHORT_COLLECTION = "retention_cohorts_weekly"
+
+
+def week_start(moment: datetime) -> datetime:
+    """UTC start (Monday midnight) of the week containing moment"""
+    day = rollups.bucket_start(moment, rollups.DAY)
+    return day - timedelta(days=day.weekday())
+
+
+def week_id(moment: datetime) -> str:
+    """Document id of the week containing moment"""
+    return week_start(moment).strftime("%Y-%m-%d")
+
+
+def _weeks_between(first: datetime, later: datetime) -> int:
+    return (week_start(later) - week_start(first)).days // 7
+
+
+def _offsets(bits: int) -> Iterable[int]:
+    offset = 0
+    while bits:
+        if bits & 1:
+            yield offset
+        bits >>= 1
+        offset += 1
+
+
+def _encode(bits: int) -> bytes:
+    return bits.to_bytes(max(1, (bits.bit_length() + 7) // 8), "little")
+
+
+def _decode(weeks: Optional[bytes]) -> int:
+    return int.from_bytes(weeks or b"", "little")
+
+
+def _cohort_delta(first_week: datetime, bits: int, sign: int) -> rollups.RollupDeltas:
+    return {(COHORT_COLLECTION, first_week.strftime("%Y-%m-%d")): {
+        "cohort_start": first_week,
+        "active": {str(offset): sign for offset in _offsets(bits)},
+    }}
+
+
+def record_activity(
+    activity: Optional[Dict[str, Any]],
+    moment: datetime,
+) -> Optional[Tuple[Dict[str, Any], rollups.RollupDeltas]]:
+    """
+    New activity document and cohort deltas of a user active at moment, given
+    their current activity document (None if they have none); None if the
+    week is already recorded
+
+    A visit before the user's first week (delivered late, or backfilled)
+    moves them to an earlier cohort: their weeks are taken off the old cohort
+    and counted in the new one.
+    """
+    week = week_start(moment)
+    if activity is None:
+        return {"first_week": week, "weeks": _encode(1)}, _cohort_delta(week, 1, 1)
+
+    first_week = rollups.to_utc(activity["first_week"])
+    bits = _decode(activity.get("weeks"))
+    if week >= first_week:
+        bit = 1 << _weeks_between(first_week, week)
+        if bits & bit:
+            return None
+        return {"first_week": first_week, "weeks": _encode(bits | bit)}, _cohort_delta(first_week, bit, 1)
+
+    shifted = (bits << _weeks_between(week, first_week)) | 1
+    deltas = _cohort_delta(first_week, bits, -1)
+    rollups.merge_deltas(deltas, _cohort_delta(week, shifted, 1))
+    return {"first_week": week, "weeks": _encode(shifted)}, deltas
+
+
+def build(visits: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Activity document of each user and cohort documents (by id) of some page visits (user_id, start_time)"""
+    user_weeks: Dict[str, set] = {}
+    for visit in visits:
+        start = rollups.to_utc(visit.get("start_time"))
+        if visit.get("user_id") and start is not None:
+            user_weeks.setdefault(visit["user_id"], set()).add(week_start(start))
+
+    activities: Dict[str, Dict[str, Any]] = {}
+    deltas: rollups.RollupDeltas = {}
+    for user_id, weeks in user_weeks.items():
+        first_week = min(weeks)
+        bits = 0
+        for week in weeks:
+            bits |= 1 << _weeks_between(first_week, week)
+        activities[user_id] = {"first_week": first_week, "weeks": _encode(bits)}
+        rollups.merge_deltas(deltas, _cohort_delta(first_week, bits, 1))
+    cohorts = {doc_id: rollups.as_document(delta) for (_, doc_id), delta in deltas.items()}
+    return activities, cohorts
+
+
+def retention_matrix(cohorts: Iterable[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+    """Rows of the retention matrix, one per cohort document (oldest first), up to the week of now"""
+    current_week = week_start(now)
+    rows = []
+    for cohort in sorted(cohorts, key=lambda cohort: rollups.to_utc(cohort["cohort_start"])):
+        start = rollups.to_utc(cohort["cohort_start"])
+        active = cohort.get("active") or {}
+        size = active.get("0", 0)
+        if size <= 0:
+            continue
+        counts = [max(0, active.get(str(offset), 0)) for offset in range(_weeks_between(start, current_week) + 1)]
+        rows.append({
+            "cohort_week": start.strftime("%Y-%m-%d"),
+            "users": size,
+            "active_users": counts,
+            "retention": [round(count / size, 4) for count in counts],
+        })
+    return rows
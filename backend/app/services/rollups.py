@@ -0,0 +1,426 @@
+"""
+Incremental page-visit and AI-event rollups
+
+Every page visit adds to two rollup documents, the UTC hour and the UTC day
+it started in; every AI event to the rollup of its UTC day. Deltas are plain
+numbers while they are built and merged (so a job closing many visits, or the
+RollupBuffer flushing many requests' deltas, writes each bucket once), then
+turned into Firestore Increment/Maximum/Minimum transforms applied with
+set(merge=True): concurrent writers never overwrite each other's counts.
+
+Page-visit rollup document fields:
+    granularity, bucket_start       "hour"/"day", UTC start of the bucket
+    pageviews                       visits started in the bucket
+    page_views.<path>               visits per page
+    users_hll.<index>,              HyperLogLog registers of the visiting users and
+    sessions_hll.<index>            sessions, raised with Maximum transforms (unique
+                                    counts of any window merge its buckets' registers)
+    duration_seconds, duration_count, page_duration_seconds.<path>,
+    page_duration_count.<path>      durations of the visits closed so far
+    duration_sketch.<bin>,          DDSketch bins of those durations, overall and
+    page_duration_sketch.<path>.<bin>   per page (percentiles of any window)
+    hour_counts.<HH>                visits per UTC hour (daily buckets, heatmaps)
+
+Page-flow rollup document fields (one per UTC day, written by the sessionizer):
+    bucket_start                    UTC start of the day
+    transitions.<from>.<to>         moves from a page to the next one within a session,
+                                    on the day of the move
+    entry_pages.<path>,             first and last pages of the sessions closed so far,
+    exit_pages.<path>               on the day the session started
+
+AI-event rollup document fields, per event type and "<provider>:<model>":
+    event_types.<type>.<model>.     count, input_tokens, output_tokens, cost_usd,
+                                    latency_ms_sum, latency_ms_min, latency_ms_max,
+                                    latency_sketch.<bin> (positive latencies only)
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from google.cloud.firestore_v1 import transforms
+from app.utils.hyperloglog import HyperLogLog
+from app.utils.quantiles import DDSketch
+
+HOUR = "hour"
+DAY = "day"
+
+ROLLUP_COLLECTIONS = {
+    HOUR: "page_visit_rollups_hourly",
+    DAY: "page_visit_rollups_daily",
+}
+
+PAGE_FLOW_ROLLUP_COLLECTION = "page_flow_rollups_daily"
+
+AI_EVENT_ROLLUP_COLLECTION = "ai_event_rollups_daily"
+
+# Sketch parameters (changing them invalidates stored registers and bins)
+HLL_PRECISION = 12
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+# Firestore applies at most this many field transforms to a document per commit
+MAX_TRANSFORMS_PER_WRITE = 500
+
+# (collection, document id) -> plain delta
+RollupDeltas = Dict[Tuple[str, str], Dict[str, Any]]
+
+
+class _Extremum:
+    """Delta value kept at its maximum (or minimum), written as a Maximum (Minimum) transform"""
+
+    __slots__ = ("value", "keep")
+
+    def __init__(self, value: float, keep=max):
+        self.value = value
+        self.keep = keep
+
+    def merged(self, other: "_Extremum") -> "_Extremum":
+        return _Extremum(self.keep(self.value, other.value), self.keep)
+
+    def transform(self):
+        return transforms.Maximum(self.value) if self.keep is max else transforms.Minimum(self.value)
+
+
+def maximum(value: float) -> _Extremum:
+    """Delta value written as a Maximum transform (merged deltas keep the largest)"""
+    return _Extremum(value, max)
+
+
+def minimum(value: float) -> _Extremum:
+    """Delta value written as a Minimum transform (merged deltas keep the smallest)"""
+    return _Extremum(value, min)
+
+
+def _registers(value: str) -> Dict[str, _Extremum]:
+    index, rank = HyperLogLog.register_update(value, HLL_PRECISION)
+    return {str(index): maximum(rank)}
+
+
+def _sketch() -> DDSketch:
+    return DDSketch(SKETCH_RELATIVE_ACCURACY)
+
+
+def to_utc(value: Any) -> Optional[datetime]:
+    """Aware UTC datetime of a stored timestamp (naive values are UTC), None if unusable"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    elif not isinstance(value, datetime) and hasattr(value, "timestamp"):
+        return datetime.fromtimestamp(value.timestamp(), tz=timezone.utc)
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the UTC bucket containing moment"""
+    moment = to_utc(moment)
+    if granularity == HOUR:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_id(moment: datetime, granularity: str) -> str:
+    """Document id of the bucket containing moment (sorts chronologically)"""
+    start = bucket_start(moment, granularity)
+    return start.strftime("%Y-%m-%dT%H") if granularity == HOUR else start.strftime("%Y-%m-%d")
+
+
+def visit_deltas(
+    start_time: datetime,
+    page_path: Optional[str],
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    pageviews: int = 0,
+    duration_seconds: Optional[float] = None,
+    previous_duration_seconds: Optional[float] = None,
+) -> RollupDeltas:
+    """
+    Deltas of one visit for its hourly and daily buckets
+
+    A new visit counts pageviews=1 (and its user and session). A duration is
+    recorded when the visit is closed; re-closing it replaces the previous
+    duration (its sum is corrected and its sketch bin moved).
+    """
+    page_path = page_path or "unknown"
+    start = to_utc(start_time)
+    deltas: RollupDeltas = {}
+    for granularity, collection in ROLLUP_COLLECTIONS.items():
+        delta: Dict[str, Any] = {
+            "granularity": granularity,
+            "bucket_start": bucket_start(start, granularity),
+        }
+        if pageviews:
+            delta["pageviews"] = pageviews
+            delta["page_views"] = {page_path: pageviews}
+            if user_id:
+                delta["users_hll"] = _registers(user_id)
+            if session_id:
+                delta["sessions_hll"] = _registers(session_id)
+            if granularity == DAY:
+                delta["hour_counts"] = {f"{start.hour:02d}": pageviews}
+        if duration_seconds is not None:
+            change = duration_seconds - (previous_duration_seconds or 0.0)
+            durations = 0 if previous_duration_seconds is not None else 1
+            sketch = _sketch()
+            bins = {sketch.bin_key(duration_seconds): 1}
+            if previous_duration_seconds is not None:
+                previous_bin = sketch.bin_key(previous_duration_seconds)
+                bins[previous_bin] = bins.get(previous_bin, 0) - 1
+            delta["duration_seconds"] = change
+            delta["duration_count"] = durations
+            delta["page_duration_seconds"] = {page_path: change}
+            delta["page_duration_count"] = {page_path: durations}
+            delta["duration_sketch"] = bins
+            delta["page_duration_sketch"] = {page_path: dict(bins)}
+        deltas[(collection, bucket_id(start, granularity))] = delta
+    return deltas
+
+
+def _page_flow_delta(moment: datetime, **counts: Any) -> RollupDeltas:
+    return {(PAGE_FLOW_ROLLUP_COLLECTION, bucket_id(moment, DAY)): {"bucket_start": bucket_start(moment, DAY), **counts}}
+
+
+def transition_deltas(moment: datetime, from_page: str, to_page: str) -> RollupDeltas:
+    """Delta of a move from from_page to to_page within a session, for the daily page-flow bucket of moment"""
+    return _page_flow_delta(moment, transitions={from_page: {to_page: 1}})
+
+
+def session_close_deltas(session_start: datetime, entry_page: str, exit_page: str) -> RollupDeltas:
+    """Delta of a closed session, for the daily page-flow bucket of its start"""
+    return _page_flow_delta(session_start, entry_pages={entry_page: 1}, exit_pages={exit_page: 1})
+
+
+def ai_event_deltas(event: Dict[str, Any]) -> RollupDeltas:
+    """Delta of one AI event (as stored in ai_events) for its daily bucket, none if it has no usable created_at"""
+    created_at = to_utc(event.get("created_at"))
+    if created_at is None:
+        return {}
+    latency_ms = event.get("latency_ms") or 0.0
+    stats: Dict[str, Any] = {
+        "count": 1,
+        "input_tokens": event.get("input_tokens") or 0,
+        "output_tokens": event.get("output_tokens") or 0,
+        "cost_usd": event.get("cost_usd") or 0.0,
+        "latency_ms_sum": latency_ms,
+    }
+    if latency_ms > 0:
+        stats["latency_ms_min"] = minimum(latency_ms)
+        stats["latency_ms_max"] = maximum(latency_ms)
+        stats["latency_sketch"] = {_sketch().bin_key(latency_ms): 1}
+    model_key = f"{event.get('provider', 'unknown')}:{event.get('model', 'unknown')}"
+    delta = {
+        "bucket_start": bucket_start(created_at, DAY),
+        "event_types": {event.get("event_type", "unknown"): {model_key: stats}},
+    }
+    return {(AI_EVENT_ROLLUP_COLLECTION, bucket_id(created_at, DAY)): delta}
+
+
+def _merge_delta(target: Dict[str, Any], delta: Dict[str, Any]):
+    for key, value in delta.items():
+        if isinstance(value, _Extremum):
+            target[key] = target[key].merged(value) if key in target else value
+        elif isinstance(value, dict):
+            _merge_delta(target.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and key in target:
+            target[key] += value
+        else:
+            target[key] = value
+
+
+def merge_deltas(target: RollupDeltas, deltas: RollupDeltas):
+    """Accumulate deltas into target, bucket by bucket"""
+    for key, delta in deltas.items():
+        _merge_delta(target.setdefault(key, {}), delta)
+
+
+def _is_transform(value: Any) -> bool:
+    return isinstance(value, _Extremum) or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+
+def _leaves(delta: Dict[str, Any], path: Tuple[str, ...] = ()) -> Iterable[Tuple[Tuple[str, ...], Any]]:
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            yield from _leaves(value, path + (key,))
+        else:
+            yield path + (key,), value
+
+
+def split_delta(delta: Dict[str, Any], max_transforms: int = MAX_TRANSFORMS_PER_WRITE) -> List[Dict[str, Any]]:
+    """
+    delta as deltas of at most max_transforms transforms each, to be written
+    in separate commits (plain values go with the first)
+    """
+    parts: List[Dict[str, Any]] = [{}]
+    transforms_in_part = 0
+    for path, value in _leaves(delta):
+        part = parts[0]
+        if _is_transform(value):
+            if transforms_in_part == max_transforms:
+                parts.append({})
+                transforms_in_part = 0
+            transforms_in_part += 1
+            part = parts[-1]
+        for key in path[:-1]:
+            part = part.setdefault(key, {})
+        part[path[-1]] = value
+    return parts
+
+
+def as_increments(delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Firestore set(merge=True) payload of a delta (numbers become Increments)"""
+    payload: Dict[str, Any] = {}
+    for key, value in delta.items():
+        if isinstance(value, _Extremum):
+            payload[key] = value.transform()
+        elif isinstance(value, dict):
+            payload[key] = as_increments(value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            payload[key] = transforms.Increment(value)
+        else:
+            payload[key] = value
+    return payload
+
+
+def as_document(delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Complete rollup document of a delta (rebuilds overwrite buckets with it)"""
+    document: Dict[str, Any] = {}
+    for key, value in delta.items():
+        if isinstance(value, _Extremum):
+            document[key] = value.value
+        elif isinstance(value, dict):
+            document[key] = as_document(value)
+        else:
+            document[key] = value
+    return document
+
+
+class RollupSummary:
+    """Totals of a set of page-visit rollups (users and sessions are sketches, len() estimates them)"""
+
+    def __init__(self, rollups: Iterable[Dict[str, Any]] = ()):
+        self.pageviews = 0
+        self.page_views: Dict[str, int] = defaultdict(int)
+        self.users = HyperLogLog(HLL_PRECISION)
+        self.sessions = HyperLogLog(HLL_PRECISION)
+        self.duration_seconds = 0.0
+        self.duration_count = 0
+        self.page_duration_seconds: Dict[str, float] = defaultdict(float)
+        self.page_duration_count: Dict[str, int] = defaultdict(int)
+        self.durations = _sketch()
+        self.page_durations: Dict[str, DDSketch] = defaultdict(_sketch)
+        for rollup in rollups:
+            self.add(rollup)
+
+    def add(self, rollup: Dict[str, Any]):
+        self.pageviews += rollup.get("pageviews", 0)
+        self.users.merge_registers(rollup.get("users_hll") or {})
+        self.sessions.merge_registers(rollup.get("sessions_hll") or {})
+        self.duration_seconds += rollup.get("duration_seconds", 0)
+        self.duration_count += rollup.get("duration_count", 0)
+        for page, views in (rollup.get("page_views") or {}).items():
+            self.page_views[page] += views
+        for page, seconds in (rollup.get("page_duration_seconds") or {}).items():
+            self.page_duration_seconds[page] += seconds
+        for page, count in (rollup.get("page_duration_count") or {}).items():
+            self.page_duration_count[page] += count
+        self.durations.merge_bins(rollup.get("duration_sketch") or {})
+        for page, bins in (rollup.get("page_duration_sketch") or {}).items():
+            self.page_durations[page].merge_bins(bins)
+
+
+class PageFlowSummary:
+    """Totals of a set of page-flow rollups"""
+
+    def __init__(self, rollups: Iterable[Dict[str, Any]] = ()):
+        self.transitions: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.entry_pages: Dict[str, int] = defaultdict(int)
+        self.exit_pages: Dict[str, int] = defaultdict(int)
+        for rollup in rollups:
+            self.add(rollup)
+
+    def add(self, rollup: Dict[str, Any]):
+        for from_page, targets in (rollup.get("transitions") or {}).items():
+            for to_page, count in targets.items():
+                self.transitions[(from_page, to_page)] += count
+        for page, count in (rollup.get("entry_pages") or {}).items():
+            self.entry_pages[page] += count
+        for page, count in (rollup.get("exit_pages") or {}).items():
+            self.exit_pages[page] += count
+
+
+def group_by(rollups: Iterable[Dict[str, Any]], key_format: str) -> Dict[str, RollupSummary]:
+    """Summaries of rollups grouped by their bucket_start formatted with key_format"""
+    groups: Dict[str, RollupSummary] = defaultdict(RollupSummary)
+    for rollup in rollups:
+        start = to_utc(rollup.get("bucket_start"))
+        if start is not None:
+            groups[start.strftime(key_format)].add(rollup)
+    return dict(sorted(groups.items()))
+
+
+def day_hour_counts(daily_rollups: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """Visits per "<Weekday>_<hour>" cell, from daily rollups"""
+    counts: Dict[str, int] = defaultdict(int)
+    for rollup in daily_rollups:
+        start = to_utc(rollup.get("bucket_start"))
+        if start is None:
+            continue
+        weekday = start.strftime("%A")
+        for hour, count in (rollup.get("hour_counts") or {}).items():
+            counts[f"{weekday}_{int(hour)}"] += count
+    return counts
+
+
+class ModelStats:
+    """Totals of one event type and model over a set of AI-event rollups"""
+
+    def __init__(self):
+        self.count = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.latency_ms_sum = 0.0
+        self.latency_ms_min: Optional[float] = None
+        self.latency_ms_max: Optional[float] = None
+        self.latencies = _sketch()
+
+    def add(self, stats: Dict[str, Any]):
+        self.count += stats.get("count", 0)
+        self.input_tokens += stats.get("input_tokens", 0)
+        self.output_tokens += stats.get("output_tokens", 0)
+        self.cost_usd += stats.get("cost_usd", 0.0)
+        self.latency_ms_sum += stats.get("latency_ms_sum", 0.0)
+        self.latencies.merge_bins(stats.get("latency_sketch") or {})
+        low, high = stats.get("latency_ms_min"), stats.get("latency_ms_max")
+        if low is not None:
+            self.latency_ms_min = low if self.latency_ms_min is None else min(self.latency_ms_min, low)
+        if high is not None:
+            self.latency_ms_max = high if self.latency_ms_max is None else max(self.latency_ms_max, high)
+
+    @property
+    def latency_ms_avg(self) -> float:
+        return self.latency_ms_sum / self.count if self.count else 0.0
+
+    def merge(self, other: "ModelStats"):
+        self.add({
+            "count": other.count,
+            "input_tokens": other.input_tokens,
+            "output_tokens": other.output_tokens,
+            "cost_usd": other.cost_usd,
+            "latency_ms_sum": other.latency_ms_sum,
+            "latency_ms_min": other.latency_ms_min,
+            "latency_ms_max": other.latency_ms_max,
+            "latency_sketch": other.latencies.bins,
+        })
+
+
+def ai_model_stats(rollups: Iterable[Dict[str, Any]], event_type: str) -> Dict[str, ModelStats]:
+    """Stats per "<provider>:<model>" of one event type"""
+    models: Dict[str, ModelStats] = defaultdict(ModelStats)
+    for rollup in rollups:
+        for model_key, stats in ((rollup.get("event_types") or {}).get(event_type) or {}).items():
+            models[model_key].add(stats)
+    return dict(models)
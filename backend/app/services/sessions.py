@@ -0,0 +1,297 @@
+"""
+Incremental sessionization of page visits
+
+A session is a run of one user's visits where each visit starts at most
+SESSION_TIMEOUT_SECONDS after the user's last activity (the latest visit
+start or end seen so far); an explicit session end (SESSION_END_PATH visit)
+closes it. Each user has a head document pointing at their open session, read
+and rewritten in the transaction assigning a visit to it, so concurrent visits of
+one user land in the same session. Session documents are only written with
+Increment/Maximum/Minimum transforms (see rollups), never read back.
+
+The sessionizer also maintains the daily page-flow rollups: a visit following
+the latest one of its session counts a transition from that page to its own,
+and a session counts its entry and exit pages once it is closed (explicit end,
+next visit of the user after the timeout, or close_expired()). Visits
+delivered out of order count no transition.
+
+Each session also keeps its page sequence, the pages it went through in
+order (consecutive repeats collapsed, at most MAX_SEQUENCE_PAGES), encoded as
+one string: funnels (see funnels) scan these strings instead of the visits.
+The head holds the sequence of the open session; the session document gets
+a copy each time it grows.
+
+Session document fields (sessions/{session_id}):
+    session_id, user_id
+    start_time                      UTC start of the first visit (range queries)
+    start_ts, end_ts                epoch seconds of the first visit start and of the
+                                    latest activity (duration = end_ts - start_ts)
+    page_count                      visits of the session (end markers excluded)
+    entry_page, exit_page           first and latest visited pages
+    page_sequence                   encoded page sequence (see encode_pages)
+    ended                           closed by an explicit session end
+
+Head document fields (session_heads/{user_id}):
+    session_id, start_ts, last_activity_ts, last_visit_ts
+    entry_page, last_page           first and latest visited pages of the open session
+    page_sequence                   encoded page sequence of the open session
+    active_week                     latest week recorded in the user's activity (see retention)
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.services import rollups
+
+SESSIONS_COLLECTION = "sessions"
+SESSION_HEADS_COLLECTION = "session_heads"
+
+SESSION_TIMEOUT_SECONDS = 30 * 60
+
+# Page path of the visits logged by an explicit session end (logout)
+SESSION_END_PATH = "/_session_end"
+
+# Page sequences: pages separated by PAGE_SEPARATOR (never part of a path), later pages dropped past the limit
+PAGE_SEPARATOR = "\n"
+MAX_SEQUENCE_PAGES = 100
+
+
+def session_id_for(user_id: str, start: datetime) -> str:
+    """Id of the session a user starts at start (deterministic, so rebuilds reproduce it)"""
+    return f"{user_id}_{rollups.to_utc(start).strftime('%Y%m%d%H%M%S')}"
+
+
+def encode_pages(pages: Iterable[str]) -> str:
+    """Page sequence string of some pages, consecutive repeats collapsed"""
+    sequence: List[str] = []
+    for page in pages:
+        if not sequence or sequence[-1] != page:
+            sequence.append(page)
+    return PAGE_SEPARATOR.join(sequence[:MAX_SEQUENCE_PAGES])
+
+
+def decode_pages(sequence: Optional[str]) -> List[str]:
+    """Pages of a page sequence string"""
+    return sequence.split(PAGE_SEPARATOR) if sequence else []
+
+
+def _appended(sequence: Optional[str], page_path: str) -> Optional[str]:
+    """sequence followed by page_path, None if unchanged (or unknown: heads written before sequences were kept)"""
+    if sequence is None:
+        return None
+    pages = decode_pages(sequence)
+    if len(pages) >= MAX_SEQUENCE_PAGES or (pages and pages[-1] == page_path):
+        return None
+    return encode_pages(pages + [page_path])
+
+
+def _prepended(sequence: Optional[str], page_path: str) -> Optional[str]:
+    """page_path followed by sequence, None if unchanged"""
+    if sequence is None:
+        return None
+    updated = encode_pages([page_path] + decode_pages(sequence))
+    return updated if updated != sequence else None
+
+
+def duration_seconds(session: Dict[str, Any]) -> float:
+    """Duration of a session document, 0 for single-instant sessions"""
+    return max(0.0, (session.get("end_ts") or 0.0) - (session.get("start_ts") or 0.0))
+
+
+def is_active(session: Dict[str, Any], now: datetime) -> bool:
+    """Whether a session can still be extended by the user's next visit"""
+    if session.get("ended"):
+        return False
+    return rollups.to_utc(now).timestamp() - (session.get("end_ts") or 0.0) <= SESSION_TIMEOUT_SECONDS
+
+
+class Assignment:
+    """
+    Outcome of assigning a visit to a session
+
+    session_id is None for end markers without an open session; head is the
+    user's new head document, None to delete it; deltas hold the session
+    document and page-flow rollup changes (merge them with
+    rollups.merge_deltas, write them with rollups.as_increments).
+    """
+
+    def __init__(self, session_id: Optional[str], head: Optional[Dict[str, Any]], deltas: rollups.RollupDeltas):
+        self.session_id = session_id
+        self.head = head
+        self.deltas = deltas
+
+
+def _open_head(head: Optional[Dict[str, Any]], ts: float) -> Optional[Dict[str, Any]]:
+    """head if the user has an open session that a visit starting at ts joins"""
+    if not head or not head.get("session_id"):
+        return None
+    if ts - head["last_activity_ts"] > SESSION_TIMEOUT_SECONDS:
+        return None
+    return head
+
+
+def _close_deltas(head: Dict[str, Any]) -> rollups.RollupDeltas:
+    """Page-flow deltas of closing a head's session (none for heads written before entry and exit pages were kept)"""
+    if not head.get("entry_page") or not head.get("last_page"):
+        return {}
+    start = datetime.fromtimestamp(head["start_ts"], tz=timezone.utc)
+    return rollups.session_close_deltas(start, head["entry_page"], head["last_page"])
+
+
+def close_expired(head: Dict[str, Any], now: datetime) -> Optional[rollups.RollupDeltas]:
+    """Page-flow deltas of closing a head's session if it has timed out at now, None if it is still open"""
+    if rollups.to_utc(now).timestamp() - head.get("last_activity_ts", 0.0) <= SESSION_TIMEOUT_SECONDS:
+        return None
+    return _close_deltas(head) if head.get("session_id") else {}
+
+
+def assign_visit(
+    head: Optional[Dict[str, Any]],
+    user_id: str,
+    page_path: Optional[str],
+    start_time: datetime,
+    end_time: Optional[datetime] = None,
+) -> Assignment:
+    """
+    Session of a new visit, given the user's current head document (None if they have none)
+
+    A visit older than the open session by more than the timeout (delivered
+    late) gets a session of its own, closed at once, and leaves the head
+    untouched.
+    """
+    page_path = page_path or "unknown"
+    start = rollups.to_utc(start_time)
+    ts = start.timestamp()
+    end_ts = max(ts, rollups.to_utc(end_time).timestamp()) if end_time else ts
+    current = _open_head(head, ts)
+
+    if page_path == SESSION_END_PATH:
+        if current is None:
+            return Assignment(None, head, {})
+        deltas = {(SESSIONS_COLLECTION, current["session_id"]): {"end_ts": rollups.maximum(end_ts), "ended": True}}
+        rollups.merge_deltas(deltas, _close_deltas(current))
+        return Assignment(current["session_id"], None, deltas)
+
+    if current is not None and ts < current["start_ts"] - SESSION_TIMEOUT_SECONDS:
+        session_id = session_id_for(user_id, start)
+        deltas = {(SESSIONS_COLLECTION, session_id): _new_session(session_id, user_id, page_path, start, end_ts)}
+        rollups.merge_deltas(deltas, rollups.session_close_deltas(start, page_path, page_path))
+        return Assignment(session_id, head, deltas)
+
+    if current is None:
+        session_id = session_id_for(user_id, start)
+        new_head = {
+            "session_id": session_id, "start_ts": ts, "last_activity_ts": end_ts, "last_visit_ts": ts,
+            "entry_page": page_path, "last_page": page_path, "page_sequence": page_path,
+        }
+        deltas = {(SESSIONS_COLLECTION, session_id): _new_session(session_id, user_id, page_path, start, end_ts)}
+        if head and head.get("session_id"):
+            # The user's previous session timed out: it closes now
+            rollups.merge_deltas(deltas, _close_deltas(head))
+        return Assignment(session_id, new_head, deltas)
+
+    session_id = current["session_id"]
+    delta: Dict[str, Any] = {"end_ts": rollups.maximum(end_ts), "page_count": 1}
+    deltas = {(SESSIONS_COLLECTION, session_id): delta}
+    new_head = dict(current)
+    new_head["last_activity_ts"] = max(current["last_activity_ts"], end_ts)
+    if ts >= current["last_visit_ts"]:
+        delta["exit_page"] = page_path
+        new_head["last_visit_ts"] = ts
+        new_head["last_page"] = page_path
+        if current.get("last_page"):
+            rollups.merge_deltas(deltas, rollups.transition_deltas(start, current["last_page"], page_path))
+        sequence = _appended(current.get("page_sequence"), page_path)
+    elif ts < current["start_ts"]:
+        delta.update({"start_time": start, "start_ts": rollups.minimum(ts), "entry_page": page_path})
+        new_head["start_ts"] = ts
+        new_head["entry_page"] = page_path
+        sequence = _prepended(current.get("page_sequence"), page_path)
+    else:
+        sequence = None
+    if sequence is not None:
+        delta["page_sequence"] = sequence
+        new_head["page_sequence"] = sequence
+    return Assignment(session_id, new_head, deltas)
+
+
+def _new_session(session_id: str, user_id: str, page_path: str, start: datetime, end_ts: float) -> Dict[str, Any]:
+    return {
+        "session_id": session_id,
+        "user_id": user_id,
+        "start_time": start,
+        "start_ts": rollups.minimum(start.timestamp()),
+        "end_ts": rollups.maximum(end_ts),
+        "page_count": 1,
+        "entry_page": page_path,
+        "exit_page": page_path,
+        "page_sequence": page_path,
+    }
+
+
+def visit_end_deltas(session_id: Optional[str], user_id: str, end_time: datetime, head_exists: bool) -> rollups.RollupDeltas:
+    """
+    Session and head changes of a visit ending at end_time
+
+    The head's last activity is raised even if the user has moved on to a
+    newer session since: they were active then either way. A head that does
+    not exist (closed, or deleted) is left alone: a merge would recreate it
+    with only last_activity_ts. Read it in the same transaction.
+    """
+    if not session_id:
+        return {}
+    end_ts = rollups.to_utc(end_time).timestamp()
+    deltas: rollups.RollupDeltas = {(SESSIONS_COLLECTION, session_id): {"end_ts": rollups.maximum(end_ts)}}
+    if head_exists:
+        deltas[(SESSION_HEADS_COLLECTION, user_id)] = {"last_activity_ts": rollups.maximum(end_ts)}
+    return deltas
+
+
+def sessionize(
+    visits: Iterable[Tuple[str, Dict[str, Any]]],
+    now: Optional[datetime] = None,
+) -> Tuple[Dict[str, str], rollups.RollupDeltas, Dict[str, Optional[Dict[str, Any]]]]:
+    """
+    Replay (visit_id, visit) pairs through the sessionizer, as if each visit start
+    and real end had been logged in time order
+
+    Returns the session id of each visit, the session document and page-flow
+    rollup deltas and the final head of each user. With now, the sessions
+    timed out by then are closed as close_expired() closes them (their heads
+    become None). Ends set by close_inactive_page_visits (auto_closed) are
+    not activity and are skipped, as they are when written.
+    """
+    events: Dict[str, List[Tuple[float, int, str, Dict[str, Any]]]] = {}
+    for visit_id, visit in visits:
+        user_id = visit.get("user_id")
+        start = rollups.to_utc(visit.get("start_time"))
+        if not user_id or start is None:
+            continue
+        events.setdefault(user_id, []).append((start.timestamp(), 0, visit_id, visit))
+        end = rollups.to_utc(visit.get("end_time"))
+        if end is not None and not visit.get("auto_closed"):
+            events[user_id].append((max(end.timestamp(), start.timestamp()), 1, visit_id, visit))
+
+    visit_sessions: Dict[str, str] = {}
+    deltas: rollups.RollupDeltas = {}
+    heads: Dict[str, Optional[Dict[str, Any]]] = {}
+    for user_id, user_events in events.items():
+        head = None
+        # Starts before ends at the same instant, ties broken by visit id for stable output
+        for ts, kind, visit_id, visit in sorted(user_events, key=lambda event: event[:3]):
+            if kind == 0:
+                assignment = assign_visit(head, user_id, visit.get("page_path"), visit["start_time"])
+                head = assignment.head
+                rollups.merge_deltas(deltas, assignment.deltas)
+                if assignment.session_id:
+                    visit_sessions[visit_id] = assignment.session_id
+            elif visit_id in visit_sessions:
+                session_id = visit_sessions[visit_id]
+                rollups.merge_deltas(deltas, {(SESSIONS_COLLECTION, session_id): {"end_ts": rollups.maximum(ts)}})
+                if head:
+                    head["last_activity_ts"] = max(head["last_activity_ts"], ts)
+        if head and now is not None:
+            closing = close_expired(head, now)
+            if closing is not None:
+                rollups.merge_deltas(deltas, closing)
+                head = None
+        heads[user_id] = head
+    return visit_sessions, deltas, heads
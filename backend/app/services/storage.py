@@ -5,6 +5,9 @@ import os
 import uuid
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.executors import offload, GCS
+from app.core.metrics import gcs_operation_duration
+from app.core.usage import record_gcs_operation
 import firebase_admin
 from google.oauth2 import service_account
 from google.cloud.exceptions import NotFound, Forbidden
@@ -53,7 +56,12 @@ def get_storage_client():
 
 
 class StorageService:
-    """Service for managing files in Google Cloud Storage"""
+    """
+    Service for managing files in Google Cloud Storage
+    
+    The GCS client is blocking, so every method that talks to GCS runs in the
+    dedicated GCS pool and is awaited by callers.
+    """
     
     @staticmethod
     def get_bucket():
@@ -78,6 +86,8 @@ class StorageService:
             raise ValueError(error_msg)
     
     @staticmethod
+    @offload(GCS)
+    @gcs_operation_duration.timed(operation="upload_file")
     def upload_file(file_content: bytes, filename: str, content_type: str = "text/plain") -> Dict[str, Any]:
         """
         Upload a file to GCS with unique filename to prevent overwrites (for AI documents)
@@ -106,6 +116,7 @@ class StorageService:
             unique_filename = f"{timestamp}_{unique_id}_{base_name}{extension}"
             
             blob = bucket.blob(f"ai-documents/{unique_filename}")
+            record_gcs_operation()
             blob.upload_from_string(file_content, content_type=content_type)
             
             return {
@@ -128,6 +139,8 @@ class StorageService:
             raise
     
     @staticmethod
+    @offload(GCS)
+    @gcs_operation_duration.timed(operation="upload_poi_file")
     def upload_poi_file(file_content: bytes, filename: str, content_type: str) -> str:
         """
         Upload a POI file (photo or audio) to GCS and return public URL
@@ -151,6 +164,7 @@ class StorageService:
             unique_filename = f"{timestamp}_{unique_id}_{base_name}{extension}"
             
             blob = bucket.blob(f"poi-files/{unique_filename}")
+            record_gcs_operation()
             blob.upload_from_string(file_content, content_type=content_type)
             
             # For buckets with uniform bucket-level access, we can't use make_public()
@@ -181,6 +195,8 @@ class StorageService:
             raise
     
     @staticmethod
+    @offload(GCS)
+    @gcs_operation_duration.timed(operation="get_signed_url_for_blob")
     def get_signed_url_for_blob(blob_path: str) -> Optional[str]:
         """
         Get a signed URL for an existing blob in GCS
@@ -195,6 +211,7 @@ class StorageService:
             bucket = StorageService.get_bucket()
             blob = bucket.blob(blob_path)
             
+            record_gcs_operation()
             if not blob.exists():
                 logger.warning(f"Blob does not exist: {blob_path}")
                 return None
@@ -211,7 +228,7 @@ class StorageService:
             return None
     
     @staticmethod
-    def convert_public_url_to_signed(public_url: str) -> Optional[str]:
+    async def convert_public_url_to_signed(public_url: str) -> Optional[str]:
         """
         Convert a public GCS URL to a signed URL
         
@@ -244,16 +261,19 @@ class StorageService:
                 logger.warning(f"URL bucket ({bucket_name}) doesn't match configured bucket ({settings.GCS_BUCKET_NAME})")
                 return None
             
-            return StorageService.get_signed_url_for_blob(blob_path)
+            return await StorageService.get_signed_url_for_blob(blob_path)
         except Exception as e:
             logger.error(f"Error converting public URL to signed URL: {str(e)}")
             return None
     
     @staticmethod
+    @offload(GCS)
+    @gcs_operation_duration.timed(operation="list_files")
     def list_files() -> List[Dict[str, Any]]:
         """List all files in the ai-documents folder"""
         try:
             bucket = StorageService.get_bucket()
+            record_gcs_operation()
             blobs = bucket.list_blobs(prefix="ai-documents/")
             
             files = []
@@ -294,6 +314,8 @@ class StorageService:
             raise
     
     @staticmethod
+    @offload(GCS)
+    @gcs_operation_duration.timed(operation="get_file")
     def get_file(filename: str) -> Optional[Dict[str, Any]]:
         """
         Get file content and metadata
@@ -308,10 +330,12 @@ class StorageService:
             bucket = StorageService.get_bucket()
             blob = bucket.blob(f"ai-documents/{filename}")
             
+            record_gcs_operation()
             if not blob.exists():
                 logger.warning(f"File not found: {filename}")
                 return None
             
+            record_gcs_operation()
             content = blob.download_as_text()
             
             # Extract original filename from unique filename if possible
@@ -344,6 +368,8 @@ class StorageService:
             raise
     
     @staticmethod
+    @offload(GCS)
+    @gcs_operation_duration.timed(operation="delete_file")
     def delete_file(filename: str) -> bool:
         """
         Delete a file from GCS
@@ -357,14 +383,16 @@ class StorageService:
         bucket = StorageService.get_bucket()
         blob = bucket.blob(f"ai-documents/{filename}")
         
+        record_gcs_operation()
         if not blob.exists():
             return False
         
+        record_gcs_operation()
         blob.delete()
         return True
     
     @staticmethod
-    def replace_file(file_content: bytes, filename: str, content_type: str = "text/plain") -> Dict[str, Any]:
+    async def replace_file(file_content: bytes, filename: str, content_type: str = "text/plain") -> Dict[str, Any]:
         """
         Replace an existing file in GCS
         
@@ -377,8 +405,8 @@ class StorageService:
             Dict with file metadata
         """
         # Delete old file if exists
-        StorageService.delete_file(filename)
+        await StorageService.delete_file(filename)
         
         # Upload new file
-        return StorageService.upload_file(file_content, filename, content_type)
+        return await StorageService.upload_file(file_content, filename, content_type)
 
@@ -0,0 +1,62 @@
+"""
+Columnar in-memory page-visit table
+
+Holds a set of visits as NumPy columns: string fields dictionary-encoded as
+int32 codes into a list of categories (-1 when missing or empty). Distinct
+counts then run as unique/bincount over integer arrays instead of Python
+loops over dicts. Device, browser, OS and channel are the values stored at
+ingest (see enrichment), not re-derived here.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+
+def _encode(values: Iterable[Any]) -> Tuple[np.ndarray, List[str]]:
+    """Dictionary-encode values (falsy ones become -1)"""
+    index: Dict[str, int] = {}
+    codes = []
+    for value in values:
+        if not value:
+            codes.append(-1)
+            continue
+        value = value if isinstance(value, str) else str(value)
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(index)
+        codes.append(code)
+    return np.array(codes, dtype=np.int32), list(index)
+
+
+class VisitTable:
+    """Page visits as columns; categorical columns are (codes, categories) pairs"""
+
+    def __init__(self, visits: List[Dict[str, Any]]):
+        self._columns: Dict[str, Tuple[np.ndarray, List[str]]] = {}
+        for name, values in (
+            ("page_path", (visit.get("page_path") for visit in visits)),
+            ("session_id", (visit.get("analytics_session_id") or visit.get("session_id") for visit in visits)),
+            ("device_type", (visit.get("device_type") for visit in visits)),
+            ("browser", (visit.get("browser") for visit in visits)),
+            ("os", (visit.get("os") for visit in visits)),
+            ("channel", (visit.get("channel") for visit in visits)),
+        ):
+            self._columns[name] = _encode(values)
+
+    def isin(self, column: str, values: Iterable[str]) -> np.ndarray:
+        """Mask of the visits whose column is one of values"""
+        codes, categories = self._columns[column]
+        values = set(values)
+        wanted = [code for code, category in enumerate(categories) if category in values]
+        return np.isin(codes, wanted)
+
+    def distinct_counts(self, key: str, column: str, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """Distinct key values (e.g. sessions) per category of column"""
+        key_codes = self._columns[key][0]
+        codes, categories = self._columns[column]
+        keep = (key_codes >= 0) & (codes >= 0)
+        if mask is not None:
+            keep &= mask
+        width = max(len(categories), 1)
+        pairs = np.unique(key_codes[keep].astype(np.int64) * width + codes[keep])
+        totals = np.bincount(pairs % width, minlength=len(categories))
+        return {categories[code]: int(total) for code, total in enumerate(totals) if total}
@@ -0,0 +1,37 @@
+import base64
+from typing import Optional
+from fastapi import Response
+from app.core.config import settings
+
+# Response header carrying the token of the next page (absent on the last page)
+NEXT_PAGE_TOKEN_HEADER = "X-Next-Page-Token"
+
+
+def encode_page_token(doc_id: str) -> str:
+    """Opaque page token pointing after the given document"""
+    return base64.urlsafe_b64encode(doc_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_token(page_token: str) -> str:
+    """Document id of a page token, raises ValueError if the token is malformed"""
+    try:
+        padded = page_token + "=" * (-len(page_token) % 4)
+        doc_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+    except Exception:
+        raise ValueError("Invalid page token")
+    if not doc_id or "/" in doc_id:
+        raise ValueError("Invalid page token")
+    return doc_id
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    """Page size bounded by MAX_PAGE_SIZE (DEFAULT_PAGE_SIZE if not given)"""
+    if not limit or limit < 1:
+        return settings.DEFAULT_PAGE_SIZE
+    return min(limit, settings.MAX_PAGE_SIZE)
+
+
+def set_next_page_token(response: Response, next_page_token: Optional[str]):
+    """Expose the next page token to the client"""
+    if next_page_token:
+        response.headers[NEXT_PAGE_TOKEN_HEADER] = next_page_token
@@ -0,0 +1,70 @@
+import math
+from typing import Dict, Mapping, Optional
+
+
+class DDSketch:
+    """
+    DDSketch quantile sketch with relative accuracy guarantees
+
+    Positive values are counted in logarithmic bins (bin k holds values in
+    (gamma**(k-1), gamma**k]), so any quantile is returned within
+    relative_accuracy of the true value, e.g. 1% by default. Values at or
+    below zero share one bin. Bin counts only ever add up, so sketches merge by
+    summing bins and stored bins can be maintained with Increment transforms.
+
+    Bins are keyed by their index as a string (document map keys); sketches
+    only merge with sketches of the same relative accuracy.
+    """
+
+    ZERO_BIN = "zero"
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("DDSketch relative accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[str, int] = {}
+        self.count = 0
+
+    def bin_key(self, value: float) -> str:
+        """Key of the bin counting value"""
+        if value <= 0:
+            return self.ZERO_BIN
+        return str(math.ceil(math.log(value) / self._log_gamma))
+
+    def add(self, value: float, count: int = 1):
+        key = self.bin_key(value)
+        self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge DDSketches of different relative accuracies")
+        self.merge_bins(other.bins)
+
+    def merge_bins(self, bins: Mapping[str, int]):
+        """Fold stored bins ({"<index>" or "zero": count}) into this sketch"""
+        for key, count in bins.items():
+            if count:
+                self.bins[key] = self.bins.get(key, 0) + count
+                self.count += count
+
+    def _value(self, key: str) -> float:
+        if key == self.ZERO_BIN:
+            return 0.0
+        # Midpoint (relative to the accuracy) of the bin's range
+        return 2 * self.gamma ** int(key) / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value of rank int(q * count) (0-based, as sorted(values)[int(q * n)]), None if the sketch is empty"""
+        if self.count <= 0:
+            return None
+        rank = min(int(q * self.count), self.count - 1)
+        seen = 0
+        keys = sorted(self.bins, key=lambda key: -math.inf if key == self.ZERO_BIN else int(key))
+        for key in keys:
+            seen += self.bins[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(keys[-1])
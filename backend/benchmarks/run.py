@@ -0,0 +1,246 @@
+"""
+API benchmark on the in-memory Firestore backend
+
+Seeds a synthetic dataset, replays the scenarios of benchmarks/scenarios.py
+with concurrent clients through the ASGI app (no network, no GCP project) and
+reports latency percentiles, throughput and datastore operations per request.
+
+Usage (from backend/):
+    python -m benchmarks.run [--users 1000] [--page-visits 50000] [--requests 100]
+                             [--concurrency 10] [--scenario analytics]
+                             [--output results.json] [--compare previous.json]
+"""
+import os
+
+# Must be set before the app (and its settings) are imported
+os.environ["FIRESTORE_BACKEND"] = "memory"
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import subprocess
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import Request
+
+from app.core.security import get_current_user
+from app.main import app
+from app.services.firestore import get_async_db
+from app.services.memory_store import MemoryClient
+from benchmarks.scenarios import SCENARIOS, BenchRequest, Scenario
+from benchmarks.seed import Dataset, SeedConfig, seed_memory_store
+
+BENCH_UID_HEADER = "X-Bench-Uid"
+BENCH_ROLE_HEADER = "X-Bench-Role"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+async def _bench_user(request: Request) -> Dict[str, Any]:
+    """Replaces Firebase token verification: the user comes from request headers"""
+    uid = request.headers[BENCH_UID_HEADER]
+    return {
+        "uid": uid,
+        "email": f"{uid}@example.com",
+        "name": None,
+        "picture": None,
+        "role": request.headers.get(BENCH_ROLE_HEADER),
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    db: MemoryClient,
+    scenario: Scenario,
+    dataset: Dataset,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    seed: int,
+) -> Dict[str, Any]:
+    rng = random.Random(f"{seed}-{scenario.name}")
+
+    async def send(bench_request: BenchRequest) -> httpx.Response:
+        headers = {BENCH_UID_HEADER: bench_request.uid}
+        if bench_request.role:
+            headers[BENCH_ROLE_HEADER] = bench_request.role
+        return await client.request(bench_request.method, bench_request.path, json=bench_request.json, headers=headers)
+
+    for _ in range(warmup):
+        await send(scenario.build(rng, dataset))
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            bench_request = scenario.build(rng, dataset)
+            start = time.perf_counter()
+            response = await send(bench_request)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] += 1
+
+    db.reset_stats()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - started
+    operations = db.stats()
+
+    latencies.sort()
+    errors = sum(count for status_code, count in statuses.items() if status_code >= 400)
+    return {
+        "router": scenario.router,
+        "requests": requests,
+        "errors": errors,
+        "status_codes": {str(status_code): count for status_code, count in sorted(statuses.items())},
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed > 0 else 0.0,
+        "reads_per_request": round(operations["reads"] / requests, 2) if requests else 0.0,
+        "writes_per_request": round(operations["writes"] / requests, 2) if requests else 0.0,
+        "queries_per_request": round(operations["queries"] / requests, 2) if requests else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    header = f"{'scenario':34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'reads/req':>10} {'errors':>7}"
+    if baseline:
+        header += f" {'p50 vs base':>12} {'reads vs base':>14}"
+    print(header)
+    base_scenarios = (baseline or {}).get("scenarios", {})
+    for name, result in results["scenarios"].items():
+        line = (
+            f"{name:34} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['p99_ms']:9.2f} "
+            f"{result['throughput_rps']:9.1f} {result['reads_per_request']:10.1f} {result['errors']:7d}"
+        )
+        base = base_scenarios.get(name)
+        if baseline and base:
+            line += f" {_delta(result['p50_ms'], base['p50_ms']):>12} {_delta(result['reads_per_request'], base['reads_per_request']):>14}"
+        print(line)
+
+
+def _delta(value: float, base: float) -> str:
+    if not base:
+        return "n/a"
+    return f"{(value - base) / base * 100:+.1f}%"
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    db = get_async_db()
+    if not isinstance(db, MemoryClient):
+        raise RuntimeError("The benchmark needs FIRESTORE_BACKEND=memory")
+
+    config = SeedConfig(
+        users=args.users,
+        page_visits=args.page_visits,
+        conversations=args.conversations,
+        ai_events=args.ai_events,
+        quiz_submissions=args.quiz_submissions,
+        pois=args.pois,
+        seed=args.seed,
+    )
+    seed_started = time.perf_counter()
+    dataset = seed_memory_store(db, config)
+    seed_seconds = time.perf_counter() - seed_started
+    print(f"Seeded {sum(dataset.counts.values())} documents in {seed_seconds:.1f}s: {dataset.counts}")
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenario or any(pattern in scenario.name for pattern in args.scenario)]
+    # Read-only scenarios first so writes do not change what they measure
+    scenarios.sort(key=lambda scenario: scenario.writes)
+
+    app.dependency_overrides[get_current_user] = _bench_user
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "requests_per_scenario": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "seed_config": config.to_dict(),
+            "documents": dataset.counts,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "scenarios": {},
+    }
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for scenario in scenarios:
+                result = await run_scenario(
+                    client, db, scenario, dataset,
+                    requests=args.requests,
+                    concurrency=args.concurrency,
+                    warmup=args.warmup,
+                    seed=args.seed,
+                )
+                results["scenarios"][scenario.name] = result
+                print(f"{scenario.name}: p50={result['p50_ms']}ms p95={result['p95_ms']}ms reads/req={result['reads_per_request']} errors={result['errors']}")
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API on a synthetic in-memory dataset")
+    defaults = SeedConfig()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--page-visits", type=int, default=defaults.page_visits)
+    parser.add_argument("--conversations", type=int, default=defaults.conversations)
+    parser.add_argument("--ai-events", type=int, default=defaults.ai_events)
+    parser.add_argument("--quiz-submissions", type=int, default=defaults.quiz_submissions)
+    parser.add_argument("--pois", type=int, default=defaults.pois)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per scenario")
+    parser.add_argument("--scenario", action="append", help="Only run scenarios whose name contains this (repeatable)")
+    parser.add_argument("--output", type=Path, help="Result file (default: benchmarks/results/<date>-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="Previous result file to compare with")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    results = asyncio.run(main_async(args))
+
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{results['meta']['commit'] or 'nogit'}.json"
+    output.write_text(json.dumps(results, indent=2))
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print()
+    print_report(results, baseline)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
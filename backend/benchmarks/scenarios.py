@@ -0,0 +1,124 @@
+"""
+Requests replayed by the benchmark, at least one per router of app/main.py
+
+Routes that call external services (LLM providers, GCS uploads/downloads)
+are left out: their latency would measure the provider, not the app.
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.seed import Dataset
+
+API = "/api/v1"
+
+
+@dataclass
+class BenchRequest:
+    method: str
+    path: str
+    uid: str
+    role: Optional[str] = None
+    json: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class Scenario:
+    name: str
+    router: str
+    build: Callable[[random.Random, Dataset], BenchRequest]
+    # Scenarios that write are run after the read-only ones
+    writes: bool = False
+
+
+def _admin_get(path: str) -> Callable[[random.Random, Dataset], BenchRequest]:
+    return lambda rng, data: BenchRequest("GET", API + path, data.admin_uid, role="admin")
+
+
+def _user_get(path: str) -> Callable[[random.Random, Dataset], BenchRequest]:
+    return lambda rng, data: BenchRequest("GET", API + path, rng.choice(data.user_ids))
+
+
+def _conversation_detail(rng: random.Random, data: Dataset) -> BenchRequest:
+    conversation_id, owner = rng.choice(data.conversations)
+    return BenchRequest("GET", f"{API}/ai/conversations/{conversation_id}", owner)
+
+
+def _user_conversations(rng: random.Random, data: Dataset) -> BenchRequest:
+    _, owner = rng.choice(data.conversations)
+    return BenchRequest("GET", f"{API}/ai/conversations", owner)
+
+
+def _page_visit(rng: random.Random, data: Dataset) -> BenchRequest:
+    return BenchRequest("POST", f"{API}/auth/page-visit", rng.choice(data.user_ids), json={
+        "page_path": rng.choice(["/", "/map", "/ai", "/quiz"]),
+        "start_time": datetime.utcnow().isoformat() + "Z",
+        "metadata": {"session_id": f"bench-session-{rng.randrange(1000)}"},
+    })
+
+
+def _analytics_event(rng: random.Random, data: Dataset) -> BenchRequest:
+    return BenchRequest("POST", f"{API}/auth/analytics-event", rng.choice(data.user_ids), json={
+        "event_type": rng.choice(["login", "session_end"]),
+        "metadata": {"session_id": f"bench-session-{rng.randrange(1000)}"},
+    })
+
+
+def _create_conversation(rng: random.Random, data: Dataset) -> BenchRequest:
+    return BenchRequest("POST", f"{API}/ai/conversations", rng.choice(data.user_ids), json={"title": "Benchmark"})
+
+
+def _route(rng: random.Random, data: Dataset) -> BenchRequest:
+    return BenchRequest("POST", f"{API}/route", rng.choice(data.user_ids), json={
+        "from_lat": 36.8 + rng.uniform(-0.05, 0.05),
+        "from_lng": 10.18 + rng.uniform(-0.05, 0.05),
+        "to_lat": 36.8 + rng.uniform(-0.05, 0.05),
+        "to_lng": 10.18 + rng.uniform(-0.05, 0.05),
+    })
+
+
+SCENARIOS: List[Scenario] = [
+    # auth
+    Scenario("auth.me", "auth", _user_get("/auth/me")),
+    Scenario("auth.profile", "auth", _user_get("/auth/profile")),
+    Scenario("auth.users", "auth", _admin_get("/auth/users")),
+    Scenario("auth.page_visit", "auth", _page_visit, writes=True),
+    Scenario("auth.analytics_event", "auth", _analytics_event, writes=True),
+    # ai
+    Scenario("ai.config", "ai", _admin_get("/ai/config")),
+    Scenario("ai.conversations", "ai", _user_conversations),
+    Scenario("ai.conversation_detail", "ai", _conversation_detail),
+    Scenario("ai.create_conversation", "ai", _create_conversation, writes=True),
+    # monitoring
+    Scenario("monitoring.users", "monitoring", _admin_get("/monitoring/stats/users")),
+    Scenario("monitoring.connections", "monitoring", _admin_get("/monitoring/stats/connections")),
+    Scenario("monitoring.sessions", "monitoring", _admin_get("/monitoring/stats/sessions")),
+    Scenario("monitoring.conversations", "monitoring", _admin_get("/monitoring/stats/conversations")),
+    Scenario("monitoring.caches", "monitoring", _admin_get("/monitoring/stats/caches")),
+    # analytics
+    Scenario("analytics.overview", "analytics", _admin_get("/analytics/overview")),
+    Scenario("analytics.traffic", "analytics", _admin_get("/analytics/traffic")),
+    Scenario("analytics.engagement", "analytics", _admin_get("/analytics/engagement")),
+    Scenario("analytics.acquisition", "analytics", _admin_get("/analytics/acquisition")),
+    Scenario("analytics.retention", "analytics", _admin_get("/analytics/retention")),
+    # ai_analytics
+    Scenario("ai_analytics.conversations", "ai_analytics", _admin_get("/ai-analytics/conversations")),
+    Scenario("ai_analytics.performance", "ai_analytics", _admin_get("/ai-analytics/performance")),
+    Scenario("ai_analytics.traces", "ai_analytics", _admin_get("/ai-analytics/traces")),
+    # poi
+    Scenario("poi.list", "poi", _user_get("/poi")),
+    Scenario("poi.detail", "poi", lambda rng, data: BenchRequest("GET", f"{API}/poi/{rng.choice(data.poi_ids)}", rng.choice(data.user_ids))),
+    # routing
+    Scenario("routing.route", "routing", _route),
+    # ads
+    Scenario("ads.list", "ads", _user_get("/ads")),
+    Scenario("ads.detail", "ads", lambda rng, data: BenchRequest("GET", f"{API}/ads/{rng.choice(data.ad_ids)}", rng.choice(data.user_ids))),
+    # quiz
+    Scenario("quiz.questions", "quiz", _admin_get("/quiz/questions")),
+    Scenario("quiz.active_questions", "quiz", _user_get("/quiz/questions/active")),
+    Scenario("quiz.eligibility", "quiz", _user_get("/quiz/check-eligibility")),
+    Scenario("quiz.submissions", "quiz", _admin_get("/quiz/submissions")),
+    Scenario("quiz.leaderboard", "quiz", _user_get("/quiz/leaderboard")),
+    Scenario("quiz.statistics", "quiz", _admin_get("/quiz/statistics")),
+]
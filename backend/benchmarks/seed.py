@@ -0,0 +1,329 @@
+"""
+Synthetic dataset for the benchmarks
+
+Generates documents shaped like the ones the app writes (users, profiles,
+page visits grouped in sessions, conversations, AI events, quiz questions and
+submissions, POIs, ads) and bulk-loads them in the in-memory store.
+Generation is deterministic for a given seed.
+"""
+import random
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from app.services import enrichment, retention, rollups, sessions
+from app.services.memory_store import MemoryClient
+
+PAGES = ["/", "/map", "/ai", "/quiz", "/profile", "/poi"]
+COUNTRIES = ["FR", "TN", "DE", "IT", "US", "GB", "ES", "DZ", "MA", "BE"]
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPad; CPU OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+]
+REFERRERS = ["unknown", "https://www.google.com/", "https://www.facebook.com/", "https://t.co/", "https://www.instagram.com/"]
+UTM = [None, None, None, ("newsletter", "email"), ("facebook", "cpc"), ("google", "cpc")]
+MODELS = [("openai", "gpt-4o-mini"), ("openai", "gpt-4o"), ("gemini", "gemini-2.0-flash-exp")]
+
+
+@dataclass
+class SeedConfig:
+    users: int = 1000
+    page_visits: int = 50000
+    conversations: int = 2000
+    messages_per_conversation: int = 10
+    ai_events: int = 10000
+    quiz_questions: int = 30
+    quiz_submissions: int = 5000
+    pois: int = 200
+    ads: int = 10
+    days: int = 30
+    seed: int = 42
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class Dataset:
+    """What was seeded: document counts and the ids scenarios pick from"""
+    counts: Dict[str, int] = field(default_factory=dict)
+    user_ids: List[str] = field(default_factory=list)
+    conversations: List[Tuple[str, str]] = field(default_factory=list)  # (conversation_id, owner uid)
+    poi_ids: List[str] = field(default_factory=list)
+    ad_ids: List[str] = field(default_factory=list)
+    question_ids: List[str] = field(default_factory=list)
+
+    @property
+    def admin_uid(self) -> str:
+        return self.user_ids[0]
+
+
+def _user_id(index: int) -> str:
+    return f"bench-user-{index:06d}"
+
+
+def seed_memory_store(client: MemoryClient, config: SeedConfig, now: datetime = None) -> Dataset:
+    """Load the synthetic dataset in the memory store"""
+    rng = random.Random(config.seed)
+    now = now or datetime.utcnow()
+    window = timedelta(days=config.days)
+
+    def random_time() -> datetime:
+        return now - timedelta(seconds=rng.uniform(0, window.total_seconds()))
+
+    user_ids = [_user_id(index) for index in range(config.users)]
+    dataset = Dataset(user_ids=user_ids)
+    counts = dataset.counts
+
+    users = []
+    profiles = []
+    for index, uid in enumerate(user_ids):
+        created_at = random_time()
+        # The first user is the admin the benchmarks authenticate as
+        users.append((uid, {"email": f"{uid}@example.com", "role": "admin" if index == 0 else "user", "created_at": created_at}))
+        profiles.append((uid, {
+            "user_id": uid,
+            "age": rng.randint(16, 80),
+            "sexe": rng.choice(["M", "F"]),
+            "metier": rng.choice(["etudiant", "cadre", "retraite", "artisan"]),
+            "raison_visite": rng.choice(["tourisme", "travail", "famille"]),
+            "nationalite": rng.choice(COUNTRIES),
+            "created_at": created_at,
+            "updated_at": created_at,
+        }))
+    counts["users"] = client.load_documents("users", users)
+    counts["profiles"] = client.load_documents("profiles", profiles)
+
+    visits = list(_page_visits(rng, config, user_ids, random_time))
+    visit_sessions, session_deltas, heads = sessions.sessionize(visits, now=now)
+    for visit_id, visit in visits:
+        visit["analytics_session_id"] = visit_sessions.get(visit_id)
+    counts["page_visits"] = client.load_documents("page_visits", visits)
+    session_documents: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    for (collection, doc_id), delta in session_deltas.items():
+        session_documents.setdefault(collection, []).append((doc_id, rollups.as_document(delta)))
+    for collection, documents in session_documents.items():
+        counts[collection] = client.load_documents(collection, documents)
+    counts[sessions.SESSION_HEADS_COLLECTION] = client.load_documents(
+        sessions.SESSION_HEADS_COLLECTION,
+        [(user_id, head) for user_id, head in heads.items() if head is not None],
+    )
+    for collection, documents in _visit_rollups(visits).items():
+        counts[collection] = client.load_documents(collection, documents)
+    activities, cohorts = retention.build(visit for _, visit in visits)
+    counts[retention.USER_ACTIVITY_COLLECTION] = client.load_documents(retention.USER_ACTIVITY_COLLECTION, list(activities.items()))
+    counts[retention.COHORT_COLLECTION] = client.load_documents(retention.COHORT_COLLECTION, list(cohorts.items()))
+
+    conversations = []
+    conversation_ids = []
+    for _ in range(config.conversations):
+        conversation_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        conversation_ids.append(conversation_id)
+        created_at = random_time()
+        messages = []
+        message_time = created_at
+        for position in range(rng.randint(1, max(1, 2 * config.messages_per_conversation - 1))):
+            message_time += timedelta(seconds=rng.randint(5, 120))
+            role = "user" if position % 2 == 0 else "assistant"
+            messages.append({"role": role, "content": f"{role} message {position} " + "lorem ipsum " * rng.randint(5, 60), "timestamp": message_time})
+        owner = rng.choice(user_ids)
+        dataset.conversations.append((conversation_id, owner))
+        conversations.append((conversation_id, {
+            "user_id": owner,
+            "title": messages[0]["content"][:50],
+            "title_preview": messages[0]["content"][:50],
+            "messages": messages,
+            "message_count": len(messages),
+            "created_at": created_at,
+            "updated_at": message_time,
+        }))
+    counts["conversations"] = client.load_documents("conversations", conversations)
+
+    ai_events = []
+    for _ in range(config.ai_events):
+        provider, model = rng.choice(MODELS)
+        timestamp = random_time()
+        failed = rng.random() < 0.02
+        input_tokens = rng.randint(200, 4000)
+        output_tokens = rng.randint(50, 800)
+        ai_events.append((str(uuid.UUID(int=rng.getrandbits(128))), {
+            "event_type": "ai_request",
+            "user_id": rng.choice(user_ids),
+            "conversation_id": rng.choice(conversation_ids) if conversation_ids else None,
+            "model": model,
+            "provider": provider,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cost_usd": (input_tokens * 0.00015 + output_tokens * 0.0006) / 1000,
+            "latency_ms": rng.lognormvariate(7, 0.5),
+            "status": "error" if failed else "success",
+            "error": "timeout" if failed else None,
+            "timestamp": timestamp,
+            "created_at": timestamp,
+        }))
+    counts["ai_events"] = client.load_documents("ai_events", ai_events)
+    ai_deltas: rollups.RollupDeltas = {}
+    for _, event in ai_events:
+        rollups.merge_deltas(ai_deltas, rollups.ai_event_deltas(event))
+    counts[rollups.AI_EVENT_ROLLUP_COLLECTION] = client.load_documents(
+        rollups.AI_EVENT_ROLLUP_COLLECTION,
+        [(doc_id, rollups.as_document(delta)) for (_, doc_id), delta in ai_deltas.items()],
+    )
+
+    questions = []
+    for index in range(config.quiz_questions):
+        created_at = random_time()
+        question_id = f"bench-question-{index:04d}"
+        questions.append((question_id, {
+            "question_id": question_id,
+            "question": f"Question {index} ?",
+            "options": [f"Option {option}" for option in range(4)],
+            "correct_answer_index": rng.randint(0, 3),
+            "tags": [rng.choice(["histoire", "culture", "geographie"])],
+            "is_active": True,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }))
+    counts["quiz_questions"] = client.load_documents("quiz_questions", questions)
+    dataset.question_ids = [question_id for question_id, _ in questions]
+
+    submissions = []
+    for _ in range(config.quiz_submissions):
+        submission_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        total_questions = 10
+        correct_answers = rng.randint(0, total_questions)
+        submissions.append((submission_id, {
+            "submission_id": submission_id,
+            "user_id": rng.choice(user_ids),
+            "score": correct_answers * 10,
+            "total_questions": total_questions,
+            "correct_answers": correct_answers,
+            "submitted_at": random_time(),
+            "answers": [
+                {"question_id": question_id, "selected_index": rng.randint(0, 3), "is_correct": rng.random() < 0.5}
+                for question_id, _ in rng.sample(questions, min(total_questions, len(questions)))
+            ],
+        }))
+    counts["quiz_submissions"] = client.load_documents("quiz_submissions", submissions)
+
+    pois = []
+    for index in range(config.pois):
+        created_at = random_time()
+        pois.append((f"bench-poi-{index:05d}", {
+            "name": f"Lieu {index}",
+            "lat": 36.8 + rng.uniform(-0.1, 0.1),
+            "lng": 10.18 + rng.uniform(-0.1, 0.1),
+            "description": "Description " * rng.randint(5, 40),
+            "is_ad": rng.random() < 0.1,
+            # Non-GCS URLs: the benchmarks must not sign URLs against a real bucket
+            "photo_url": None,
+            "audio_url": None,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }))
+    counts["poi"] = client.load_documents("poi", pois)
+    dataset.poi_ids = [poi_id for poi_id, _ in pois]
+
+    ads = []
+    for index in range(config.ads):
+        created_at = random_time()
+        ads.append((f"bench-ad-{index:03d}", {
+            "name": f"Annonceur {index}",
+            "description": "Annonce",
+            "logo_url": None,
+            "link": "https://example.com",
+            "position": "left" if index % 2 == 0 else "right",
+            "slot": index % 5 + 1,
+            "active": True,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }))
+    counts["ads"] = client.load_documents("ads", ads)
+    dataset.ad_ids = [ad_id for ad_id, _ in ads]
+
+    return dataset
+
+
+def _visit_rollups(visits: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, List[Tuple[str, Dict[str, Any]]]]:
+    """Hourly and daily rollup documents of the seeded visits, as log_page_visit would maintain them"""
+    deltas: rollups.RollupDeltas = {}
+    for _, visit in visits:
+        rollups.merge_deltas(deltas, rollups.visit_deltas(
+            visit["start_time"],
+            visit["page_path"],
+            user_id=visit["user_id"],
+            session_id=visit.get("session_id"),
+            pageviews=1,
+            duration_seconds=visit["duration_seconds"],
+        ))
+    documents: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    for (collection, doc_id), delta in deltas.items():
+        documents.setdefault(collection, []).append((doc_id, rollups.as_document(delta)))
+    return documents
+
+
+def _page_visits(rng: random.Random, config: SeedConfig, user_ids: List[str], random_time):
+    """Page visits grouped in sessions, with the markers the frontend sends"""
+    generated = 0
+    while generated < config.page_visits:
+        uid = rng.choice(user_ids)
+        start = random_time()
+        session_id = f"{uid}_{start.strftime('%Y%m%d%H%M%S')}"
+        user_agent = rng.choice(USER_AGENTS)
+        referrer = rng.choice(REFERRERS)
+        utm = rng.choice(UTM)
+        previous_page = None
+
+        pages = ["/"] + [rng.choice(PAGES) for _ in range(rng.randint(0, 7))]
+        for position, page_path in enumerate(pages):
+            if generated >= config.page_visits:
+                return
+            duration = rng.uniform(3, 300)
+            end = start + timedelta(seconds=duration)
+            visit = {
+                "user_id": uid,
+                "page_path": page_path,
+                "start_time": start,
+                "end_time": end,
+                "duration_seconds": duration,
+                "created_at": start,
+                "user_agent": user_agent,
+                "ip_address": "203.0.113.1",
+                "referrer": referrer,
+                "session_id": session_id,
+            }
+            if position == 0:
+                visit["event_type"] = "session_start"
+                if utm:
+                    visit["utm_source"], visit["utm_medium"] = utm
+            if previous_page:
+                visit["previous_page"] = previous_page
+            visit.update(enrichment.enrich_visit(visit))
+            yield str(uuid.UUID(int=rng.getrandbits(128))), visit
+            generated += 1
+            previous_page = page_path
+            start = end
+
+        if generated < config.page_visits and rng.random() < 0.3:
+            end_marker = {
+                "user_id": uid,
+                "page_path": "/_session_end",
+                "start_time": start,
+                "end_time": None,
+                "duration_seconds": None,
+                "created_at": start,
+                "user_agent": user_agent,
+                "ip_address": "203.0.113.1",
+                "session_id": session_id,
+                "device_type": "mobile" if "Mobile" in user_agent else "desktop",
+            }
+            end_marker.update(enrichment.enrich_visit(end_marker))
+            yield str(uuid.UUID(int=rng.getrandbits(128))), end_marker
+            generated += 1
+
@@ -221,6 +221,7 @@ export default function MonitoringPage() {
   
   // Quiz data
   const [quizStatistics, setQuizStatistics] = useState<any>(null)
+  const [loadingMoreSubmissions, setLoadingMoreSubmissions] = useState(false)
   
   const [loading, setLoading] = useState(true)
   const [closingVisits, setClosingVisits] = useState(false)
@@ -271,6 +272,24 @@ export default function MonitoringPage() {
     }
   }
 
+  // Next page of the quiz history, appended to the submissions already shown
+  const loadMoreSubmissions = async () => {
+    if (!quizStatistics?.nextPageToken) return
+    setLoadingMoreSubmissions(true)
+    try {
+      const page = await api.listQuizStatisticsSubmissions(quizStatistics.nextPageToken)
+      setQuizStatistics((current: any) => ({
+        ...current,
+        submissions_with_users: [...current.submissions_with_users, ...page.items],
+        nextPageToken: page.nextPageToken,
+      }))
+    } catch (error) {
+      console.error('Error loading quiz submissions:', error)
+    } finally {
+      setLoadingMoreSubmissions(false)
+    }
+  }
+
   const handleCloseInactiveVisits = async () => {
     // Show confirmation dialog
     const confirmed = window.confirm(
@@ -983,6 +1002,13 @@ export default function MonitoringPage() {
                               </tbody>
                             </table>
                           </div>
+                          {quizStatistics.nextPageToken && (
+                            <div className="mt-4 text-center">
+                              <Button variant="outline" size="sm" onClick={loadMoreSubmissions} disabled={loadingMoreSubmissions}>
+                                {loadingMoreSubmissions ? 'Chargement...' : 'Charger plus'}
+                              </Button>
+                            </div>
+                          )}
                         </div>
                       )}
                     </div>
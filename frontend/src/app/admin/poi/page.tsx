@@ -13,6 +13,8 @@ export default function POIPage() {
   const router = useRouter()
   const [pois, setPois] = useState<POI[]>([])
   const [loading, setLoading] = useState(true)
+  const [nextPageToken, setNextPageToken] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [showForm, setShowForm] = useState(false)
   const [editingPoi, setEditingPoi] = useState<POI | null>(null)
   const [formData, setFormData] = useState({
@@ -33,8 +35,9 @@ export default function POIPage() {
 
   const loadPOIs = async () => {
     try {
-      const data = await api.listPOIs()
-      setPois(data)
+      const page = await api.listPOIs()
+      setPois(page.items)
+      setNextPageToken(page.nextPageToken)
     } catch (error) {
       console.error('Error loading POIs:', error)
     } finally {
@@ -42,6 +45,20 @@ export default function POIPage() {
     }
   }
 
+  const loadMorePOIs = async () => {
+    if (!nextPageToken) return
+    try {
+      setLoadingMore(true)
+      const page = await api.listPOIs(nextPageToken)
+      setPois((current) => [...current, ...page.items])
+      setNextPageToken(page.nextPageToken)
+    } catch (error) {
+      console.error('Error loading POIs:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const resetForm = () => {
     setFormData({
       name: '',
@@ -377,6 +394,13 @@ export default function POIPage() {
                       ))}
                     </tbody>
                   </table>
+                  {nextPageToken && (
+                    <div className="pt-4 text-center">
+                      <Button variant="outline" size="sm" onClick={loadMorePOIs} disabled={loadingMore}>
+                        {loadingMore ? 'Chargement...' : 'Charger plus'}
+                      </Button>
+                    </div>
+                  )}
                 </div>
               )}
             </div>
@@ -14,6 +14,8 @@ export default function UsersPage() {
   const [users, setUsers] = useState<User[]>([])
   const [loading, setLoading] = useState(true)
   const [updating, setUpdating] = useState<string | null>(null)
+  const [nextPageToken, setNextPageToken] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   useEffect(() => {
     loadUsers()
@@ -21,8 +23,9 @@ export default function UsersPage() {
 
   const loadUsers = async () => {
     try {
-      const data = await api.listUsers()
-      setUsers(data)
+      const page = await api.listUsers()
+      setUsers(page.items)
+      setNextPageToken(page.nextPageToken)
     } catch (error) {
       console.error('Error loading users:', error)
     } finally {
@@ -30,12 +33,26 @@ export default function UsersPage() {
     }
   }
 
+  const loadMoreUsers = async () => {
+    if (!nextPageToken) return
+    try {
+      setLoadingMore(true)
+      const page = await api.listUsers(nextPageToken)
+      setUsers((current) => [...current, ...page.items])
+      setNextPageToken(page.nextPageToken)
+    } catch (error) {
+      console.error('Error loading users:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleRoleChange = async (userId: string, newRole: 'user' | 'admin') => {
     try {
       setUpdating(userId)
-      await api.updateUserRole(userId, newRole)
-      // Reload users to get updated data
-      await loadUsers()
+      const updated = await api.updateUserRole(userId, newRole)
+      // Update the row in place rather than reloading every loaded page
+      setUsers((current) => current.map((user) => (user.uid === userId ? updated : user)))
     } catch (error) {
       console.error('Error updating user role:', error)
       alert('Erreur lors de la mise à jour du rôle')
@@ -137,6 +154,13 @@ export default function UsersPage() {
                     )}
                   </tbody>
                 </table>
+                {nextPageToken && (
+                  <div className="p-4 text-center">
+                    <Button variant="outline" size="sm" onClick={loadMoreUsers} disabled={loadingMore}>
+                      {loadingMore ? 'Chargement...' : 'Charger plus'}
+                    </Button>
+                  </div>
+                )}
               </div>
             </div>
           )}
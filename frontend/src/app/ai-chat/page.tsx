@@ -33,6 +33,8 @@ export default function AIChatPage() {
   const [streamContent, setStreamContent] = useState('')
   const [conversations, setConversations] = useState<Conversation[]>([])
   const [loadingConversations, setLoadingConversations] = useState(true)
+  const [nextPageToken, setNextPageToken] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [sidebarOpen, setSidebarOpen] = useState(false) // Mobile sidebar state - starts closed on mobile
   const messagesEndRef = useRef<HTMLDivElement>(null)
   const inputRef = useRef<HTMLTextAreaElement>(null)
@@ -57,8 +59,10 @@ export default function AIChatPage() {
   const loadConversations = async () => {
     try {
       setLoadingConversations(true)
-      const convs = await api.listConversations()
-      setConversations(convs.sort((a, b) => 
+      // Conversations come most recently updated first, one page at a time
+      const page = await api.listConversations()
+      setNextPageToken(page.nextPageToken)
+      setConversations(page.items.sort((a, b) => 
         new Date(b.updated_at).getTime() - new Date(a.updated_at).getTime()
       ))
     } catch (error) {
@@ -68,6 +72,20 @@ export default function AIChatPage() {
     }
   }
 
+  const loadMoreConversations = async () => {
+    if (!nextPageToken) return
+    try {
+      setLoadingMore(true)
+      const page = await api.listConversations(nextPageToken)
+      setConversations((current) => [...current, ...page.items])
+      setNextPageToken(page.nextPageToken)
+    } catch (error) {
+      console.error('Error loading conversations:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const loadConversation = async (convId: string) => {
     try {
       setLoading(true)
@@ -296,6 +314,15 @@ export default function AIChatPage() {
                     </div>
                   </div>
                 ))}
+                {nextPageToken && (
+                  <button
+                    onClick={loadMoreConversations}
+                    disabled={loadingMore}
+                    className="w-full p-2 text-center text-sm text-blue-600 hover:underline disabled:opacity-50"
+                  >
+                    {loadingMore ? 'Chargement...' : 'Charger plus'}
+                  </button>
+                )}
               </div>
             )}
           </div>
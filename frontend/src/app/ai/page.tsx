@@ -37,6 +37,8 @@ export default function AIChatPage() {
   const [isLoadingResponse, setIsLoadingResponse] = useState(false)
   const [conversations, setConversations] = useState<Conversation[]>([])
   const [loadingConversations, setLoadingConversations] = useState(true)
+  const [nextPageToken, setNextPageToken] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [sidebarOpen, setSidebarOpen] = useState(true) // Sidebar state - open by default on desktop, closed on mobile
   const messagesEndRef = useRef<HTMLDivElement>(null)
   const inputRef = useRef<HTMLTextAreaElement>(null)
@@ -80,7 +82,10 @@ export default function AIChatPage() {
         return
       }
       console.log('Loading conversations...')
-      const convs = await api.listConversations()
+      // Conversations come most recently updated first, one page at a time
+      const page = await api.listConversations()
+      const convs = page.items
+      setNextPageToken(page.nextPageToken)
       console.log('Conversations loaded from API:', convs.length, convs)
       const sortedConvs = convs.sort((a, b) => 
         new Date(b.updated_at).getTime() - new Date(a.updated_at).getTime()
@@ -98,6 +103,20 @@ export default function AIChatPage() {
     }
   }
 
+  const loadMoreConversations = async () => {
+    if (!nextPageToken) return
+    try {
+      setLoadingMore(true)
+      const page = await api.listConversations(nextPageToken)
+      setConversations((current) => [...current, ...page.items])
+      setNextPageToken(page.nextPageToken)
+    } catch (error) {
+      console.error('Error loading conversations:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const loadConversation = async (convId: string) => {
     try {
       setLoading(true)
@@ -414,6 +433,15 @@ export default function AIChatPage() {
                     </div>
                   </div>
                 ))}
+                {nextPageToken && (
+                  <button
+                    onClick={loadMoreConversations}
+                    disabled={loadingMore}
+                    className="w-full p-2 text-center text-sm text-blue-600 hover:underline disabled:opacity-50"
+                  >
+                    {loadingMore ? 'Chargement...' : 'Charger plus'}
+                  </button>
+                )}
               </div>
             )}
           </div>
@@ -22,6 +22,8 @@ export default function MapPage() {
   const [pois, setPois] = useState<POI[]>([])
   const [selectedPoi, setSelectedPoi] = useState<POI | null>(null)
   const [loading, setLoading] = useState(true)
+  const [nextPageToken, setNextPageToken] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   useEffect(() => {
     if (!authLoading && isAuthenticated) {
@@ -31,8 +33,9 @@ export default function MapPage() {
 
   const loadPOIs = async () => {
     try {
-      const data = await api.listPOIs()
-      setPois(data)
+      const page = await api.listPOIs()
+      setPois(page.items)
+      setNextPageToken(page.nextPageToken)
     } catch (error) {
       console.error('Error loading POIs:', error)
     } finally {
@@ -40,6 +43,20 @@ export default function MapPage() {
     }
   }
 
+  const loadMorePOIs = async () => {
+    if (!nextPageToken) return
+    try {
+      setLoadingMore(true)
+      const page = await api.listPOIs(nextPageToken)
+      setPois((current) => [...current, ...page.items])
+      setNextPageToken(page.nextPageToken)
+    } catch (error) {
+      console.error('Error loading POIs:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   if (authLoading || loading) {
     return (
       <div className="flex h-screen items-center justify-center">
@@ -73,6 +90,16 @@ export default function MapPage() {
         <main className="flex-1 relative lg:ml-64 lg:mr-64">
           <MapComponent pois={pois} onPoiClick={setSelectedPoi} />
           
+          {nextPageToken && !selectedPoi && (
+            <button
+              onClick={loadMorePOIs}
+              disabled={loadingMore}
+              className="absolute top-4 left-1/2 -translate-x-1/2 z-[1000] rounded-full bg-white px-4 py-2 text-sm shadow hover:bg-gray-50 disabled:opacity-50"
+            >
+              {loadingMore ? 'Chargement...' : 'Afficher plus de lieux'}
+            </button>
+          )}
+          
           {selectedPoi && (
             <div className="absolute bottom-0 left-0 right-0 bg-white shadow-lg rounded-t-lg p-6 max-h-[50vh] overflow-y-auto z-[1000]">
               <div className="flex justify-between items-start mb-4">
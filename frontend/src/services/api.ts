@@ -50,6 +50,29 @@ async function fetchWithAuth(
   return response
 }
 
+// One page of a paginated list endpoint (nextPageToken is null on the last page)
+export interface Page<T> {
+  items: T[]
+  nextPageToken: string | null
+}
+
+// List endpoints are paginated: fetch one page, the next ones are fetched on
+// demand with the token returned in X-Next-Page-Token
+async function fetchPage<T>(url: string, pageToken?: string | null): Promise<Page<T>> {
+  const separator = url.includes('?') ? '&' : '?'
+  const pageUrl = pageToken
+    ? `${url}${separator}page_token=${encodeURIComponent(pageToken)}`
+    : url
+  const response = await fetchWithAuth(pageUrl)
+  return {
+    items: await response.json(),
+    nextPageToken: response.headers.get('X-Next-Page-Token'),
+  }
+}
+
+// Time window of the engagement, acquisition and session analytics (ending now)
+export type AnalyticsPeriod = 'day' | 'week' | 'month' | 'quarter' | 'year'
+
 export const api = {
   // Auth endpoints
   async getCurrentUser(): Promise<User> {
@@ -71,9 +94,8 @@ export const api = {
   },
 
   // Admin endpoints
-  async listUsers(): Promise<User[]> {
-    const response = await fetchWithAuth(`${API_V1_URL}/auth/users`)
-    return response.json()
+  async listUsers(pageToken?: string | null): Promise<Page<User>> {
+    return fetchPage<User>(`${API_V1_URL}/auth/users`, pageToken)
   },
 
   async updateUserRole(userId: string, role: 'user' | 'admin'): Promise<User> {
@@ -162,9 +184,8 @@ export const api = {
     return response.json()
   },
 
-  async listConversations(): Promise<any[]> {
-    const response = await fetchWithAuth(`${API_V1_URL}/ai/conversations`)
-    return response.json()
+  async listConversations(pageToken?: string | null): Promise<Page<any>> {
+    return fetchPage<any>(`${API_V1_URL}/ai/conversations`, pageToken)
   },
 
   async getConversation(conversationId: string): Promise<any> {
@@ -189,8 +210,8 @@ export const api = {
     return response.json()
   },
 
-  async getSessionStats(): Promise<any> {
-    const response = await fetchWithAuth(`${API_V1_URL}/monitoring/stats/sessions`)
+  async getSessionStats(period: AnalyticsPeriod = 'month'): Promise<any> {
+    const response = await fetchWithAuth(`${API_V1_URL}/monitoring/stats/sessions?period=${period}`)
     return response.json()
   },
 
@@ -295,13 +316,25 @@ export const api = {
     return response.json()
   },
 
-  async getEngagementAnalytics(): Promise<any> {
-    const response = await fetchWithAuth(`${API_V1_URL}/analytics/engagement`)
+  async getEngagementAnalytics(period: AnalyticsPeriod = 'month'): Promise<any> {
+    const response = await fetchWithAuth(`${API_V1_URL}/analytics/engagement?period=${period}`)
     return response.json()
   },
 
-  async getAcquisitionAnalytics(): Promise<any> {
-    const response = await fetchWithAuth(`${API_V1_URL}/analytics/acquisition`)
+  async getAcquisitionAnalytics(period: AnalyticsPeriod = 'month'): Promise<any> {
+    const response = await fetchWithAuth(`${API_V1_URL}/analytics/acquisition?period=${period}`)
+    return response.json()
+  },
+
+  async getFunnelAnalytics(steps: string[], period: AnalyticsPeriod = 'month'): Promise<any> {
+    const params = new URLSearchParams({ period })
+    steps.forEach((step) => params.append('steps', step))
+    const response = await fetchWithAuth(`${API_V1_URL}/analytics/funnel?${params}`)
+    return response.json()
+  },
+
+  async getRetentionAnalytics(weeks: number = 12): Promise<any> {
+    const response = await fetchWithAuth(`${API_V1_URL}/analytics/retention?weeks=${weeks}`)
     return response.json()
   },
 
@@ -368,9 +401,8 @@ export const api = {
     return response.json()
   },
 
-  async listPOIs(): Promise<any[]> {
-    const response = await fetchWithAuth(`${API_V1_URL}/poi`)
-    return response.json()
+  async listPOIs(pageToken?: string | null): Promise<Page<any>> {
+    return fetchPage<any>(`${API_V1_URL}/poi`, pageToken)
   },
 
   async getPOI(poiId: string): Promise<any> {
@@ -603,15 +635,21 @@ export const api = {
     return response.json()
   },
 
-  async listQuizSubmissions(userId?: string): Promise<any[]> {
+  async listQuizSubmissions(userId?: string, pageToken?: string | null): Promise<Page<any>> {
     const params = userId ? `?user_id=${userId}` : ''
-    const response = await fetchWithAuth(`${API_V1_URL}/quiz/submissions${params}`)
-    return response.json()
+    return fetchPage<any>(`${API_V1_URL}/quiz/submissions${params}`, pageToken)
   },
 
+  // Aggregates and the first page of submissions_with_users
+  // (nextPageToken: token of the next page, see listQuizStatisticsSubmissions)
   async getQuizStatistics(): Promise<any> {
     const response = await fetchWithAuth(`${API_V1_URL}/quiz/statistics`)
-    return response.json()
+    const data = await response.json()
+    return { ...data, nextPageToken: response.headers.get('X-Next-Page-Token') }
+  },
+
+  async listQuizStatisticsSubmissions(pageToken: string): Promise<Page<any>> {
+    return fetchPage<any>(`${API_V1_URL}/quiz/statistics/submissions`, pageToken)
   },
 
   async getQuizStats(): Promise<any> {